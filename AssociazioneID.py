@@ -1,71 +1,336 @@
 #!/usr/bin/env python3
+import argparse
+import bz2
+import gzip
+import io
 import re
 from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
 
 ID_REGEX = re.compile(r"^(R\d+)\s*:\s*(.*)$", flags=re.IGNORECASE)
 
-def add_ids_to_requirements(
-    in_path: Path,
-    out_path: Path,
+# --- Configurazione del lettore ARFF ---
+# Buffer di lettura (anche per i file compressi), in byte
+ARFF_READ_BUFFER = 1024 * 1024
+# Attributi di Dataset.arff da cui si costruiscono i requisiti
+REQUIREMENT_ATTRIBUTES = ("ProjectID", "RequirementText", "_class_")
+ARFF_MISSING = "?"
+# Un valore di una riga @DATA: tra apici o virgolette (con escape) oppure senza, seguito da
+# una virgola, da un commento % o dalla fine della riga
+ARFF_VALUE_RX = re.compile(r"""\s*(?:'((?:[^'\\]|\\.)*)'|"((?:[^"\\]|\\.)*)"|([^\s,'"%][^,%]*?))?\s*(,|%|$)""")
+ARFF_ATTRIBUTE_RX = re.compile(r"""^@attribute\s+('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|\S+)\s+(.*)$""", flags=re.IGNORECASE)
+ARFF_NOMINAL_RX = re.compile(r"""^\{((?:'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|[^}'"])*)\}""")
+ARFF_ESCAPE_RX = re.compile(r"\\(.)")
+ARFF_ESCAPES = {"\\": "\\", "'": "'", '"': '"', "%": "%", "n": "\n", "r": "\r", "t": "\t"}
+# Caratteri da proteggere scrivendo un valore tra apici (la barra solo se formerebbe un escape)
+ARFF_QUOTE_RX = re.compile(r"""'|\n|\r|\\(?=[\\'"%nrt]|\Z)""")
+ARFF_QUOTED = {"'": "\\'", "\n": "\\n", "\r": "\\r", "\\": "\\\\"}
+NUMERIC_TYPES = ("numeric", "real", "integer")
+
+
+class ArffFormatError(ValueError):
+    """Riga ARFF non valida: il messaggio indica il numero di riga."""
+
+
+class ArffAttribute(NamedTuple):
+    name: str
+    kind: str  # "numeric", "string", "date" o "nominal"
+    values: Tuple[str, ...] = ()  # valori ammessi degli attributi nominali
+
+
+class Requirement(NamedTuple):
+    """Record di un requisito, nello stesso ordine delle colonne di Labeled_Dataset.csv."""
+    id: str
+    project: str
+    text: str
+    req_class: str
+
+
+# --- Lettura dei file (anche compressi) ---
+def open_text(path: Path, encoding: str = "utf-8", buffer_size: int = ARFF_READ_BUFFER):
+    """
+    Apre path in lettura come testo; i file gzip e bz2 (riconosciuti dai primi byte, non
+    dall'estensione) vengono decompressi in streaming, a blocchi di buffer_size byte.
+    """
+    with open(path, "rb") as f:
+        magic = f.read(3)
+    if magic[:2] == b"\x1f\x8b":
+        stream = io.BufferedReader(gzip.GzipFile(path, "rb"), buffer_size)
+    elif magic == b"BZh":
+        stream = io.BufferedReader(bz2.BZ2File(path, "rb"), buffer_size)
+    else:
+        stream = open(path, "rb", buffering=buffer_size)
+    return io.TextIOWrapper(stream, encoding=encoding)
+
+
+def is_arff_file(path: Path) -> bool:
+    """True per Dataset.arff e per le sue versioni compresse (Dataset.arff.gz, Dataset.arff.bz2)."""
+    return ".arff" in (suffix.lower() for suffix in Path(path).suffixes)
+
+
+# --- Valori ARFF ---
+def unquote_arff(value: str) -> str:
+    """Risolve gli escape di un valore tra apici; le sequenze sconosciute (es. \\92) restano invariate."""
+    if "\\" not in value:
+        return value
+    return ARFF_ESCAPE_RX.sub(lambda m: ARFF_ESCAPES.get(m.group(1), m.group(0)), value)
+
+
+def quote_arff(value: str) -> str:
+    """Inverso di unquote_arff: il valore tra apici, con gli escape strettamente necessari."""
+    return f"'{ARFF_QUOTE_RX.sub(lambda m: ARFF_QUOTED[m.group(0)], value)}'"
+
+
+def split_arff_values(line: str, line_num: int = 0) -> List[Optional[str]]:
+    """
+    Divide una riga @DATA nei suoi valori: rispetta apici, virgolette ed escape (le virgole
+    tra apici non separano), ignora i commenti % e restituisce None per i valori mancanti (?).
+    """
+    values: List[Optional[str]] = []
+    pos = 0
+    while True:
+        m = ARFF_VALUE_RX.match(line, pos)
+        if m is None:
+            raise ArffFormatError(f"riga {line_num}: valore non valido dopo il carattere {pos}: {line}")
+        single, double, bare, separator = m.groups()
+        if single is not None:
+            values.append(unquote_arff(single))
+        elif double is not None:
+            values.append(unquote_arff(double))
+        elif bare is not None:
+            values.append(None if bare == ARFF_MISSING else bare)
+        else:
+            raise ArffFormatError(f"riga {line_num}: valore vuoto in posizione {len(values) + 1}: {line}")
+        if separator != ",":
+            return values
+        pos = m.end()
+
+
+def _parse_attribute(line: str, line_num: int) -> ArffAttribute:
+    m = ARFF_ATTRIBUTE_RX.match(line)
+    if m is None:
+        raise ArffFormatError(f"riga {line_num}: @ATTRIBUTE non valido: {line}")
+    name, declared = m.groups()
+    if name[0] in "'\"":
+        name = unquote_arff(name[1:-1])
+    if declared.startswith("{"):
+        nominal = ARFF_NOMINAL_RX.match(declared)
+        if nominal is None:
+            raise ArffFormatError(f"riga {line_num}: lista di valori nominali non chiusa: {line}")
+        values = split_arff_values(nominal.group(1), line_num) if nominal.group(1).strip() else []
+        return ArffAttribute(name, "nominal", tuple(value for value in values if value is not None))
+    kind = declared.split(None, 1)[0].lower()
+    if kind in NUMERIC_TYPES:
+        return ArffAttribute(name, "numeric")
+    if kind in ("string", "date"):
+        return ArffAttribute(name, kind)
+    raise ArffFormatError(f"riga {line_num}: tipo di attributo non supportato '{kind}': {line}")
+
+
+class ArffReader:
+    """
+    Lettore ARFF in streaming: il costruttore legge l'intestazione fino a @DATA (relazione e
+    attributi), l'iterazione restituisce una tupla di valori per ogni riga di dati, controllata
+    rispetto agli attributi (numero di valori, valori nominali dichiarati, numeri validi).
+    Ogni errore di formato solleva ArffFormatError: nessuna riga viene scartata in silenzio.
+    """
+
+    def __init__(self, lines: Iterable[str]):
+        self._lines = iter(lines)
+        self.line_num = 0
+        self.relation: Optional[str] = None
+        self.attributes: List[ArffAttribute] = []
+        self._read_header()
+        self._nominal_values = [frozenset(attribute.values) if attribute.kind == "nominal" else None
+                                for attribute in self.attributes]
+
+    def _read_header(self) -> None:
+        for raw in self._lines:
+            self.line_num += 1
+            line = raw.strip()
+            if not line or line.startswith("%"):
+                continue
+            keyword = line.split(None, 1)[0].lower()
+            if keyword == "@relation":
+                parts = line.split(None, 1)
+                self.relation = parts[1] if len(parts) > 1 else ""
+            elif keyword == "@attribute":
+                self.attributes.append(_parse_attribute(line, self.line_num))
+            elif keyword == "@data":
+                if not self.attributes:
+                    raise ArffFormatError(f"riga {self.line_num}: @DATA senza attributi dichiarati")
+                return
+            else:
+                raise ArffFormatError(f"riga {self.line_num}: atteso @RELATION, @ATTRIBUTE o @DATA: {line}")
+        raise ArffFormatError("sezione @DATA non trovata: il file non è in formato ARFF")
+
+    def attribute_index(self, name: str) -> int:
+        for i, attribute in enumerate(self.attributes):
+            if attribute.name.lower() == name.lower():
+                return i
+        raise ArffFormatError(f"attributo '{name}' non dichiarato (attributi: {[a.name for a in self.attributes]})")
+
+    def __iter__(self) -> Iterator[Tuple[Optional[str], ...]]:
+        n_attributes = len(self.attributes)
+        for raw in self._lines:
+            self.line_num += 1
+            line = raw.strip()
+            if not line or line.startswith("%"):
+                continue
+            if line.startswith("{"):
+                raise ArffFormatError(f"riga {self.line_num}: il formato ARFF sparse non è supportato")
+            values = split_arff_values(line, self.line_num)
+            if len(values) != n_attributes:
+                raise ArffFormatError(f"riga {self.line_num}: {len(values)} valori invece di {n_attributes}: {line}")
+            for attribute, allowed, value in zip(self.attributes, self._nominal_values, values):
+                if value is None:
+                    continue
+                if allowed is not None and value not in allowed:
+                    raise ArffFormatError(f"riga {self.line_num}: valore '{value}' non dichiarato per "
+                                          f"l'attributo {attribute.name}")
+                if attribute.kind == "numeric":
+                    try:
+                        float(value)
+                    except ValueError:
+                        raise ArffFormatError(f"riga {self.line_num}: valore non numerico '{value}' "
+                                              f"per l'attributo {attribute.name}") from None
+            yield tuple(values)
+
+
+# --- Requisiti con ID ---
+def iter_requirement_records(
+    lines,
+    prefix: str = "R",
+    start_from: int = 1,
+    attributes: Tuple[str, str, str] = REQUIREMENT_ATTRIBUTES,
+) -> Iterator[Requirement]:
+    """
+    Legge un file ARFF da lines e restituisce in streaming i requisiti (ID, ID progetto,
+    testo, classe) con ID progressivo, presi dagli attributi indicati.
+    """
+    reader = ArffReader(lines)
+    indices = [reader.attribute_index(name) for name in attributes]
+    for counter, row in enumerate(reader, start_from):
+        project, text, req_class = (row[i] for i in indices)
+        if project is None or text is None or req_class is None:
+            raise ArffFormatError(f"riga {reader.line_num}: valore mancante (?) in un attributo del requisito")
+        yield Requirement(f"{prefix}{counter}", project, text, req_class)
+
+
+def format_requirement_line(record: Requirement) -> str:
+    """Riga di Dataset_With_R_ID.txt del requisito, es. R1: 1,'The system shall ...',PE."""
+    req_id, project, text, req_class = record
+    return f"{req_id}: {project},{quote_arff(text)},{req_class}"
+
+
+def parse_requirement_line(line: str, line_num: int = 0) -> Requirement:
+    """Inverso di format_requirement_line (ArffFormatError se la riga non è valida)."""
+    m = ID_REGEX.match(line.strip())
+    if m is None:
+        raise ArffFormatError(f"riga {line_num}: ID del requisito mancante: {line.strip()}")
+    values = split_arff_values(m.group(2), line_num)
+    if len(values) != 3 or None in values:
+        raise ArffFormatError(f"riga {line_num}: attesi ID progetto, testo e classe: {line.strip()}")
+    return Requirement(m.group(1), *values)
+
+
+def iter_requirements_with_ids(
+    lines,
     prefix: str = "R",
     start_from: int = 1,
     keep_blank_lines: bool = False,
     skip_if_already_tagged: bool = True,
 ):
     """
-    Legge requisiti (uno per riga) da in_path, aggiunge ID progressivi e scrive su out_path.
+    Legge requisiti (uno per riga) da lines e restituisce in streaming le righe con ID
+    progressivo (senza "a capo"); con keep_blank_lines le righe vuote restano come "".
+    Per i file ARFF usare iter_requirement_records, che interpreta l'intestazione e i valori.
     """
     counter = start_from
-    written = 0
 
-    with in_path.open("r", encoding="utf-8") as f, \
-         out_path.open("w", encoding="utf-8") as fout:
-        
-        for raw in f:
-            line = raw.strip()
+    for raw in lines:
+        line = raw.strip()
 
-            # righe vuote
-            if not line:
-                if keep_blank_lines:
-                    fout.write("\n")  # preserva riga vuota
-                continue
+        # righe vuote
+        if not line:
+            if keep_blank_lines:
+                yield ""  # preserva riga vuota
+            continue
 
-            # salta commenti che iniziano con % o @
-            if line.startswith(("%", "@")):
-                #fout.write(f"{line}\n")
+        # salta commenti che iniziano con % o @
+        if line.startswith(("%", "@")):
+            continue
+
+        # già taggato?
+        m = ID_REGEX.match(line)
+        if m:
+            if skip_if_already_tagged:
+                existing_id, rest = m.group(1).upper(), m.group(2).strip()
+                yield f"{existing_id}: {rest}"
                 continue
+            else:
+                line = m.group(2).strip()
 
-            # già taggato?
-            m = ID_REGEX.match(line)
-            if m:
-                if skip_if_already_tagged:
-                    existing_id, rest = m.group(1).upper(), m.group(2).strip()
-                    fout.write(f"{existing_id}: {rest}\n")
-                    written += 1
-                    continue
-                else:
-                    line = m.group(2).strip()
+        # assegna nuovo ID
+        yield f"{prefix}{counter}: {line}"
+        counter += 1
+
+
+def add_ids_to_requirements(
+    in_path: Path,
+    out_path: Path,
+    prefix: str = "R",
+    start_from: int = 1,
+    keep_blank_lines: bool = False,
+    skip_if_already_tagged: bool = True,
+):
+    """
+    Legge requisiti da in_path, aggiunge ID progressivi e scrive su out_path. I file ARFF
+    (anche .arff.gz / .arff.bz2) passano dal lettore ARFF; gli altri sono letti una riga
+    per requisito e per loro valgono keep_blank_lines e skip_if_already_tagged.
+    """
+    written = 0
+
+    with open_text(in_path) as f, \
+         out_path.open("w", encoding="utf-8") as fout:
 
-            # assegna nuovo ID
-            fout.write(f"{prefix}{counter}: {line}\n")
-            counter += 1
-            written += 1
+        if is_arff_file(in_path):
+            lines = (format_requirement_line(record) for record in iter_requirement_records(f, prefix, start_from))
+        else:
+            lines = iter_requirements_with_ids(f, prefix, start_from, keep_blank_lines, skip_if_already_tagged)
+        for line in lines:
+            fout.write(f"{line}\n")
+            if line:
+                written += 1
 
     return written
 
 
 if __name__ == "__main__":
-    in_path  = Path("Dataset.arff")
-    out_path = Path("Dataset_With_R_ID.txt")
-
-    n = add_ids_to_requirements(
-        in_path=in_path,
-        out_path=out_path,
-        prefix="R",
-        start_from=1,
-        keep_blank_lines=False,
-        skip_if_already_tagged=True,
-    )
+    parser = argparse.ArgumentParser(description="Assegna un ID progressivo ai requisiti di Dataset.arff.")
+    parser.add_argument("--input", type=Path, default=Path("Dataset.arff"),
+                        help="file ARFF (anche .gz/.bz2) o testo con un requisito per riga (default Dataset.arff)")
+    parser.add_argument("--output", type=Path, default=Path("Dataset_With_R_ID.txt"),
+                        help="file di output (default Dataset_With_R_ID.txt)")
+    args = parser.parse_args()
+    in_path = args.input
+    out_path = args.output
+
+    try:
+        n = add_ids_to_requirements(
+            in_path=in_path,
+            out_path=out_path,
+            prefix="R",
+            start_from=1,
+            keep_blank_lines=False,
+            skip_if_already_tagged=True,
+        )
+    except FileNotFoundError:
+        print(f"ERRORE: file '{in_path}' non trovato.")
+        exit(1)
+    except ArffFormatError as e:
+        print(f"ERRORE: {in_path}: {e}")
+        exit(1)
 
     print(f"Fatto! Requisiti scritti: {n}")
     print(f"Output: {out_path}")
@@ -0,0 +1,214 @@
+import struct
+import zlib
+from array import array
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# --- Configurazione ---
+CATEGORY_TABLE_MAGIC = b"TRCATTBL"
+# Da incrementare a ogni modifica del formato serializzato
+CATEGORY_TABLE_VERSION = 1
+# magic, versione, categorie, parole, slot della tabella hash, byte delle maschere, byte del blob
+_TABLE_HEADER = struct.Struct("<8sIIIIIQ")
+_ALIGN = 8
+
+
+def _padding(size: int) -> int:
+    return -size % _ALIGN
+
+
+class CategoryTable(Mapping):
+    """
+    Mappa compatta parola -> categorie del dizionario (al posto di Dict[str, Set[str]]).
+
+    Le categorie sono internate come ID interi (la posizione in categories, in ordine di
+    priorità) e le categorie di ogni parola sono una maschera di bit: il bit i corrisponde a
+    categories[i]. Le tuple di nomi restituite da get/[] sono internate per maschera e già
+    ordinate per priorità.
+
+    La forma serializzata (to_bytes) è fatta solo di array: tabella di stringhe ordinata
+    (blob UTF-8 + offset), maschere e una tabella hash a indirizzamento aperto (crc32) per la
+    ricerca. from_buffer la legge in due modi:
+      - shared=False: costruisce un dict parola -> tupla internata dei nomi, e get è
+        direttamente il get di quel dict (ricerca veloce quanto in un Dict[str, Set[str]]);
+      - shared=True: usa direttamente il buffer (es. un mmap dell'indice compilato) senza
+        creare un oggetto per parola; i processi che mappano lo stesso file condividono le
+        pagine in memoria, al prezzo di una ricerca più lenta.
+    """
+
+    def __init__(self, categories: Tuple[str, ...], index: Optional[Dict[str, int]] = None, arrays=None):
+        self.categories = tuple(categories)
+        self.category_ids = {name: i for i, name in enumerate(self.categories)}
+        self._names_by_mask: Dict[int, Tuple[str, ...]] = {0: ()}
+        self._mask_by_names: Dict[Tuple[str, ...], int] = {(): 0}
+        self._arrays = arrays
+        self._index: Optional[Dict[str, Tuple[str, ...]]] = None
+        if index is not None:
+            self._index = {word: self.names(mask) for word, mask in index.items()}
+            # Il get del dict sostituisce quello della classe: nessun costo oltre alla ricerca nel dict
+            self.get = self._index.get
+        # Oggetto che contiene gli array in modalità condivisa (es. l'mmap dell'indice)
+        self._buffer = None
+
+    # --- Costruzione ---
+    @classmethod
+    def from_mapping(cls, mapping: Dict[str, Iterable[str]],
+                     category_key: Optional[Callable[[str], object]] = None) -> "CategoryTable":
+        """Costruisce la tabella da parola -> categorie; category_key stabilisce l'ordine di priorità."""
+        names = sorted({category for categories in mapping.values() for category in categories}, key=category_key)
+        ids = {name: i for i, name in enumerate(names)}
+        index: Dict[str, int] = {}
+        for word, categories in mapping.items():
+            mask = 0
+            for category in categories:
+                mask |= 1 << ids[category]
+            index[word] = mask
+        return cls(tuple(names), index=index)
+
+    # --- Ricerca ---
+    def mask(self, word: str) -> int:
+        """Maschera delle categorie di word (0 se la parola non è nel dizionario)."""
+        if self._index is not None:
+            return self._mask_by_names[self._index.get(word, ())]
+        return self._probe(word)
+
+    def _probe(self, word: str) -> int:
+        blob, offsets, masks, slots = self._arrays
+        key = word.encode("utf-8")
+        n_slots = len(slots)
+        slot = zlib.crc32(key) & (n_slots - 1)
+        while True:
+            i = slots[slot]
+            if i < 0:
+                return 0
+            if blob[offsets[i]:offsets[i + 1]] == key:
+                return masks[i]
+            slot = (slot + 1) & (n_slots - 1)
+
+    def names(self, mask: int) -> Tuple[str, ...]:
+        """Nomi delle categorie della maschera, in ordine di priorità (tupla internata)."""
+        names = self._names_by_mask.get(mask)
+        if names is None:
+            # Le parole con le stesse categorie condividono la stessa tupla
+            names = tuple(name for i, name in enumerate(self.categories) if mask >> i & 1)
+            self._names_by_mask[mask] = names
+            self._mask_by_names[names] = mask
+        return names
+
+    def mask_of(self, categories: Iterable[str]) -> int:
+        mask = 0
+        for category in categories:
+            mask |= 1 << self.category_ids[category]
+        return mask
+
+    def set_mask(self, word: str, mask: int) -> None:
+        """Imposta le categorie di word (mask 0 la rimuove); solo per le tabelle non condivise."""
+        if self._index is None:
+            raise TypeError("una CategoryTable condivisa (mmap) è di sola lettura")
+        if mask:
+            self._index[word] = self.names(mask)
+        else:
+            self._index.pop(word, None)
+
+    def __getitem__(self, word: str) -> Tuple[str, ...]:
+        mask = self.mask(word)
+        if not mask:
+            raise KeyError(word)
+        return self.names(mask)
+
+    def get(self, word: str, default=None):
+        mask = self.mask(word)
+        return self.names(mask) if mask else default
+
+    def __contains__(self, word) -> bool:
+        return isinstance(word, str) and self.mask(word) != 0
+
+    def __len__(self) -> int:
+        if self._index is not None:
+            return len(self._index)
+        return len(self._arrays[1]) - 1
+
+    def _iter_masks(self) -> Iterator[Tuple[str, int]]:
+        """Coppie (parola, maschera) in ordine di parola."""
+        if self._index is not None:
+            for word in sorted(self._index):
+                yield word, self._mask_by_names[self._index[word]]
+            return
+        blob, offsets, masks, _ = self._arrays
+        for i in range(len(offsets) - 1):
+            yield bytes(blob[offsets[i]:offsets[i + 1]]).decode("utf-8"), masks[i]
+
+    def __iter__(self) -> Iterator[str]:
+        for word, _ in self._iter_masks():
+            yield word
+
+    def items(self):
+        return ((word, self.names(mask)) for word, mask in self._iter_masks())
+
+    # --- Serializzazione ---
+    def to_bytes(self) -> bytes:
+        """Tabella di stringhe ordinata, maschere e tabella hash come array contigui (allineati a 8 byte)."""
+        entries = sorted((word.encode("utf-8"), mask) for word, mask in self._iter_masks())
+        offsets = array("I", [0])
+        for key, _ in entries:
+            offsets.append(offsets[-1] + len(key))
+        mask_code = "I" if len(self.categories) <= 32 else "Q"
+        masks = array(mask_code, (mask for _, mask in entries))
+        n_slots = 1
+        while n_slots < 2 * max(1, len(entries)):
+            n_slots *= 2
+        slots = array("i", [-1]) * n_slots
+        for i, (key, _) in enumerate(entries):
+            slot = zlib.crc32(key) & (n_slots - 1)
+            while slots[slot] >= 0:
+                slot = (slot + 1) & (n_slots - 1)
+            slots[slot] = i
+        names = "\n".join(self.categories).encode("utf-8")
+        blob = b"".join(key for key, _ in entries)
+
+        parts = [_TABLE_HEADER.pack(CATEGORY_TABLE_MAGIC, CATEGORY_TABLE_VERSION, len(self.categories), len(entries),
+                                    n_slots, masks.itemsize, len(blob)),
+                 struct.pack("<I", len(names)), names]
+        for section in (offsets.tobytes(), masks.tobytes(), slots.tobytes(), blob):
+            size = sum(len(part) for part in parts)
+            parts.append(b"\0" * _padding(size))
+            parts.append(section)
+        return b"".join(parts)
+
+    @classmethod
+    def from_buffer(cls, buffer, shared: bool = False) -> Tuple["CategoryTable", int]:
+        """
+        Legge una tabella scritta da to_bytes all'inizio di buffer (bytes, memoryview o mmap);
+        restituisce (tabella, byte letti). Con shared=True gli array restano viste su buffer,
+        che deve rimanere aperto finché la tabella è in uso.
+        """
+        view = memoryview(buffer)
+        magic, version, n_categories, n_words, n_slots, mask_size, blob_size = _TABLE_HEADER.unpack_from(view, 0)
+        if magic != CATEGORY_TABLE_MAGIC or version != CATEGORY_TABLE_VERSION:
+            raise ValueError("formato della tabella delle categorie non riconosciuto")
+        pos = _TABLE_HEADER.size
+        (names_size,) = struct.unpack_from("<I", view, pos)
+        pos += 4
+        categories = tuple(bytes(view[pos:pos + names_size]).decode("utf-8").split("\n")) if n_categories else ()
+        pos += names_size
+
+        sections: List[memoryview] = []
+        for size in ((n_words + 1) * 4, n_words * mask_size, n_slots * 4, blob_size):
+            pos += _padding(pos)
+            sections.append(view[pos:pos + size])
+            pos += size
+        offsets = sections[0].cast("I")
+        masks = sections[1].cast("I" if mask_size == 4 else "Q")
+        slots = sections[2].cast("i")
+        blob = sections[3]
+
+        if shared:
+            table = cls(categories, arrays=(blob, offsets, masks, slots))
+            table._buffer = buffer  # il buffer (es. l'mmap) resta aperto quanto la tabella
+            return table, pos
+        raw = bytes(blob)
+        index = {raw[offsets[i]:offsets[i + 1]].decode("utf-8"): masks[i] for i in range(n_words)}
+        # Nessuna vista resta aperta sul buffer, che può essere chiuso subito
+        for derived in (offsets, masks, slots, *sections, view):
+            derived.release()
+        return cls(categories, index=index), pos
@@ -0,0 +1,328 @@
+import argparse
+import csv
+import heapq
+import json
+import re
+import tempfile
+import time
+from collections import Counter
+from itertools import groupby, islice
+from operator import itemgetter
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, TextIO, Tuple
+
+from LabelQuery import LABELED_FILE
+from LabelStore import open_label_store
+from tool import OUTPUT_HEADER, category_sort_key
+
+# --- Configurazione ---
+COMPARISON_FILE = Path("Confronto_Esecuzioni.json")
+# Righe ordinate in memoria per ogni blocco dell'ordinamento esterno (solo per esecuzioni non ordinate per ID)
+SORT_RUN_ROWS = 100_000
+# Requisiti modificati riportati come esempio nel JSON e nel riepilogo
+CHANGE_EXAMPLES = 20
+# Riassegnazioni (parola, categoria precedente, nuova categoria) più frequenti riportate
+TOP_REASSIGNMENTS = 20
+REQUIREMENT_ID_RX = re.compile(r"^(\D*)(\d+)$")
+NULL_VALUE = "NULL"
+
+
+class RunOrderError(ValueError):
+    """Le righe di un'esecuzione non sono raggruppate per requisito in ordine di ID."""
+
+
+class RequirementRows(NamedTuple):
+    """Le righe di un requisito in un'esecuzione: metadati e insieme dei match (categoria, parola)."""
+    req_id: str
+    project: str
+    text: str
+    req_class: str
+    matches: Set[Tuple[str, str]]
+
+
+def requirement_sort_key(req_id: str) -> Tuple[str, int, str]:
+    """Ordine naturale degli ID (R2 prima di R10), lo stesso in cui AssociazioneID.py li assegna."""
+    match = REQUIREMENT_ID_RX.match(req_id)
+    if match is None:
+        return (req_id, -1, "")
+    return (match.group(1), int(match.group(2)), req_id)
+
+
+# --- Sorgenti ---
+def iter_run_rows(source: Path) -> Iterator[List[str]]:
+    """Righe (ID, ID progetto, testo, classe, categoria, parola) di un CSV etichettato o di uno store .sqlite."""
+    if source.suffix == ".sqlite":
+        with open_label_store(source) as store:
+            yield from store.iter_labeled_rows()
+        return
+    with open(source, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f, delimiter=";")
+        header = next(reader, None)
+        if header is None:
+            return
+        if header == OUTPUT_HEADER:
+            # Colonne già nell'ordine di tool.py: le righe passano senza essere ricostruite
+            yield from filter(None, reader)
+            return
+        cols = [header.index(name) for name in OUTPUT_HEADER]
+        for row in reader:
+            if row:
+                yield [row[col] for col in cols]
+
+
+def _write_sorted_run(rows: List[List[str]], tmp_dir: Optional[Path]) -> Path:
+    rows.sort(key=lambda row: requirement_sort_key(row[0]))
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", newline="", dir=tmp_dir, suffix=".run", delete=False) as f:
+        csv.writer(f, delimiter=";").writerows(rows)
+    return Path(f.name)
+
+
+def _read_run(path: Path) -> Iterator[List[str]]:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        yield from csv.reader(f, delimiter=";")
+
+
+def iter_sorted_rows(rows: Iterator[List[str]], tmp_dir: Optional[Path] = None,
+                     run_size: int = SORT_RUN_ROWS) -> Iterator[List[str]]:
+    """
+    Le righe in ordine di ID (ordinamento esterno stabile): blocchi di run_size righe ordinati
+    su disco e fusi con heapq.merge, quindi in memoria resta un solo blocco.
+    """
+    runs: List[Path] = []
+    try:
+        while True:
+            block = list(islice(rows, run_size))
+            if not block:
+                break
+            if not runs and len(block) < run_size:
+                # Tutto sta in un blocco: niente file temporanei
+                block.sort(key=lambda row: requirement_sort_key(row[0]))
+                yield from block
+                return
+            runs.append(_write_sorted_run(block, tmp_dir))
+        yield from heapq.merge(*(_read_run(run) for run in runs), key=lambda row: requirement_sort_key(row[0]))
+    finally:
+        for run in runs:
+            run.unlink(missing_ok=True)
+
+
+def iter_requirement_groups(rows: Iterator[List[str]], source: Path) -> Iterator[Tuple[Tuple[str, int, str], RequirementRows]]:
+    """
+    Raggruppa le righe consecutive dello stesso requisito e restituisce (chiave di ordinamento,
+    requisito). Solleva RunOrderError se i gruppi non sono in ordine di ID crescente (es. righe
+    di un requisito non consecutive).
+    """
+    previous_id = None
+    previous_key = None
+    for req_id, group in groupby(rows, key=itemgetter(0)):
+        key = requirement_sort_key(req_id)
+        if previous_key is not None and key <= previous_key:
+            raise RunOrderError(f"'{source}' non è ordinato per ID di requisito ({req_id} dopo {previous_id})")
+        previous_id, previous_key = req_id, key
+        first = next(group)
+        matches = {(category, word) for _, _, _, _, category, word in [first, *group] if category != NULL_VALUE}
+        yield key, RequirementRows(req_id, first[1], first[2], first[3], matches)
+
+
+# --- Confronto ---
+class RunComparison:
+    """
+    Contatori del confronto tra due esecuzioni, aggiornati un requisito alla volta: la memoria
+    non dipende dal numero di righe, solo dalle categorie e dalle parole riassegnate.
+    """
+
+    def __init__(self):
+        self.requirements = Counter()
+        self.rows = Counter()
+        # Righe di match per categoria: nelle due esecuzioni, aggiunte e rimosse
+        self.old_categories = Counter()
+        self.new_categories = Counter()
+        self.added_categories = Counter()
+        self.removed_categories = Counter()
+        self.transitions = Counter()
+        self.reassignments = Counter()
+        self.examples: List[Dict[str, object]] = []
+
+    def add(self, old: Optional[RequirementRows], new: Optional[RequirementRows]) -> Optional[Dict[str, object]]:
+        """Confronta un requisito (None se manca in una delle due esecuzioni); restituisce le differenze o None."""
+        old_matches = old.matches if old is not None else set()
+        new_matches = new.matches if new is not None else set()
+        self.old_categories.update(category for category, _ in old_matches)
+        self.new_categories.update(category for category, _ in new_matches)
+        self.rows["old"] += len(old_matches)
+        self.rows["new"] += len(new_matches)
+
+        if old is None:
+            self.requirements["added"] += 1
+        elif new is None:
+            self.requirements["removed"] += 1
+        else:
+            self.requirements["compared"] += 1
+            if (old.project, old.text, old.req_class) != (new.project, new.text, new.req_class):
+                self.requirements["metadata_changed"] += 1
+
+        if old_matches == new_matches:
+            if old is not None and new is not None:
+                self.requirements["unchanged"] += 1
+            return None
+        added = sorted(new_matches - old_matches, key=lambda match: (category_sort_key(match[0]), match[1]))
+        removed = sorted(old_matches - new_matches, key=lambda match: (category_sort_key(match[0]), match[1]))
+        if old is not None and new is not None:
+            self.requirements["matches_changed"] += 1
+        self.rows["added"] += len(added)
+        self.rows["removed"] += len(removed)
+        self.added_categories.update(category for category, _ in added)
+        self.removed_categories.update(category for category, _ in removed)
+
+        # Riassegnazioni: la stessa parola dello stesso requisito ha perso una categoria e ne ha guadagnata un'altra
+        added_by_word: Dict[str, List[str]] = {}
+        for category, word in added:
+            added_by_word.setdefault(word, []).append(category)
+        reassigned = []
+        for old_category, word in removed:
+            for new_category in added_by_word.get(word, ()):
+                self.transitions[(old_category, new_category)] += 1
+                self.reassignments[(word, old_category, new_category)] += 1
+                reassigned.append({"word": word, "old": old_category, "new": new_category})
+        self.rows["reassigned"] += len(reassigned)
+
+        change = {
+            "id": (new or old).req_id,
+            "status": "added" if old is None else "removed" if new is None else "changed",
+            "added": [{"category": category, "word": word} for category, word in added],
+            "removed": [{"category": category, "word": word} for category, word in removed],
+            "reassigned": reassigned,
+        }
+        if len(self.examples) < CHANGE_EXAMPLES:
+            self.examples.append(change)
+        return change
+
+    def report(self, old_source: Path, new_source: Path) -> Dict[str, object]:
+        categories = {}
+        for name in sorted(self.old_categories.keys() | self.new_categories.keys(), key=category_sort_key):
+            categories[name] = {"old": self.old_categories[name], "new": self.new_categories[name],
+                                "added": self.added_categories[name], "removed": self.removed_categories[name],
+                                "delta": self.new_categories[name] - self.old_categories[name]}
+        return {
+            "old": str(old_source),
+            "new": str(new_source),
+            "requirements": {key: self.requirements[key] for key in
+                             ("compared", "unchanged", "matches_changed", "metadata_changed", "added", "removed")},
+            "matches": {key: self.rows[key] for key in ("old", "new", "added", "removed", "reassigned")},
+            "categories": categories,
+            "category_transitions": [{"old": old, "new": new, "count": count}
+                                     for (old, new), count in self.transitions.most_common()],
+            "top_reassignments": [{"word": word, "old": old, "new": new, "count": count}
+                                  for (word, old, new), count in self.reassignments.most_common(TOP_REASSIGNMENTS)],
+            "change_examples": self.examples,
+        }
+
+
+def iter_merged_requirements(old_groups, new_groups) -> Iterator[Tuple[Optional[RequirementRows], Optional[RequirementRows]]]:
+    """
+    Fusione ordinata per ID dei gruppi di iter_requirement_groups: coppie (vecchio, nuovo) con
+    None dalla parte in cui il requisito manca.
+    """
+    old = next(old_groups, None)
+    new = next(new_groups, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old[0] < new[0]):
+            yield old[1], None
+            old = next(old_groups, None)
+        elif old is None or new[0] < old[0]:
+            yield None, new[1]
+            new = next(new_groups, None)
+        else:
+            yield old[1], new[1]
+            old = next(old_groups, None)
+            new = next(new_groups, None)
+
+
+def compare_runs(old_source: Path, new_source: Path, details: Optional[TextIO] = None,
+                 sort: bool = False, tmp_dir: Optional[Path] = None) -> Dict[str, object]:
+    """
+    Confronta due esecuzioni (CSV etichettati o store .sqlite) in una sola passata di fusione
+    ordinata per (ID, CATEGORIA, PAROLA): in memoria restano solo le righe del requisito corrente
+    di ciascuna. Con sort=True le righe vengono prima ordinate con un ordinamento esterno.
+    Le differenze di ogni requisito modificato vanno su details (JSON lines), se indicato.
+    """
+    def groups(source: Path):
+        rows = iter_run_rows(source)
+        return iter_requirement_groups(iter_sorted_rows(rows, tmp_dir) if sort else rows, source)
+
+    comparison = RunComparison()
+    for old, new in iter_merged_requirements(groups(old_source), groups(new_source)):
+        change = comparison.add(old, new)
+        if change is not None and details is not None:
+            details.write(json.dumps(change, ensure_ascii=False) + "\n")
+    return comparison.report(old_source, new_source)
+
+
+def print_summary(report: Dict[str, object]) -> None:
+    requirements = report["requirements"]
+    matches = report["matches"]
+    print(f"Requisiti confrontati: {requirements['compared']} ({requirements['unchanged']} invariati, "
+          f"{requirements['matches_changed']} con match diversi, {requirements['metadata_changed']} con testo/classe/progetto diversi); "
+          f"solo in '{report['old']}': {requirements['removed']}, solo in '{report['new']}': {requirements['added']}")
+    print(f"Match: {matches['old']} -> {matches['new']} (+{matches['added']} / -{matches['removed']}, "
+          f"{matches['reassigned']} riassegnazioni di categoria)")
+    changed = [(name, counts) for name, counts in report["categories"].items() if counts["added"] or counts["removed"]]
+    if changed:
+        print(f"{'categoria':<14} {'prima':>9} {'dopo':>9} {'+':>8} {'-':>8} {'delta':>9}")
+        for name, counts in changed:
+            print(f"{name:<14} {counts['old']:>9} {counts['new']:>9} {counts['added']:>8} {counts['removed']:>8} "
+                  f"{counts['delta']:>+9}")
+    if report["category_transitions"]:
+        print("Riassegnazioni per categoria: " + ", ".join(
+            f"{entry['old']} -> {entry['new']} ({entry['count']})" for entry in report["category_transitions"][:10]))
+    for entry in report["top_reassignments"][:5]:
+        print(f"  '{entry['word']}': {entry['old']} -> {entry['new']} ({entry['count']} requisiti)")
+    for change in report["change_examples"][:5]:
+        parts = [f"+{match['category']}:{match['word']}" for match in change["added"]]
+        parts += [f"-{match['category']}:{match['word']}" for match in change["removed"]]
+        print(f"  {change['id']} ({change['status']}): {' '.join(parts[:8])}{' ...' if len(parts) > 8 else ''}")
+
+
+# --- Main Logic ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Confronta due esecuzioni di tool.py (CSV etichettati o store .sqlite): match aggiunti e rimossi, "
+                    "riassegnazioni di categoria e variazioni per categoria.")
+    parser.add_argument("old", type=Path, help="esecuzione di riferimento")
+    parser.add_argument("new", type=Path, nargs="?", default=LABELED_FILE,
+                        help=f"esecuzione da confrontare (default {LABELED_FILE})")
+    parser.add_argument("--output", type=Path, default=COMPARISON_FILE,
+                        help=f"report JSON (default {COMPARISON_FILE})")
+    parser.add_argument("--details", type=Path, default=None,
+                        help="scrive le differenze di ogni requisito modificato in questo file (JSON lines)")
+    parser.add_argument("--sort", action="store_true",
+                        help="ordina prima le righe per ID (ordinamento esterno), per esecuzioni non in ordine di ID")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    details_f = open(args.details, "w", encoding="utf-8") if args.details is not None else None
+    try:
+        try:
+            report = compare_runs(args.old, args.new, details_f, args.sort)
+        except RunOrderError as e:
+            print(f"Avviso: {e}: confronto ripetuto con ordinamento esterno.")
+            if details_f is not None:
+                details_f.seek(0)
+                details_f.truncate()
+            report = compare_runs(args.old, args.new, details_f, sort=True)
+    except FileNotFoundError as e:
+        print(f"ERRORE: file '{e.filename}' non trovato. Eseguire prima tool.py.")
+        exit(1)
+    except ValueError as e:
+        print(f"ERRORE: {e}")
+        exit(1)
+    finally:
+        if details_f is not None:
+            details_f.close()
+    elapsed = time.perf_counter() - start
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Confronto completato in {elapsed:.2f}s.")
+    print_summary(report)
+    print(f"Report scritto in '{args.output}'" + (f", differenze per requisito in '{args.details}'." if args.details else "."))
@@ -0,0 +1,322 @@
+import argparse
+import contextlib
+import hashlib
+import threading
+import time
+from pathlib import Path
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from flashtext import KeywordProcessor
+
+from CategoryTable import CategoryTable
+from tool import (
+    DICT_INDEX_FILE, DICTIONARIES_DIR, CategoryResolver, category_sort_key, hash_dict_sources, parse_dict_entry,
+    read_dict_index, write_dict_index,
+)
+
+# --- Configurazione ---
+# Secondi tra un controllo e l'altro di NewDict/*.txt
+DICT_POLL_INTERVAL = 1.0
+
+
+class DictFileState(NamedTuple):
+    """Contenuto di un file di dizionario all'ultimo controllo."""
+    signature: Tuple[int, int]  # (mtime in ns, dimensione): se non cambia il file non viene riletto
+    digest: bytes  # sha256 del contenuto: se non cambia il file non viene rianalizzato
+    category: str
+    words: FrozenSet[str]
+    phrases: FrozenSet[str]
+
+
+class DictSnapshot:
+    """Una delle due copie (double buffer) di tabella delle parole, KeywordProcessor e resolver."""
+
+    def __init__(self, singles_category_map: CategoryTable, multi_phrase_processor: KeywordProcessor,
+                 version: int = 0):
+        self.singles_category_map = singles_category_map
+        self.multi_phrase_processor = multi_phrase_processor
+        self.resolver = CategoryResolver(singles_category_map)
+        self.version = version
+        # Etichettature in corso su questa copia (vedi DictManager.pinned)
+        self.readers = 0
+
+
+def read_dict_file(path: Path, content: bytes, signature: Tuple[int, int]) -> DictFileState:
+    """Analizza un file di dizionario con le stesse regole di load_all_dicts_optimized."""
+    words, phrases = set(), set()
+    for line in content.decode("utf-8").splitlines():
+        entry = parse_dict_entry(line)
+        if entry is None:
+            continue
+        is_phrase, normalized = entry
+        (phrases if is_phrase else words).add(normalized)
+    return DictFileState(signature, hashlib.sha256(content).digest(), path.stem.lower(),
+                         frozenset(words), frozenset(phrases))
+
+
+def _signature(path: Path) -> Tuple[int, int]:
+    st = path.stat()
+    return st.st_mtime_ns, st.st_size
+
+
+def build_dictionaries(states: List[DictFileState]) -> Tuple[CategoryTable, KeywordProcessor]:
+    """Costruisce da zero tabella e KeywordProcessor dagli stati dei file, in ordine di percorso."""
+    singles_category_map: Dict[str, set] = {}
+    multi_phrase_processor = KeywordProcessor(case_sensitive=False)
+    for state in states:
+        for word in state.words:
+            singles_category_map.setdefault(word, set()).add(state.category)
+        # Come in load_all_dicts_optimized, una frase presente in più file va all'ultimo
+        for phrase in state.phrases:
+            multi_phrase_processor.add_keyword(phrase, state.category)
+    return CategoryTable.from_mapping(singles_category_map, category_sort_key), multi_phrase_processor
+
+
+class DictManager:
+    """
+    Dizionari ricaricabili a caldo: poll() controlla NewDict/*.txt (mtime e dimensione, poi hash
+    del contenuto) e applica solo le parole e le frasi aggiunte o rimosse nei file cambiati, con
+    set_mask sulla CategoryTable e add_keyword/remove_keyword sul KeywordProcessor.
+
+    Tabella e KeywordProcessor esistono in due copie (double buffer): le etichettature leggono
+    la copia attiva (pinned), il ricaricamento modifica l'altra, aspettando che le etichettature
+    ancora in corso su di essa finiscano, e poi scambia le due copie in modo atomico. Una
+    chiamata in corso vede quindi sempre dizionari coerenti, e il costo di un ricaricamento
+    dipende dalla dimensione della modifica, non da quella dei dizionari. Se una parola finisce
+    in una categoria che la tabella non conosce, le due copie vengono ricostruite da zero.
+    """
+
+    def __init__(self, dir_path: Path = DICTIONARIES_DIR, index_path: Path = DICT_INDEX_FILE,
+                 use_dict_index: bool = True):
+        self.dir_path = dir_path
+        self.index_path = index_path
+        self.use_dict_index = use_dict_index
+        self._cond = threading.Condition()
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        # Modifiche già applicate alla copia attiva ma non ancora all'altra: (parola -> maschera, frase -> categoria)
+        self._pending: Tuple[Dict[str, int], Dict[str, Optional[str]]] = ({}, {})
+        self.version = 0
+        self._files: Dict[Path, DictFileState] = {}
+        self._load()
+
+    # --- Caricamento iniziale ---
+    def _load(self) -> None:
+        contents = []
+        for path in sorted(self.dir_path.glob("*.txt")) if self.dir_path.is_dir() else []:
+            signature = _signature(path)
+            content = path.read_bytes()
+            contents.append((path, content))
+            self._files[path] = read_dict_file(path, content, signature)
+
+        copies = []
+        # L'hash è quello dei byte appena letti: l'indice corrisponde esattamente agli stati dei file
+        sources_hash = hash_dict_sources((path.name, content) for path, content in contents)
+        if self.use_dict_index and contents:
+            copies = [loaded for loaded in (read_dict_index(self.index_path, sources_hash) for _ in range(2))
+                      if loaded is not None]
+        if len(copies) == 2:
+            print(f"Dizionari caricati dall'indice compilato '{self.index_path}' (due copie per il ricaricamento a caldo).")
+        else:
+            copies = [build_dictionaries(list(self._files.values())) for _ in range(2)]
+            print(f"Dizionari caricati da '{self.dir_path}' (due copie per il ricaricamento a caldo).")
+            if self.use_dict_index and contents:
+                write_dict_index(self.index_path, sources_hash, *copies[0])
+        self._live = DictSnapshot(*copies[0])
+        self._standby = DictSnapshot(*copies[1])
+        print(f"  {len(self._live.singles_category_map)} parole singole e "
+              f"{len(self._live.multi_phrase_processor)} frasi multi-parola da {len(self._files)} file.")
+
+    # --- Lettura ---
+    def current(self) -> DictSnapshot:
+        """Copia attiva dei dizionari (senza pin: può essere modificata dal ricaricamento successivo)."""
+        return self._live
+
+    @contextlib.contextmanager
+    def pinned(self):
+        """Copia attiva dei dizionari, che il ricaricamento non modifica finché il blocco è in esecuzione."""
+        with self._cond:
+            snapshot = self._live
+            snapshot.readers += 1
+        try:
+            yield snapshot
+        finally:
+            with self._cond:
+                snapshot.readers -= 1
+                if not snapshot.readers:
+                    self._cond.notify_all()
+
+    # --- Ricaricamento ---
+    def _scan(self) -> Dict[Path, DictFileState]:
+        """Stato attuale dei file: sono riletti solo quelli con mtime o dimensione cambiati."""
+        files: Dict[Path, DictFileState] = {}
+        for path in sorted(self.dir_path.glob("*.txt")) if self.dir_path.is_dir() else []:
+            previous = self._files.get(path)
+            try:
+                signature = _signature(path)
+                if previous is not None and previous.signature == signature:
+                    files[path] = previous
+                    continue
+                content = path.read_bytes()
+                if previous is not None and previous.digest == hashlib.sha256(content).digest():
+                    files[path] = previous._replace(signature=signature)
+                    continue
+                files[path] = read_dict_file(path, content, signature)
+            except FileNotFoundError:
+                continue  # rimosso tra glob e lettura: il prossimo controllo lo tratta come rimosso
+            except (OSError, UnicodeDecodeError) as e:
+                # File illeggibile (es. salvato a metà): si tiene la versione precedente e si riprova dopo
+                print(f"[AVVISO] Dizionario '{path.name}' non leggibile ({e}): ricaricamento rinviato.")
+                if previous is not None:
+                    files[path] = previous
+        return files
+
+    def poll(self) -> Optional[Dict[str, object]]:
+        """
+        Controlla i file dei dizionari e applica le modifiche. Restituisce il resoconto del
+        ricaricamento, o None se il contenuto effettivo dei dizionari non è cambiato.
+        """
+        with self._reload_lock:
+            start = time.perf_counter()
+            files = self._scan()
+            changed = sorted(path for path in set(files) | set(self._files)
+                             if path not in files or path not in self._files
+                             or files[path].digest != self._files[path].digest)
+            touched_words, touched_phrases = set(), set()
+            for path in changed:
+                old, new = self._files.get(path), files.get(path)
+                touched_words.update((old.words if old else frozenset()) ^ (new.words if new else frozenset()))
+                touched_phrases.update((old.phrases if old else frozenset()) ^ (new.phrases if new else frozenset()))
+            if not (touched_words or touched_phrases):
+                # Nessun file cambiato, o cambiati solo ordine, duplicati o righe vuote
+                self._files = files
+                return None
+
+            states = [files[path] for path in sorted(files)]
+            previous = self._live
+            try:
+                words = {word: previous.singles_category_map.mask_of(state.category for state in states
+                                                                     if word in state.words)
+                         for word in touched_words}
+            except KeyError:
+                # Parola in una categoria che la tabella non ha: servono nuovi ID di categoria
+                self._rebuild(states)
+            else:
+                phrases: Dict[str, Optional[str]] = {}
+                for phrase in touched_phrases:
+                    winner = None
+                    for state in states:
+                        if phrase in state.phrases:
+                            winner = state.category
+                    phrases[phrase] = winner
+                self._publish(words, phrases)
+            self._files = files
+
+            report = diff_report(previous, self._live, touched_words, touched_phrases)
+            report.update(version=self.version, files=[path.name for path in changed],
+                          full_rebuild=previous is not self._standby, seconds=time.perf_counter() - start)
+            return report
+
+    @staticmethod
+    def _apply(snapshot: DictSnapshot, words: Dict[str, int], phrases: Dict[str, Optional[str]]) -> None:
+        table, processor = snapshot.singles_category_map, snapshot.multi_phrase_processor
+        for word, mask in words.items():
+            table.set_mask(word, mask)
+        for phrase, category in phrases.items():
+            if category is None:
+                processor.remove_keyword(phrase)
+            else:
+                processor.add_keyword(phrase, category)
+        # Le decisioni in cache del resolver valgono solo per i dizionari precedenti
+        snapshot.resolver = CategoryResolver(table)
+
+    def _publish(self, words: Dict[str, int], phrases: Dict[str, Optional[str]]) -> None:
+        standby = self._standby
+        with self._cond:
+            while standby.readers:
+                self._cond.wait()
+        # La copia in attesa riceve prima le modifiche del ricaricamento precedente, poi quelle nuove
+        pending_words, pending_phrases = self._pending
+        self._apply(standby, {**pending_words, **words}, {**pending_phrases, **phrases})
+        with self._cond:
+            self.version += 1
+            standby.version = self.version
+            self._live, self._standby = standby, self._live
+        self._pending = (words, phrases)
+
+    def _rebuild(self, states: List[DictFileState]) -> None:
+        live, standby = (DictSnapshot(*build_dictionaries(states)) for _ in range(2))
+        with self._cond:
+            self.version += 1
+            live.version = standby.version = self.version
+            # Chi ha ancora in uso le copie precedenti le tiene finché serve: non vengono più modificate
+            self._live, self._standby = live, standby
+        self._pending = ({}, {})
+
+    # --- Controllo periodico ---
+    def start(self, interval: float = DICT_POLL_INTERVAL) -> None:
+        """Avvia un thread che chiama poll() ogni interval secondi e stampa i ricaricamenti."""
+        if self._watcher is not None:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="dict-watcher", daemon=True)
+        self._watcher.start()
+
+    def _watch(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                report = self.poll()
+            except Exception as e:
+                print(f"[ERRORE] Ricaricamento dei dizionari fallito: {e}")
+                continue
+            if report is not None:
+                print_reload_report(report)
+
+    def stop(self) -> None:
+        if self._watcher is not None:
+            self._stop.set()
+            self._watcher.join()
+            self._watcher = None
+
+
+def diff_report(old: DictSnapshot, new: DictSnapshot, words, phrases) -> Dict[str, int]:
+    """Conta le parole e le frasi (tra quelle date) aggiunte, rimosse o con categorie cambiate da old a new."""
+    report = dict.fromkeys(["words_added", "words_removed", "words_changed",
+                            "phrases_added", "phrases_removed", "phrases_changed"], 0)
+    for kind, entries, lookup_old, lookup_new in (
+            ("words", words, old.singles_category_map.get, new.singles_category_map.get),
+            ("phrases", phrases, old.multi_phrase_processor.get_keyword, new.multi_phrase_processor.get_keyword)):
+        for entry in entries:
+            before, after = lookup_old(entry), lookup_new(entry)
+            if before != after:
+                report[f"{kind}_{'added' if before is None else 'removed' if after is None else 'changed'}"] += 1
+    return report
+
+
+def print_reload_report(report: Dict[str, object]) -> None:
+    mode = "ricostruzione completa" if report["full_rebuild"] else "incrementale"
+    print(f"Dizionari ricaricati (versione {report['version']}, {mode}, {report['seconds'] * 1000:.1f} ms) "
+          f"da {', '.join(report['files'])}: parole +{report['words_added']} -{report['words_removed']} "
+          f"~{report['words_changed']}, frasi +{report['phrases_added']} -{report['phrases_removed']} "
+          f"~{report['phrases_changed']}.")
+
+
+# --- Main Logic ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Controlla NewDict/*.txt e ricarica i dizionari a ogni modifica.")
+    parser.add_argument("--dictionaries", type=Path, default=DICTIONARIES_DIR,
+                        help=f"directory dei dizionari (default {DICTIONARIES_DIR})")
+    parser.add_argument("--interval", type=float, default=DICT_POLL_INTERVAL,
+                        help=f"secondi tra un controllo e l'altro (default {DICT_POLL_INTERVAL:g})")
+    parser.add_argument("--no-dict-index", action="store_true", help="legge direttamente i .txt senza indice compilato")
+    args = parser.parse_args()
+
+    manager = DictManager(args.dictionaries, use_dict_index=not args.no_dict_index)
+    print(f"Controllo di '{args.dictionaries}' ogni {args.interval:g}s (Ctrl+C per uscire).")
+    manager.start(args.interval)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        manager.stop()
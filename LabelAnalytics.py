@@ -0,0 +1,381 @@
+import argparse
+import csv
+import json
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from LabelQuery import LABELED_FILE, source_signature
+from LabelStore import LABEL_STORE_FILE, open_label_store
+from tool import WORD_RX, category_sort_key
+
+# --- Configurazione ---
+ANALYTICS_DIR = Path("Analytics")
+ANALYTICS_CACHE_FILE = Path(".cache") / "label_analytics.npz"
+# Da incrementare a ogni modifica delle colonne salvate in cache
+ANALYTICS_CACHE_VERSION = 1
+# Categorie che indicano ambiguità nel testo di un requisito (le altre sono categorie grammaticali)
+AMBIGUITY_CATEGORIES = ("vague", "optional", "incompletes", "continuance", "directive", "plurals")
+TOP_K_WORDS = 10
+# Requisiti più ambigui mostrati nel riepilogo e salvati nel JSON
+TOP_AMBIGUOUS_REQUIREMENTS = 10
+# Sotto questo numero di celle (es. categorie x parole) conteggi e deduplicazioni usano array densi
+# indicizzati dalla chiave (tempo lineare) invece di np.unique (ordinamento)
+DENSE_KEYS_MAX_CELLS = 64_000_000
+COOCCURRENCE_FIELDS = ("class", "project")
+COUNT_UNITS = ("matches", "requirements")
+
+
+def _codes_to_labels(codes: Dict[str, int]) -> List[str]:
+    labels = [""] * len(codes)
+    for label, code in codes.items():
+        labels[code] = label
+    return labels
+
+
+def _count_keys(keys: np.ndarray, n_cells: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Chiavi distinte (ordinate) e numero di occorrenze di ognuna."""
+    if n_cells <= DENSE_KEYS_MAX_CELLS:
+        counts = np.bincount(keys, minlength=n_cells)
+        present = np.flatnonzero(counts)
+        return present, counts[present]
+    return np.unique(keys, return_counts=True)
+
+
+def _unique_keys(keys: np.ndarray, n_cells: int) -> np.ndarray:
+    """Chiavi distinte, in ordine crescente."""
+    if n_cells <= DENSE_KEYS_MAX_CELLS:
+        seen = np.zeros(n_cells, dtype=bool)
+        seen[keys] = True
+        return np.flatnonzero(seen)
+    return np.unique(keys)
+
+
+class LabeledColumns:
+    """
+    Risultati dell'etichettatura in forma colonnare (array NumPy con codici interi):
+      - un elemento per requisito: req_project, req_class (codici) e req_words (parole del testo);
+      - un elemento per riga di match: match_req (posizione del requisito), match_category e
+        match_word (codici; le parole sono in minuscolo).
+    I codici indicizzano le liste projects, classes, categories e words. Le righe di match sono
+    quelle di Labeled_Dataset.csv (una per coppia categoria/parola distinta di un requisito).
+    """
+
+    def __init__(self, req_ids: List[str], req_project: np.ndarray, req_class: np.ndarray, req_words: np.ndarray,
+                 match_req: np.ndarray, match_category: np.ndarray, match_word: np.ndarray,
+                 projects: List[str], classes: List[str], categories: List[str], words: List[str],
+                 source_signature: str = ""):
+        self.req_ids = req_ids
+        self.req_project = req_project
+        self.req_class = req_class
+        self.req_words = req_words
+        self.match_req = match_req
+        self.match_category = match_category
+        self.match_word = match_word
+        self.projects = projects
+        self.classes = classes
+        self.categories = categories
+        self.words = words
+        self.source_signature = source_signature
+
+    # --- Costruzione ---
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence[str]], source_signature: str = "") -> "LabeledColumns":
+        """
+        Costruisce le colonne dalle righe di Labeled_Dataset.csv (ID, ID progetto, testo, classe,
+        categoria, parola) nell'ordine del file; categoria e parola "NULL" per i requisiti senza match.
+        """
+        project_codes: Dict[str, int] = {}
+        class_codes: Dict[str, int] = {}
+        category_codes: Dict[str, int] = {}
+        word_codes: Dict[str, int] = {}
+        req_ids: List[str] = []
+        req_project, req_class, req_words = array("i"), array("i"), array("i")
+        match_req, match_category, match_word = array("i"), array("i"), array("i")
+        current_id = None
+        position = -1
+        for req_id, project, text, req_class_value, category, word in rows:
+            if req_id != current_id:
+                current_id = req_id
+                position += 1
+                req_ids.append(req_id)
+                req_project.append(project_codes.setdefault(project, len(project_codes)))
+                req_class.append(class_codes.setdefault(req_class_value, len(class_codes)))
+                req_words.append(len(WORD_RX.findall(text)))
+            if category == "NULL":
+                continue
+            match_req.append(position)
+            match_category.append(category_codes.setdefault(category, len(category_codes)))
+            word = word.casefold()
+            match_word.append(word_codes.setdefault(word, len(word_codes)))
+
+        columns = [np.frombuffer(column, dtype=np.int32) if len(column) else np.zeros(0, dtype=np.int32)
+                   for column in (req_project, req_class, req_words, match_req, match_category, match_word)]
+        return cls(req_ids, *columns, _codes_to_labels(project_codes), _codes_to_labels(class_codes),
+                   _codes_to_labels(category_codes), _codes_to_labels(word_codes), source_signature)
+
+    # --- Persistenza ---
+    def save(self, path: Path = ANALYTICS_CACHE_FILE) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp.npz")
+        np.savez(tmp_path, version=np.array(ANALYTICS_CACHE_VERSION), source_signature=np.array(self.source_signature),
+                 req_ids=np.array(self.req_ids, dtype=str), req_project=self.req_project, req_class=self.req_class,
+                 req_words=self.req_words, match_req=self.match_req, match_category=self.match_category,
+                 match_word=self.match_word, projects=np.array(self.projects, dtype=str),
+                 classes=np.array(self.classes, dtype=str), categories=np.array(self.categories, dtype=str),
+                 words=np.array(self.words, dtype=str))
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path = ANALYTICS_CACHE_FILE, source_signature: Optional[str] = None) -> Optional["LabeledColumns"]:
+        """Colonne salvate, oppure None se mancano, sono di un'altra versione o di un'altra sorgente."""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data["version"]) != ANALYTICS_CACHE_VERSION:
+                    return None
+                signature = str(data["source_signature"])
+                if source_signature is not None and signature != source_signature:
+                    return None
+                return cls(data["req_ids"].tolist(), data["req_project"], data["req_class"], data["req_words"],
+                           data["match_req"], data["match_category"], data["match_word"],
+                           data["projects"].tolist(), data["classes"].tolist(), data["categories"].tolist(),
+                           data["words"].tolist(), signature)
+        except (OSError, KeyError, ValueError):
+            return None
+
+    # --- Analisi ---
+    def field_codes(self, field: str) -> Tuple[np.ndarray, List[str]]:
+        if field == "class":
+            return self.req_class, self.classes
+        if field == "project":
+            return self.req_project, self.projects
+        raise ValueError(f"campo sconosciuto '{field}' (ammessi: {', '.join(COOCCURRENCE_FIELDS)})")
+
+    def cooccurrence(self, field: str, unit: str = "matches") -> np.ndarray:
+        """
+        Matrice categorie x valori di field ("class" o "project"): con unit="matches" conta le
+        righe di match, con unit="requirements" i requisiti con almeno un match della categoria.
+        """
+        values, labels = self.field_codes(field)
+        n_categories, n_values = len(self.categories), len(labels)
+        req, category = self.match_req, self.match_category
+        if unit == "requirements":
+            pairs = _unique_keys(req.astype(np.int64) * n_categories + category, len(self.req_ids) * n_categories)
+            req, category = pairs // n_categories, pairs % n_categories
+        elif unit != "matches":
+            raise ValueError(f"unità sconosciuta '{unit}' (ammesse: {', '.join(COUNT_UNITS)})")
+        keys = category.astype(np.int64) * n_values + values[req]
+        return np.bincount(keys, minlength=n_categories * n_values).reshape(n_categories, n_values)
+
+    def ambiguity(self, categories: Iterable[str] = AMBIGUITY_CATEGORIES) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Per ogni requisito: righe di match delle categorie di ambiguità e densità, cioè quelle
+        righe divise per il numero di parole del testo (0 per i testi senza parole).
+        """
+        wanted = {category.lower() for category in categories}
+        codes = [code for code, name in enumerate(self.categories) if name.lower() in wanted]
+        selected = self.match_req[np.isin(self.match_category, codes)]
+        counts = np.bincount(selected, minlength=len(self.req_ids))
+        density = counts / np.maximum(self.req_words, 1)
+        return counts, density
+
+    def top_words(self, k: int = TOP_K_WORDS) -> Dict[str, List[Tuple[str, int]]]:
+        """Le k parole più frequenti (righe di match) di ogni categoria; a parità di conteggio, in ordine alfabetico."""
+        n_words = len(self.words)
+        keys, counts = _count_keys(self.match_category.astype(np.int64) * n_words + self.match_word,
+                                   len(self.categories) * n_words)
+        category, word = keys // n_words, keys % n_words
+        word_rank = np.empty(n_words, dtype=np.int64)
+        word_rank[np.argsort(np.array(self.words, dtype=str), kind="stable")] = np.arange(n_words)
+        order = np.lexsort((word_rank[word], -counts, category))
+        category, word, counts = category[order], word[order], counts[order]
+        # Posizione di ogni riga all'interno del gruppo della sua categoria
+        rank = np.arange(len(category)) - np.searchsorted(category, category, side="left")
+        keep = rank < k
+        result: Dict[str, List[Tuple[str, int]]] = {name: [] for name in self.categories}
+        for code, word_code, count in zip(category[keep].tolist(), word[keep].tolist(), counts[keep].tolist()):
+            result[self.categories[code]].append((self.words[word_code], count))
+        return result
+
+
+def _value_order(labels: List[str]) -> List[int]:
+    """Indici dei valori in ordine di presentazione: numeri in ordine numerico, poi il resto in ordine alfabetico."""
+    return sorted(range(len(labels)), key=lambda i: (0, int(labels[i]), "") if labels[i].isdigit() else (1, 0, labels[i]))
+
+
+def _category_order(categories: List[str]) -> List[int]:
+    return sorted(range(len(categories)), key=lambda i: category_sort_key(categories[i].lower()))
+
+
+# --- Sorgenti ---
+def iter_csv_labeled_rows(labeled_file: Path):
+    with open(labeled_file, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f, delimiter=";")
+        header = next(reader)
+        cols = [header.index(name) for name in
+                ("ID", "ID progetto", "REQUISITO (testo)", "Classe dei requisiti", "CATEGORIA", "PAROLA")]
+        for row in reader:
+            if row:
+                yield tuple(row[col] for col in cols)
+
+
+def iter_store_labeled_rows(store_path: Path):
+    with open_label_store(store_path) as store:
+        yield from store.iter_labeled_rows()
+
+
+def load_labeled_columns(source: Path, cache_path: Path = ANALYTICS_CACHE_FILE, rebuild: bool = False) -> LabeledColumns:
+    """
+    Restituisce le colonne della sorgente (store .sqlite di tool.py --store oppure CSV etichettato),
+    riusando quelle salvate in cache_path se la sorgente non è cambiata.
+    """
+    signature = source_signature(source)
+    columns = None if rebuild else LabeledColumns.load(cache_path, signature)
+    if columns is not None:
+        return columns
+
+    start = time.perf_counter()
+    rows = iter_store_labeled_rows(source) if source.suffix == ".sqlite" else iter_csv_labeled_rows(source)
+    columns = LabeledColumns.from_rows(rows, signature)
+    columns.save(cache_path)
+    print(f"Colonne costruite da '{source}' in {time.perf_counter() - start:.2f}s: {len(columns.req_ids)} requisiti, "
+          f"{len(columns.match_req)} righe di match, {len(columns.words)} parole distinte.")
+    return columns
+
+
+# --- Report ---
+def build_report(columns: LabeledColumns, unit: str = "matches", k: int = TOP_K_WORDS,
+                 ambiguity_categories: Sequence[str] = AMBIGUITY_CATEGORIES) -> Dict[str, object]:
+    """Tutte le analisi in un dizionario serializzabile in JSON (le densità per requisito solo in riepilogo)."""
+    category_order = _category_order(columns.categories)
+    report: Dict[str, object] = {
+        "source_signature": columns.source_signature,
+        "requirements": len(columns.req_ids),
+        "match_rows": len(columns.match_req),
+        "unit": unit,
+    }
+    for field in COOCCURRENCE_FIELDS:
+        matrix = columns.cooccurrence(field, unit)
+        labels = columns.field_codes(field)[1]
+        value_order = _value_order(labels)
+        report[f"category_x_{field}"] = {
+            "categories": [columns.categories[i] for i in category_order],
+            "columns": [labels[j] for j in value_order],
+            "counts": matrix[np.ix_(category_order, value_order)].tolist(),
+        }
+
+    counts, density = columns.ambiguity(ambiguity_categories)
+    top = np.argsort(-density, kind="stable")[:TOP_AMBIGUOUS_REQUIREMENTS]
+    with_ambiguity = density[counts > 0]
+    report["ambiguity"] = {
+        "categories": list(ambiguity_categories),
+        "requirements_with_ambiguity": int(np.count_nonzero(counts)),
+        "mean_density": float(density.mean()) if len(density) else 0.0,
+        "percentiles": {f"p{p}": float(np.percentile(density, p)) if len(density) else 0.0 for p in (50, 90, 99)},
+        "max_density": float(density.max()) if len(density) else 0.0,
+        "mean_density_when_present": float(with_ambiguity.mean()) if len(with_ambiguity) else 0.0,
+        "top_requirements": [{"id": columns.req_ids[i], "matches": int(counts[i]), "words": int(columns.req_words[i]),
+                              "density": round(float(density[i]), 4)} for i in top.tolist() if counts[i]],
+    }
+    top_words = columns.top_words(k)
+    report["top_words"] = {columns.categories[i]: [[word, count] for word, count in top_words[columns.categories[i]]]
+                           for i in category_order}
+    return report
+
+
+def write_csv_outputs(columns: LabeledColumns, report: Dict[str, object], output_dir: Path) -> List[Path]:
+    output_dir.mkdir(parents=True, exist_ok=True)
+    written = []
+    for field, name in (("class", "categoria_x_classe.csv"), ("project", "categoria_x_progetto.csv")):
+        matrix = report[f"category_x_{field}"]
+        path = output_dir / name
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f, delimiter=";")
+            writer.writerow(["CATEGORIA"] + matrix["columns"])
+            for category, row in zip(matrix["categories"], matrix["counts"]):
+                writer.writerow([category] + row)
+        written.append(path)
+
+    counts, density = columns.ambiguity(report["ambiguity"]["categories"])
+    path = output_dir / "ambiguita_requisiti.csv"
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(["ID", "ID progetto", "Classe dei requisiti", "PAROLE", "MATCH_AMBIGUI", "DENSITA"])
+        for i, (count, value) in enumerate(zip(counts.tolist(), density.tolist())):
+            writer.writerow([columns.req_ids[i], columns.projects[columns.req_project[i]],
+                             columns.classes[columns.req_class[i]], int(columns.req_words[i]), count, f"{value:.4f}"])
+    written.append(path)
+
+    path = output_dir / "top_parole.csv"
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(["CATEGORIA", "RANGO", "PAROLA", "OCCORRENZE"])
+        for category, words in report["top_words"].items():
+            for rank, (word, count) in enumerate(words, 1):
+                writer.writerow([category, rank, word, count])
+    written.append(path)
+    return written
+
+
+def write_json_output(report: Dict[str, object], output_dir: Path) -> Path:
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path = output_dir / "analytics.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def print_summary(report: Dict[str, object]) -> None:
+    print(f"Requisiti: {report['requirements']}, righe di match: {report['match_rows']} (conteggio per {report['unit']})")
+    for field, title in (("class", "classe"), ("project", "progetto")):
+        matrix = report[f"category_x_{field}"]
+        print(f"Categoria x {title}: {len(matrix['categories'])} x {len(matrix['columns'])}")
+    ambiguity = report["ambiguity"]
+    print(f"Ambiguità ({', '.join(ambiguity['categories'])}): {ambiguity['requirements_with_ambiguity']} requisiti, "
+          f"densità media {ambiguity['mean_density']:.4f}, p90 {ambiguity['percentiles']['p90']:.4f}, "
+          f"massima {ambiguity['max_density']:.4f}")
+    for entry in ambiguity["top_requirements"][:5]:
+        print(f"  {entry['id']}: {entry['matches']} su {entry['words']} parole ({entry['density']:.4f})")
+    print("Parole più frequenti per categoria:")
+    for category, words in report["top_words"].items():
+        print(f"  {category}: " + ", ".join(f"{word} ({count})" for word, count in words[:5]))
+
+
+# --- Main Logic ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Analisi vettoriali dei risultati etichettati: matrici categoria x classe/progetto, "
+                    "densità di ambiguità per requisito e parole più frequenti per categoria.")
+    parser.add_argument("--source", type=Path, default=None,
+                        help=f"store .sqlite o CSV etichettato (default {LABEL_STORE_FILE} se esiste, altrimenti {LABELED_FILE})")
+    parser.add_argument("--output-dir", type=Path, default=ANALYTICS_DIR,
+                        help=f"directory dei risultati (default {ANALYTICS_DIR})")
+    parser.add_argument("--format", choices=("csv", "json", "both"), default="both", help="formato dei risultati (default both)")
+    parser.add_argument("--unit", choices=COUNT_UNITS, default="matches",
+                        help="le matrici contano righe di match o requisiti distinti (default matches)")
+    parser.add_argument("--top-k", type=int, default=TOP_K_WORDS, help=f"parole per categoria (default {TOP_K_WORDS})")
+    parser.add_argument("--ambiguity-categories", nargs="+", default=list(AMBIGUITY_CATEGORIES),
+                        help=f"categorie che contano come ambiguità (default: {' '.join(AMBIGUITY_CATEGORIES)})")
+    parser.add_argument("--rebuild", action="store_true", help="rilegge la sorgente anche se non è cambiata")
+    args = parser.parse_args()
+
+    source = args.source or (LABEL_STORE_FILE if LABEL_STORE_FILE.is_file() else LABELED_FILE)
+    try:
+        columns = load_labeled_columns(source, rebuild=args.rebuild)
+    except FileNotFoundError:
+        print(f"ERRORE: Sorgente '{source}' non trovata. Eseguire prima tool.py.")
+        exit(1)
+
+    start = time.perf_counter()
+    report = build_report(columns, args.unit, args.top_k, [c.lower() for c in args.ambiguity_categories])
+    print(f"Analisi calcolate in {(time.perf_counter() - start) * 1000:.1f} ms.")
+    print_summary(report)
+    written = []
+    if args.format in ("csv", "both"):
+        written += write_csv_outputs(columns, report, args.output_dir)
+    if args.format in ("json", "both"):
+        written.append(write_json_output(report, args.output_dir))
+    print("File scritti: " + ", ".join(str(path) for path in written))
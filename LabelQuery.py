@@ -0,0 +1,318 @@
+import argparse
+import csv
+import pickle
+import re
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from LabelStore import LABEL_STORE_FILE, open_label_store
+
+# --- Configurazione ---
+LABELED_FILE = Path("Labeled_Dataset.csv")
+QUERY_INDEX_FILE = Path(".cache") / "label_query_index.pkl"
+# Da incrementare a ogni modifica del formato dell'indice salvato
+QUERY_INDEX_VERSION = 1
+# Campi interrogabili; "category", "project" e "class" hanno pochi valori e vengono tenuti come
+# bitmap, "word" (parole e frasi trovate, in minuscolo) come liste ordinate di requisiti
+QUERY_FIELDS = ("category", "word", "project", "class")
+BITMAP_FIELDS = ("category", "project", "class")
+
+QUERY_TOKEN_RX = re.compile(r'\s*(?:(\()|(\))|(\w+):(?:"([^"]*)"|([^\s()]+))|([^\s()]+))')
+
+
+def positions_to_bitmap(positions: Iterable[int]) -> int:
+    """Bitmap (intero Python, bit i = requisito i) delle posizioni indicate, in tempo lineare."""
+    positions = list(positions)
+    if not positions:
+        return 0
+    buffer = bytearray((max(positions) >> 3) + 1)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def bitmap_to_positions(bitmap: int) -> List[int]:
+    """Posizioni dei bit a 1 della bitmap, in ordine crescente."""
+    bits = bin(bitmap)[:1:-1]
+    positions = []
+    position = bits.find("1")
+    while position != -1:
+        positions.append(position)
+        position = bits.find("1", position + 1)
+    return positions
+
+
+class LabelIndex:
+    """
+    Indici inversi sui risultati dell'etichettatura: categoria, parola, progetto e classe ->
+    requisiti. I requisiti sono numerati 0..n-1 nell'ordine del file; le condizioni su
+    categoria, progetto e classe sono bitmap (interi Python) già pronte, quelle sulle parole
+    liste ordinate (array) convertite in bitmap solo quando una query le usa.
+    """
+
+    def __init__(self, req_ids: List[str], bitmaps: Dict[str, Dict[str, int]], postings: Dict[str, array],
+                 match_rows: int = 0, source_signature: str = ""):
+        self.req_ids = req_ids
+        self.bitmaps = bitmaps
+        self.postings = postings
+        self.match_rows = match_rows
+        self.source_signature = source_signature
+        self.universe = (1 << len(req_ids)) - 1
+        self._word_bitmaps: Dict[str, int] = {}
+
+    # --- Costruzione ---
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[str, str, str, Optional[str], Optional[str]]],
+                  source_signature: str = "") -> "LabelIndex":
+        """
+        Costruisce l'indice da tuple (ID, progetto, classe, categoria, parola) nell'ordine del
+        file; categoria e parola sono None (o "NULL") per i requisiti senza match.
+        """
+        req_ids: List[str] = []
+        positions: Dict[str, Dict[str, List[int]]] = {field: {} for field in BITMAP_FIELDS}
+        postings: Dict[str, array] = {}
+        current_id = None
+        position = -1
+        match_rows = 0
+        for req_id, project, req_class, category, word in rows:
+            if req_id != current_id:
+                current_id = req_id
+                position += 1
+                req_ids.append(req_id)
+                positions["project"].setdefault(project, []).append(position)
+                positions["class"].setdefault(req_class, []).append(position)
+            if category is None or category == "NULL":
+                continue
+            match_rows += 1
+            category_positions = positions["category"].setdefault(category, [])
+            if not category_positions or category_positions[-1] != position:
+                category_positions.append(position)
+            word_postings = postings.setdefault(word.casefold(), array("I"))
+            if not word_postings or word_postings[-1] != position:
+                word_postings.append(position)
+
+        bitmaps = {field: {value: positions_to_bitmap(value_positions)
+                           for value, value_positions in positions[field].items()}
+                   for field in BITMAP_FIELDS}
+        return cls(req_ids, bitmaps, postings, match_rows, source_signature)
+
+    # --- Interrogazione ---
+    def term(self, field: str, value: str) -> int:
+        if field not in QUERY_FIELDS:
+            raise ValueError(f"campo sconosciuto '{field}' (ammessi: {', '.join(QUERY_FIELDS)})")
+        if field == "word":
+            key = value.casefold()
+            bitmap = self._word_bitmaps.get(key)
+            if bitmap is None:
+                bitmap = positions_to_bitmap(self.postings.get(key, ()))
+                self._word_bitmaps[key] = bitmap
+            return bitmap
+        if field == "category":
+            value = value.lower()
+        return self.bitmaps[field].get(value, 0)
+
+    def query(self, expression: str) -> int:
+        """Valuta un'espressione booleana (vedi QueryParser) e restituisce la bitmap dei requisiti."""
+        return QueryParser(expression, self).parse()
+
+    def ids(self, bitmap: int, limit: Optional[int] = None) -> List[str]:
+        positions = bitmap_to_positions(bitmap)
+        if limit is not None:
+            positions = positions[:limit]
+        return [self.req_ids[position] for position in positions]
+
+    def counts_by(self, field: str, bitmap: int) -> Dict[str, int]:
+        """Requisiti della bitmap per ogni valore di un campo a bitmap (categoria, progetto o classe)."""
+        if field not in BITMAP_FIELDS:
+            raise ValueError(f"conteggio per campo disponibile solo per: {', '.join(BITMAP_FIELDS)}")
+        counts = {value: (bitmap & value_bitmap).bit_count() for value, value_bitmap in self.bitmaps[field].items()}
+        return {value: count for value, count in counts.items() if count}
+
+    # --- Persistenza ---
+    def save(self, path: Path = QUERY_INDEX_FILE) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = (QUERY_INDEX_VERSION, self.source_signature, self.req_ids, self.bitmaps, self.postings, self.match_rows)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path = QUERY_INDEX_FILE, source_signature: Optional[str] = None) -> Optional["LabelIndex"]:
+        """Indice salvato, oppure None se manca, è di un'altra versione o di un'altra sorgente."""
+        try:
+            with open(path, "rb") as f:
+                version, signature, req_ids, bitmaps, postings, match_rows = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return None
+        if version != QUERY_INDEX_VERSION or (source_signature is not None and signature != source_signature):
+            return None
+        return cls(req_ids, bitmaps, postings, match_rows, signature)
+
+
+class QueryParser:
+    """
+    Parser a discesa ricorsiva delle query:
+        expr   := term_or ( OR term_or )*
+        term_or:= factor ( [AND] factor )*        (AND implicito tra condizioni adiacenti)
+        factor := NOT factor | '(' expr ')' | campo:valore | campo:"valore con spazi"
+    Esempio: category:vague AND category:mv AND project:3 AND class:US
+    """
+
+    def __init__(self, expression: str, index: LabelIndex):
+        self.index = index
+        self.tokens = self._tokenize(expression)
+        self.pos = 0
+
+    @staticmethod
+    def _tokenize(expression: str) -> List[Tuple[str, object]]:
+        tokens = []
+        for m in QUERY_TOKEN_RX.finditer(expression):
+            lparen, rparen, field, quoted, bare, word = m.groups()
+            if lparen:
+                tokens.append(("(", None))
+            elif rparen:
+                tokens.append((")", None))
+            elif field:
+                tokens.append(("term", (field.lower(), quoted if quoted is not None else bare)))
+            elif word and word.upper() in ("AND", "OR", "NOT"):
+                tokens.append((word.upper(), None))
+            elif word:
+                raise ValueError(f"elemento non valido nella query: '{word}' (usare campo:valore)")
+        return tokens
+
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def _next(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def parse(self) -> int:
+        if not self.tokens:
+            raise ValueError("query vuota")
+        result = self._expr()
+        if self.pos != len(self.tokens):
+            raise ValueError(f"elemento inatteso nella query: '{self._peek()}'")
+        return result
+
+    def _expr(self) -> int:
+        result = self._and()
+        while self._peek() == "OR":
+            self._next()
+            result |= self._and()
+        return result
+
+    def _and(self) -> int:
+        result = self._factor()
+        while self._peek() in ("AND", "NOT", "(", "term"):
+            if self._peek() == "AND":
+                self._next()
+            result &= self._factor()
+        return result
+
+    def _factor(self) -> int:
+        kind = self._peek()
+        if kind is None:
+            raise ValueError("query incompleta")
+        kind, value = self._next()
+        if kind == "NOT":
+            return self.index.universe & ~self._factor()
+        if kind == "(":
+            result = self._expr()
+            if self._peek() != ")":
+                raise ValueError("parentesi non chiusa")
+            self._next()
+            return result
+        if kind == "term":
+            return self.index.term(*value)
+        raise ValueError(f"elemento inatteso nella query: '{kind}'")
+
+
+# --- Sorgenti dell'indice ---
+def source_signature(path: Path) -> str:
+    st = path.stat()
+    return f"{path.resolve()}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def iter_store_rows(store_path: Path) -> Iterator[Tuple[str, str, str, Optional[str], Optional[str]]]:
+    with open_label_store(store_path) as store:
+        names = store.categories()
+        rows = store.conn.execute(
+            "SELECT r.req_id, r.project, r.class, m.category, r.text, m.start, m.end"
+            " FROM requirements r LEFT JOIN matches m ON m.req = r.id ORDER BY r.id, m.rowid"
+        )
+        for req_id, project, req_class, category, text, start, end in rows:
+            if category is None:
+                yield req_id, project, req_class, None, None
+            else:
+                yield req_id, project, req_class, names[category], text[start:end]
+
+
+def iter_csv_rows(labeled_file: Path) -> Iterator[Tuple[str, str, str, Optional[str], Optional[str]]]:
+    with open(labeled_file, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f, delimiter=";")
+        header = next(reader)
+        cols = [header.index(name) for name in ("ID", "ID progetto", "Classe dei requisiti", "CATEGORIA", "PAROLA")]
+        for row in reader:
+            if row:
+                yield tuple(row[col] for col in cols)
+
+
+def load_label_index(source: Path, index_path: Path = QUERY_INDEX_FILE, rebuild: bool = False) -> LabelIndex:
+    """
+    Restituisce l'indice della sorgente (store .sqlite di tool.py --store oppure CSV etichettato),
+    riusando quello salvato in index_path se la sorgente non è cambiata.
+    """
+    signature = source_signature(source)
+    index = None if rebuild else LabelIndex.load(index_path, signature)
+    if index is not None:
+        return index
+
+    start = time.perf_counter()
+    rows = iter_store_rows(source) if source.suffix == ".sqlite" else iter_csv_rows(source)
+    index = LabelIndex.from_rows(rows, signature)
+    index.save(index_path)
+    print(f"Indice costruito da '{source}' in {time.perf_counter() - start:.2f}s: {len(index.req_ids)} requisiti, "
+          f"{index.match_rows} righe di match, {len(index.postings)} parole distinte.")
+    return index
+
+
+# --- Main Logic ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Interroga i risultati etichettati con espressioni booleane su categoria, parola, progetto e classe.",
+        epilog='Esempio: python LabelQuery.py "category:vague AND category:mv AND project:3 AND class:US"')
+    parser.add_argument("query", help="espressione, es. 'category:vague AND (class:US OR class:PE) AND NOT word:\"as soon as\"'")
+    parser.add_argument("--source", type=Path, default=None,
+                        help=f"store .sqlite o CSV etichettato (default {LABEL_STORE_FILE} se esiste, altrimenti {LABELED_FILE})")
+    parser.add_argument("--count-by", choices=BITMAP_FIELDS, default=None, help="conta i requisiti trovati per valore del campo")
+    parser.add_argument("--limit", type=int, default=20, help="ID da stampare (default 20; 0 = nessuno, -1 = tutti)")
+    parser.add_argument("--rebuild", action="store_true", help="ricostruisce l'indice anche se la sorgente non è cambiata")
+    args = parser.parse_args()
+
+    source = args.source or (LABEL_STORE_FILE if LABEL_STORE_FILE.is_file() else LABELED_FILE)
+    try:
+        index = load_label_index(source, rebuild=args.rebuild)
+    except FileNotFoundError:
+        print(f"ERRORE: Sorgente '{source}' non trovata. Eseguire prima tool.py.")
+        exit(1)
+
+    start = time.perf_counter()
+    try:
+        result = index.query(args.query)
+    except ValueError as e:
+        print(f"ERRORE nella query: {e}")
+        exit(1)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    print(f"Requisiti trovati: {result.bit_count()} su {len(index.req_ids)} ({elapsed_ms:.2f} ms)")
+    if args.count_by:
+        for value, count in sorted(index.counts_by(args.count_by, result).items(), key=lambda item: -item[1]):
+            print(f"  {value}: {count}")
+    if args.limit and result:
+        ids = index.ids(result, None if args.limit < 0 else args.limit)
+        print(", ".join(ids) + (" ..." if 0 <= args.limit < result.bit_count() else ""))
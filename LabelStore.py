@@ -0,0 +1,180 @@
+import argparse
+import csv
+import json
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+# --- Configurazione ---
+LABEL_STORE_FILE = Path("Labeled_Dataset.sqlite")
+# Requisiti scritti per transazione
+STORE_COMMIT_EVERY = 5000
+
+Span = Tuple[str, str, int, int]  # (parola o frase, categoria, offset iniziale, offset finale)
+
+
+class LabelStore:
+    """
+    Risultati dell'etichettatura in forma normalizzata (SQLite): ogni requisito compare una
+    sola volta nella tabella requirements, ogni match è una riga di matches con ID interi di
+    requisito e categoria e gli offset (in caratteri) della parola nel testo. Le righe di
+    Labeled_Dataset.csv si ricostruiscono con iter_labeled_rows, senza ripetere il testo su disco.
+    """
+
+    def __init__(self, path: Path = LABEL_STORE_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(str(path))
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS requirements (
+                id INTEGER PRIMARY KEY, req_id TEXT NOT NULL, project TEXT NOT NULL,
+                text TEXT NOT NULL, class TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS categories (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+            CREATE TABLE IF NOT EXISTS matches (
+                req INTEGER NOT NULL, category INTEGER NOT NULL, start INTEGER NOT NULL, end INTEGER NOT NULL
+            );
+            """
+        )
+        self._category_ids: Dict[str, int] = dict(
+            (name, category_id) for category_id, name in self.conn.execute("SELECT id, name FROM categories"))
+        self._pending = 0
+
+    # --- Scrittura ---
+    def reset(self, header: List[str]) -> None:
+        """Svuota lo store (indici compresi, ricreati da finish) e registra l'intestazione delle righe esportate."""
+        self.conn.executescript(
+            "DROP INDEX IF EXISTS matches_req; DROP INDEX IF EXISTS matches_category;"
+            "DELETE FROM meta; DELETE FROM requirements; DELETE FROM categories; DELETE FROM matches;"
+        )
+        self._category_ids = {}
+        self.conn.execute("INSERT INTO meta (key, value) VALUES ('header', ?)", (json.dumps(header),))
+
+    def category_id(self, name: str) -> int:
+        category_id = self._category_ids.get(name)
+        if category_id is None:
+            category_id = len(self._category_ids) + 1
+            self.conn.execute("INSERT INTO categories (id, name) VALUES (?, ?)", (category_id, name))
+            self._category_ids[name] = category_id
+        return category_id
+
+    def add_requirement(self, record: Tuple[str, str, str, str], spans: Iterable[Span]) -> int:
+        """Aggiunge un requisito (ID, ID progetto, testo, classe) con i suoi match; restituisce l'ID intero."""
+        cursor = self.conn.execute("INSERT INTO requirements (req_id, project, text, class) VALUES (?, ?, ?, ?)", record)
+        req = cursor.lastrowid
+        self.conn.executemany("INSERT INTO matches (req, category, start, end) VALUES (?, ?, ?, ?)",
+                              [(req, self.category_id(category), start, end) for _, category, start, end in spans])
+        self._pending += 1
+        if self._pending >= STORE_COMMIT_EVERY:
+            self.conn.commit()
+            self._pending = 0
+        return req
+
+    def finish(self) -> None:
+        """Crea gli indici (dopo il caricamento, più veloce che aggiornarli riga per riga) e salva."""
+        self.conn.executescript(
+            "CREATE INDEX IF NOT EXISTS matches_req ON matches(req);"
+            "CREATE INDEX IF NOT EXISTS matches_category ON matches(category, req);"
+        )
+        self.conn.commit()
+        self._pending = 0
+
+    # --- Lettura ---
+    def header(self) -> List[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'header'").fetchone()
+        if row is None:
+            raise ValueError(f"store '{self.path}' senza intestazione: è stato scritto da tool.py --store?")
+        return json.loads(row[0])
+
+    def categories(self) -> Dict[int, str]:
+        return {category_id: name for name, category_id in self._category_ids.items()}
+
+    def iter_labeled_rows(self) -> Iterator[List[str]]:
+        """
+        Restituisce in streaming le stesse righe di Labeled_Dataset.csv (senza intestazione):
+        una per ogni coppia (categoria, parola) distinta di un requisito, oppure NULL;NULL.
+        """
+        names = self.categories()
+        rows = self.conn.execute(
+            "SELECT r.id, r.req_id, r.project, r.text, r.class, m.category, m.start, m.end"
+            " FROM requirements r LEFT JOIN matches m ON m.req = r.id ORDER BY r.id, m.rowid"
+        )
+        current = None
+        seen = set()
+        for req, req_id, project, text, req_class, category, start, end in rows:
+            if req != current:
+                current = req
+                seen = set()
+            if category is None:
+                yield [req_id, project, text, req_class, "NULL", "NULL"]
+                continue
+            key = (category, text[start:end])
+            if key not in seen:
+                seen.add(key)
+                yield [req_id, project, text, req_class, names[category], key[1]]
+
+    def export_csv(self, output_file: Path) -> int:
+        """Scrive l'equivalente di Labeled_Dataset.csv; restituisce le righe di dati scritte."""
+        written = 0
+        with open(output_file, 'w', encoding='utf-8', newline='') as out_f:
+            csv_writer = csv.writer(out_f, delimiter=';')
+            csv_writer.writerow(self.header())
+            for row in self.iter_labeled_rows():
+                csv_writer.writerow(row)
+                written += 1
+        return written
+
+    def stats(self) -> Dict[str, object]:
+        requirements = self.conn.execute("SELECT COUNT(*) FROM requirements").fetchone()[0]
+        matches = self.conn.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+        return {
+            "file": str(self.path),
+            "file_bytes": self.path.stat().st_size if self.path.exists() else 0,
+            "requirements": requirements,
+            "matches": matches,
+            "categories": len(self._category_ids),
+        }
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def open_label_store(path: Path) -> LabelStore:
+    """Apre uno store esistente in lettura (FileNotFoundError se manca, invece di crearne uno vuoto)."""
+    if not Path(path).is_file():
+        raise FileNotFoundError(2, "store non trovato", str(path))
+    return LabelStore(Path(path))
+
+
+# --- Main Logic ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gestione dello store normalizzato dei risultati di tool.py.")
+    parser.add_argument("--store", type=Path, default=LABEL_STORE_FILE, help=f"file dello store (default {LABEL_STORE_FILE})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="requisiti, match e dimensione dello store")
+    export_parser = sub.add_parser("export", help="esporta le righe nel formato di Labeled_Dataset.csv")
+    export_parser.add_argument("--output", type=Path, default=Path("Labeled_Dataset.csv"),
+                               help="file CSV di output (default Labeled_Dataset.csv)")
+    args = parser.parse_args()
+
+    try:
+        store = open_label_store(args.store)
+    except FileNotFoundError:
+        print(f"ERRORE: Store '{args.store}' non trovato. Eseguire prima: python tool.py --store")
+        exit(1)
+
+    with store:
+        if args.command == "export":
+            written = store.export_csv(args.output)
+            print(f"Esportate {written} righe in '{args.output}'.")
+        stats = store.stats()
+        print(f"Store '{stats['file']}': {stats['requirements']} requisiti, {stats['matches']} match, "
+              f"{stats['categories']} categorie, {stats['file_bytes'] / 1024:.1f} KiB")
@@ -0,0 +1,317 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from DictManager import DictManager, print_reload_report
+from tool import DICTIONARIES_DIR, Labeler
+
+# --- Configurazione ---
+DAEMON_HOST = "127.0.0.1"
+DAEMON_PORT = 8765
+# Un micro-batch parte quando raggiunge MAX_BATCH_SIZE testi o dopo MAX_WAIT_MS dal primo
+MAX_BATCH_SIZE = 32
+MAX_WAIT_MS = 5.0
+# Latenze tenute per il calcolo dei percentili (le più recenti)
+LATENCY_WINDOW = 10_000
+LATENCY_PERCENTILES = [50, 90, 95, 99]
+
+
+class LatencyStats:
+    """Latenze (in ms) delle ultime richieste e dimensioni dei micro-batch eseguiti."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.latencies_ms = deque(maxlen=window)
+        self.requests = 0
+        self.batches = 0
+        self.batched_texts = 0
+
+    def record_request(self, latency_ms: float) -> None:
+        self.latencies_ms.append(latency_ms)
+        self.requests += 1
+
+    def record_batch(self, size: int) -> None:
+        self.batches += 1
+        self.batched_texts += size
+
+    def snapshot(self) -> Dict[str, object]:
+        ordered = sorted(self.latencies_ms)
+        percentiles = {}
+        for p in LATENCY_PERCENTILES:
+            # Percentile "nearest rank" sulla finestra corrente
+            percentiles[f"p{p}_ms"] = round(ordered[max(0, -(-p * len(ordered) // 100) - 1)], 3) if ordered else None
+        return {
+            "requests": self.requests,
+            "window": len(ordered),
+            **percentiles,
+            "max_ms": round(ordered[-1], 3) if ordered else None,
+            "batches": self.batches,
+            "avg_batch_size": round(self.batched_texts / self.batches, 2) if self.batches else None,
+        }
+
+
+class MicroBatcher:
+    """
+    Raccoglie i testi delle richieste concorrenti in micro-batch (al più max_batch_size testi,
+    attesa massima max_wait_ms dal primo) e li etichetta con un solo passaggio di nlp.pipe in un
+    thread dedicato, così il ciclo asyncio resta libero di accettare altre richieste.
+    """
+
+    def __init__(self, labeler: Labeler, max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = MAX_WAIT_MS,
+                 dictionary_only: bool = False, stats: Optional[LatencyStats] = None):
+        self.labeler = labeler
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.dictionary_only = dictionary_only
+        self.stats = stats or LatencyStats()
+        self._queue: Optional[asyncio.Queue] = None
+        # Un solo thread: il modello spaCy viene usato da un batch alla volta
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="labeler")
+        self._worker: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def label(self, text: str) -> List[List[str]]:
+        """Etichetta un testo e restituisce le coppie [parola, categoria] distinte, in ordine di comparsa."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, self._label_texts, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.stats.record_batch(len(batch))
+            for (_, future), matches in zip(batch, results):
+                if not future.done():
+                    future.set_result(matches)
+
+    def _label_texts(self, texts: List[str]) -> List[List[List[str]]]:
+        results = []
+        for matches in self.labeler.label_batch(texts, self.max_batch_size, self.dictionary_only):
+            seen = set()
+            pairs = []
+            for word, category, _ in matches:
+                if (category, word) not in seen:
+                    seen.add((category, word))
+                    pairs.append([word, category])
+            results.append(pairs)
+        return results
+
+    def close(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+        self._executor.shutdown(wait=False)
+
+
+async def handle_message(line: str, batcher: MicroBatcher) -> Optional[dict]:
+    """
+    Gestisce una riga JSON e restituisce la risposta (None per le righe vuote):
+      {"id": 1, "text": "..."}   -> {"id": 1, "matches": [[parola, categoria], ...], "latency_ms": ...}
+      {"id": 2, "cmd": "stats"}  -> {"id": 2, "stats": {...percentili di latenza...}}
+      {"cmd": "reload"}          -> {"reload": {...resoconto...} o null se i dizionari non sono cambiati}
+      {"cmd": "ping"}            -> {"pong": true}
+    """
+    start = time.perf_counter()
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        message = json.loads(line)
+        if not isinstance(message, dict):
+            raise ValueError("la richiesta deve essere un oggetto JSON")
+    except ValueError as e:
+        return {"error": f"JSON non valido: {e}"}
+
+    response = {"id": message["id"]} if "id" in message else {}
+    command = message.get("cmd")
+    dict_manager = batcher.labeler.dict_manager
+    if command == "stats":
+        response["stats"] = batcher.stats.snapshot()
+        if dict_manager is not None:
+            response["stats"]["dict_version"] = dict_manager.version
+    elif command == "reload":
+        if dict_manager is None:
+            response["error"] = "ricaricamento dei dizionari non attivo (avviare con --watch-dicts)"
+        else:
+            # poll() può aspettare la fine del micro-batch in corso: non deve bloccare il ciclo asyncio
+            response["reload"] = await asyncio.get_running_loop().run_in_executor(None, dict_manager.poll)
+            if response["reload"] is not None:
+                print_reload_report(response["reload"])
+    elif command == "ping":
+        response["pong"] = True
+    elif command is not None:
+        response["error"] = f"comando sconosciuto: {command}"
+    elif not isinstance(message.get("text"), str):
+        response["error"] = "campo 'text' mancante o non stringa"
+    else:
+        try:
+            response["matches"] = await batcher.label(message["text"])
+        except Exception as e:
+            response["error"] = f"errore di etichettatura: {e}"
+            return response
+        latency_ms = (time.perf_counter() - start) * 1000
+        batcher.stats.record_request(latency_ms)
+        response["latency_ms"] = round(latency_ms, 3)
+    return response
+
+
+async def serve_stream(reader: asyncio.StreamReader, write_line, batcher: MicroBatcher) -> None:
+    """
+    Legge richieste JSON lines da reader e scrive ogni risposta appena pronta: le richieste
+    di uno stesso client sono elaborate in concorrenza (e finiscono negli stessi micro-batch),
+    quindi le risposte possono arrivare in ordine diverso e vanno associate tramite "id".
+    """
+    pending = set()
+
+    async def respond(line: str):
+        response = await handle_message(line, batcher)
+        if response is not None:
+            await write_line(json.dumps(response, ensure_ascii=False))
+
+    while True:
+        raw = await reader.readline()
+        if not raw:
+            break
+        task = asyncio.ensure_future(respond(raw.decode("utf-8", errors="replace")))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+    if pending:
+        await asyncio.gather(*pending)
+
+
+async def run_socket_server(batcher: MicroBatcher, host: str, port: int, unix_path: Optional[Path]) -> None:
+    async def handle_client(reader, writer):
+        lock = asyncio.Lock()
+
+        async def write_line(text: str):
+            async with lock:
+                writer.write(text.encode("utf-8") + b"\n")
+                await writer.drain()
+
+        try:
+            await serve_stream(reader, write_line, batcher)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    if unix_path is not None:
+        server = await asyncio.start_unix_server(handle_client, path=str(unix_path))
+        print(f"Daemon in ascolto sul socket '{unix_path}'.")
+    else:
+        server = await asyncio.start_server(handle_client, host, port)
+        print(f"Daemon in ascolto su {host}:{port}.")
+    async with server:
+        await server.serve_forever()
+
+
+class ThreadedLineReader:
+    """readline() asincrono su un file binario letto in un thread (per stdin rediretto da un file regolare)."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    async def readline(self) -> bytes:
+        return await asyncio.get_running_loop().run_in_executor(None, self.stream.readline)
+
+
+async def run_stdio(batcher: MicroBatcher, protocol_out) -> None:
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    try:
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    except ValueError:
+        # I trasporti per pipe accettano solo pipe, socket e terminali: con "--stdio < file" si legge in un thread
+        reader = ThreadedLineReader(sys.stdin.buffer)
+
+    async def write_line(text: str):
+        protocol_out.write(text + "\n")
+        protocol_out.flush()
+
+    await serve_stream(reader, write_line, batcher)
+
+
+async def main_async(args, protocol_out) -> None:
+    dict_manager = None
+    if args.watch_dicts > 0:
+        dict_manager = DictManager(args.dictionaries, use_dict_index=not args.no_dict_index)
+        dict_manager.start(args.watch_dicts)
+        print(f"Ricaricamento a caldo dei dizionari: controllo di '{args.dictionaries}' ogni {args.watch_dicts:g}s.")
+    labeler = Labeler(args.dictionaries, use_dict_index=not args.no_dict_index, dict_manager=dict_manager)
+    # Dizionari e modello vengono caricati una volta sola, prima della prima richiesta
+    start = time.perf_counter()
+    labeler.label("The system shall start.", dictionary_only=args.dictionary_only)
+    print(f"Etichettatore pronto in {time.perf_counter() - start:.2f}s "
+          f"(micro-batch: max {args.max_batch} testi, attesa max {args.max_wait_ms:g} ms).")
+
+    batcher = MicroBatcher(labeler, args.max_batch, args.max_wait_ms, args.dictionary_only)
+    batcher.start()
+    try:
+        if args.stdio:
+            await run_stdio(batcher, protocol_out)
+        else:
+            await run_socket_server(batcher, args.host, args.port, args.unix)
+    finally:
+        batcher.close()
+        if dict_manager is not None:
+            dict_manager.stop()
+        print(f"Statistiche finali: {json.dumps(batcher.stats.snapshot())}")
+
+
+# --- Main Logic ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Daemon di etichettatura dei requisiti (JSON lines) con micro-batching.")
+    parser.add_argument("--stdio", action="store_true", help="legge le richieste da stdin e risponde su stdout")
+    parser.add_argument("--host", default=DAEMON_HOST, help=f"indirizzo TCP (default {DAEMON_HOST})")
+    parser.add_argument("--port", type=int, default=DAEMON_PORT, help=f"porta TCP (default {DAEMON_PORT})")
+    parser.add_argument("--unix", type=Path, default=None, help="percorso di un socket Unix al posto della porta TCP")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH_SIZE,
+                        help=f"testi massimi per micro-batch (default {MAX_BATCH_SIZE})")
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS,
+                        help=f"attesa massima in ms per riempire un micro-batch (default {MAX_WAIT_MS:g})")
+    parser.add_argument("--dictionaries", type=Path, default=DICTIONARIES_DIR,
+                        help=f"directory dei dizionari (default {DICTIONARIES_DIR})")
+    parser.add_argument("--no-dict-index", action="store_true", help="legge direttamente i .txt senza indice compilato")
+    parser.add_argument("--dictionary-only", action="store_true", help="solo dizionari, senza modello spaCy")
+    parser.add_argument("--watch-dicts", type=float, default=0, metavar="SECONDI",
+                        help="ricarica a caldo i dizionari modificati, controllandoli ogni SECONDI (default 0: disattivato)")
+    args = parser.parse_args()
+
+    protocol_out = sys.stdout
+    # In modalità stdio stdout è riservato alle risposte: i messaggi di servizio vanno su stderr
+    log_target = sys.stderr if args.stdio else sys.stdout
+    with contextlib.redirect_stdout(log_target):
+        try:
+            asyncio.run(main_async(args, protocol_out))
+        except KeyboardInterrupt:
+            pass
+        except OSError as e:
+            print(f"ERRORE: {e}")
+            exit(1)
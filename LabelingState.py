@@ -0,0 +1,95 @@
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# --- Configurazione ---
+LABELING_STATE_FILE = Path(".cache") / "labeling_state.sqlite"
+
+DictEntry = Tuple[str, str, str]  # (tipo "word"/"phrase", voce normalizzata, categoria)
+
+
+class LabelingState:
+    """
+    Stato dell'ultima etichettatura, usato dalla modalità incrementale di tool.py:
+    le voci dei dizionari usate, hash del testo e posizione di ogni requisito e un indice
+    inverso chiave normalizzata (parola, lemma, parola di frase) -> requisiti.
+    """
+
+    def __init__(self, path: Path = LABELING_STATE_FILE):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path))
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS dict_entries (
+                kind TEXT NOT NULL, entry TEXT NOT NULL, category TEXT NOT NULL,
+                PRIMARY KEY (kind, entry, category)
+            );
+            CREATE TABLE IF NOT EXISTS requirements (
+                req_id TEXT PRIMARY KEY, seq INTEGER NOT NULL, text_hash TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS req_keys (key TEXT NOT NULL, req_id TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS req_keys_key ON req_keys(key);
+            CREATE INDEX IF NOT EXISTS req_keys_req ON req_keys(req_id);
+            """
+        )
+
+    # --- Metadati ---
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    # --- Voci dei dizionari ---
+    def dict_entries(self) -> Set[DictEntry]:
+        return set(self.conn.execute("SELECT kind, entry, category FROM dict_entries"))
+
+    def apply_dict_diff(self, added: Iterable[DictEntry], removed: Iterable[DictEntry]) -> None:
+        self.conn.executemany("DELETE FROM dict_entries WHERE kind = ? AND entry = ? AND category = ?", removed)
+        self.conn.executemany("INSERT OR IGNORE INTO dict_entries (kind, entry, category) VALUES (?, ?, ?)", added)
+
+    # --- Requisiti e indice inverso ---
+    def requirements(self) -> Dict[str, Tuple[int, str]]:
+        """req_id -> (posizione nell'ultima esecuzione, hash del testo)."""
+        return {req_id: (seq, text_hash) for req_id, seq, text_hash in
+                self.conn.execute("SELECT req_id, seq, text_hash FROM requirements")}
+
+    def requirements_with_key(self, key: str) -> Set[str]:
+        return {row[0] for row in self.conn.execute("SELECT DISTINCT req_id FROM req_keys WHERE key = ?", (key,))}
+
+    def requirements_with_all_keys(self, keys: List[str]) -> Set[str]:
+        """Requisiti che contengono tutte le chiavi (intersezione degli insiemi)."""
+        result: Optional[Set[str]] = None
+        for key in keys:
+            ids = self.requirements_with_key(key)
+            result = ids if result is None else result & ids
+            if not result:
+                return set()
+        return result or set()
+
+    def upsert_requirement(self, req_id: str, seq: int, text_hash: str, keys: Iterable[str]) -> None:
+        self.conn.execute("INSERT OR REPLACE INTO requirements (req_id, seq, text_hash) VALUES (?, ?, ?)",
+                          (req_id, seq, text_hash))
+        self.conn.execute("DELETE FROM req_keys WHERE req_id = ?", (req_id,))
+        self.conn.executemany("INSERT INTO req_keys (key, req_id) VALUES (?, ?)", ((key, req_id) for key in keys))
+
+    def update_positions(self, positions: Iterable[Tuple[int, str]]) -> None:
+        self.conn.executemany("UPDATE requirements SET seq = ? WHERE req_id = ?", positions)
+
+    def delete_requirements(self, req_ids: Iterable[str]) -> None:
+        ids = [(req_id,) for req_id in req_ids]
+        self.conn.executemany("DELETE FROM requirements WHERE req_id = ?", ids)
+        self.conn.executemany("DELETE FROM req_keys WHERE req_id = ?", ids)
+
+    def reset(self) -> None:
+        self.conn.executescript("DELETE FROM meta; DELETE FROM dict_entries; DELETE FROM requirements; DELETE FROM req_keys;")
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
@@ -1,98 +1,338 @@
-import os
+import argparse
+import csv
+import heapq
+import sys
+import tempfile
+from collections import Counter
+from itertools import groupby, islice
+from operator import itemgetter
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, TextIO, Tuple
 
+from tool import DICTIONARIES_DIR, POS_CATEGORY_MAPPING, category_sort_key, norm_phrase, norm_word
+
+# --- Configurazione ---
 # Nomi dei file
-file1_path = 'Vague_1.txt'
-file2_path = 'Vagues_2.txt'
-output_unione_path = 'vague.txt'
-output_statistiche_path = 'statistiche_file_uniti.txt'
+DEFAULT_SOURCES = [Path('Vague_1.txt'), Path('Vagues_2.txt')]
+output_unione_path = Path('vague.txt')
+output_statistiche_path = Path('statistiche_file_uniti.txt')
+output_collisioni_path = Path('collisioni_dizionari.csv')
+# Voci ordinate in memoria per ogni blocco (run) dell'ordinamento esterno: oltre questa
+# soglia un file viene ordinato a blocchi su disco e i blocchi fusi in streaming
+SORT_RUN_SIZE = 500_000
+# Coppie di categorie mostrate nel riepilogo delle collisioni
+TOP_COLLISION_PAIRS = 15
+
+
+def normalizza_parola(riga: str) -> str:
+    """Ogni parola viene "pulita" da spazi bianchi e resa minuscola ("" per le righe vuote)."""
+    return riga.strip().lower()
+
+
+def normalizza_voce_dizionario(riga: str) -> str:
+    """
+    Normalizza una riga di NewDict/ come fa tool.py (frasi e parole singole hanno regole
+    diverse) e restituisce "frase\\t<voce>" o "parola\\t<voce>", così che le due specie non si
+    confondano nell'ordinamento.
+    """
+    s = riga.strip()
+    if not s:
+        return ""
+    if (" " in s) or ("_" in s) or ("-" in s):
+        return f"frase\t{norm_phrase(s)}"
+    return f"parola\t{norm_word(s)}"
+
+
+# --- Ordinamento esterno ---
+def _scrivi_run(voci: List[str], tmp_dir: Path) -> Path:
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=tmp_dir, suffix=".run", delete=False) as f:
+        for voce in sorted(set(voci)):
+            f.write(f"{voce}\n")
+    return Path(f.name)
+
+
+def _leggi_run(path: Path) -> Iterator[str]:
+    with open(path, 'r', encoding='utf-8') as f:
+        for riga in f:
+            yield riga[:-1]
+
 
-def leggi_parole_da_file(filepath):
+def iter_voci_ordinate(filepath: Path,
+                       normalize: Callable[[str], str] = normalizza_parola,
+                       tmp_dir: Optional[Path] = None,
+                       run_size: int = SORT_RUN_SIZE) -> Iterator[str]:
     """
-    Legge un file di testo e restituisce un set di parole uniche.
-    Ogni parola viene "pulita" da spazi bianchi e resa minuscola.
+    Restituisce in ordine e senza duplicati le voci normalizzate di filepath, ordinato o no.
+    Il file viene letto a blocchi di run_size voci: un solo blocco resta in memoria, più
+    blocchi vengono scritti ordinati in tmp_dir e fusi con heapq.merge (memoria costante).
+    Un file mancante viene segnalato e trattato come vuoto.
     """
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            # .strip() rimuove spazi e a capo all'inizio/fine di ogni riga
-            # il costrutto { ... for ... } crea un set direttamente
-            # if riga.strip() serve a ignorare le righe vuote
-            parole = {riga.strip().lower() for riga in f if riga.strip()} #le inserisce in un set per evitare duplicati
-        return parole
+        f = open(filepath, 'r', encoding='utf-8')
     except FileNotFoundError:
         print(f"ERRORE: Il file '{filepath}' non è stato trovato.")
-        # Restituisce un set vuoto per evitare che lo script si blocchi
-        return set()
+        return
+    runs: List[Path] = []
+    with f:
+        voci = (voce for voce in map(normalize, f) if voce)
+        while True:
+            blocco = list(islice(voci, run_size))
+            if not blocco:
+                break
+            if not runs and len(blocco) < run_size:
+                # Tutto il file sta in un blocco: niente file temporanei
+                yield from sorted(set(blocco))
+                return
+            runs.append(_scrivi_run(blocco, tmp_dir))
+
+    try:
+        precedente = None
+        for voce in heapq.merge(*(_leggi_run(run) for run in runs)):
+            if voce != precedente:
+                yield voce
+                precedente = voce
+    finally:
+        for run in runs:
+            run.unlink(missing_ok=True)
+
+
+# --- Fusione a k vie ---
+def iter_fusione(sorgenti: Sequence[Path],
+                 normalize: Callable[[str], str] = normalizza_parola,
+                 tmp_dir: Optional[Path] = None,
+                 run_size: int = SORT_RUN_SIZE) -> Iterator[Tuple[str, int]]:
+    """
+    Fonde in streaming le voci di tutte le sorgenti e restituisce, in ordine, coppie
+    (voce, maschera) dove il bit i della maschera indica che la voce compare nella sorgente i.
+    """
+    def etichetta(i: int, path: Path) -> Iterator[Tuple[str, int]]:
+        for voce in iter_voci_ordinate(path, normalize, tmp_dir, run_size):
+            yield voce, i
+
+    flussi = [etichetta(i, path) for i, path in enumerate(sorgenti)]
+    for voce, gruppo in groupby(heapq.merge(*flussi), key=itemgetter(0)):
+        maschera = 0
+        for _, i in gruppo:
+            maschera |= 1 << i
+        yield voce, maschera
+
+
+class StatisticheSovrapposizione:
+    """
+    Conteggio delle voci per insieme di sorgenti in cui compaiono (maschera di bit): da qui
+    si ricavano unione, voci esclusive di ogni sorgente, voci comuni a tutte e la matrice di
+    sovrapposizione, senza tenere in memoria le voci.
+    """
 
+    def __init__(self, n_sorgenti: int):
+        self.n_sorgenti = n_sorgenti
+        self.per_maschera: Dict[int, int] = Counter()
 
-# Legge le parole da ciascun file e le mette in un set
-parole_set_1 = leggi_parole_da_file(file1_path)
-parole_set_2 = leggi_parole_da_file(file2_path)
+    def aggiungi(self, maschera: int) -> None:
+        self.per_maschera[maschera] += 1
 
-# Se uno dei file non è stato trovato, interrompe l'esecuzione
-if not parole_set_1 and not parole_set_2:
-    print("Entrambi i file di input sono vuoti o non trovati. Script terminato.")
-else:
-    #  Operazioni con i set per creare il file di output e le statistiche
+    @property
+    def maschera_tutte(self) -> int:
+        return (1 << self.n_sorgenti) - 1
 
-    # Unione: tutte le parole di entrambi i file, senza duplicati
-    parole_totali_uniche = parole_set_1.union(parole_set_2)
+    def totale(self) -> int:
+        return sum(self.per_maschera.values())
 
-    # Intersezione: solo le parole presenti in entrambi i file
-    parole_in_comune = parole_set_1.intersection(parole_set_2)
+    def comuni_a_tutte(self) -> int:
+        return self.per_maschera.get(self.maschera_tutte, 0)
 
-    # Differenza: parole presenti solo nel primo file (non nel secondo)
-    parole_solo_in_file1 = parole_set_1.difference(parole_set_2)
+    def solo_in(self, i: int) -> int:
+        return self.per_maschera.get(1 << i, 0)
 
-    # Differenza: parole presenti solo nel secondo file (non nel primo)
-    parole_solo_in_file2 = parole_set_2.difference(parole_set_1)
+    def matrice(self) -> List[List[int]]:
+        """matrice[i][j] = voci presenti sia nella sorgente i sia nella j (diagonale: voci della sorgente)."""
+        matrice = [[0] * self.n_sorgenti for _ in range(self.n_sorgenti)]
+        for maschera, conteggio in self.per_maschera.items():
+            presenti = [i for i in range(self.n_sorgenti) if maschera >> i & 1]
+            for i in presenti:
+                for j in presenti:
+                    matrice[i][j] += conteggio
+        return matrice
 
-    # Calcola i numeri per le statistiche
-    num_parole_comuni = len(parole_in_comune)
-    num_parole_totali_uniche = len(parole_totali_uniche)
-    num_parole_uniche_file1 = len(parole_solo_in_file1)
-    num_parole_uniche_file2 = len(parole_solo_in_file2)
 
+def scrivi_matrice_csv(path: Path, nomi: Sequence[str], matrice: List[List[int]]) -> None:
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow([""] + list(nomi))
+        for nome, riga in zip(nomi, matrice):
+            writer.writerow([nome] + riga)
+
+
+# --- Unione di N file ---
+def unisci_file(sorgenti: Sequence[Path],
+                output_path: Path,
+                comuni_f: TextIO,
+                tmp_dir: Optional[Path] = None,
+                run_size: int = SORT_RUN_SIZE) -> StatisticheSovrapposizione:
+    """
+    Scrive in output_path l'unione ordinata e senza duplicati delle sorgenti e in comuni_f le
+    voci presenti in tutte; restituisce le statistiche di sovrapposizione.
+    """
+    stats = StatisticheSovrapposizione(len(sorgenti))
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for parola, maschera in iter_fusione(sorgenti, normalizza_parola, tmp_dir, run_size):
+            f.write(f"{parola}\n")
+            stats.aggiungi(maschera)
+            if maschera == stats.maschera_tutte:
+                comuni_f.write(f"{parola}\n")
+    return stats
+
+
+def scrivi_report(out: TextIO, sorgenti: Sequence[Path], stats: StatisticheSovrapposizione, comuni_f: TextIO) -> None:
+    """Scrive il report delle statistiche; l'elenco delle voci comuni viene riletto in streaming da comuni_f."""
+    num_parole_totali_uniche = stats.totale()
+    num_parole_comuni = stats.comuni_a_tutte()
     # Calcola la percentuale (evitando la divisione per zero se non ci sono parole)
     percentuale_comuni = 0
     if num_parole_totali_uniche > 0:
         percentuale_comuni = (num_parole_comuni / num_parole_totali_uniche) * 100
 
-    # Scrive il file con l'unione delle parole senza duplicati grazie all'uso del set
-    # Ordina le parole alfabeticamente per un output più pulito
-    parole_ordinate = sorted(list(parole_totali_uniche))
+    out.write("--- Statistiche di Confronto File ---\n\n")
+    for i, path in enumerate(sorgenti, 1):
+        out.write(f"File {i}: '{path}'\n")
+    out.write("-------------------------------------\n\n")
 
-    with open(output_unione_path, 'w', encoding='utf-8') as f:
-        for parola in parole_ordinate:
-            f.write(f"{parola}\n")
-    print(f"File '{output_unione_path}' creato con successo con {num_parole_totali_uniche} parole uniche.")
-
-    #Crea il report delle statistiche
-    if parole_in_comune:
-        # Creiamo una lista di stringhe, dove ogni stringa è "- parola"
-        lista_comuni_formattata = [f"- {p}" for p in sorted(list(parole_in_comune))]
-        # Uniamo gli elementi della lista con il carattere "a capo" (\n)
-        # Aggiungiamo un \n all'inizio per separare il titolo dalla lista
-        elenco_comuni_stringa = "\n" + "\n".join(lista_comuni_formattata)
+    if len(sorgenti) == 2:
+        out.write(f"Numero di parole in comune: {num_parole_comuni}\n"
+                  f"Percentuale parole comuni sul totale delle parole uniche: {percentuale_comuni:.2f}%\n\n"
+                  f"Numero di parole presenti SOLO nel primo file: {stats.solo_in(0)}\n"
+                  f"Numero di parole presenti SOLO nel secondo file: {stats.solo_in(1)}\n\n")
+    else:
+        out.write(f"Numero di parole uniche in totale: {num_parole_totali_uniche}\n"
+                  f"Numero di parole presenti in TUTTI i file: {num_parole_comuni}\n"
+                  f"Percentuale parole comuni sul totale delle parole uniche: {percentuale_comuni:.2f}%\n\n")
+        for i in range(len(sorgenti)):
+            out.write(f"Numero di parole presenti SOLO nel file {i + 1}: {stats.solo_in(i)}\n")
+        out.write("\nMatrice di sovrapposizione (parole in comune tra coppie di file, "
+                  "sulla diagonale le parole uniche di ogni file):\n")
+        matrice = stats.matrice()
+        larghezza = max(len(str(valore)) for riga in matrice for valore in riga) + 2
+        out.write(" " * 8 + "".join(f"{f'F{j + 1}':>{larghezza}}" for j in range(len(sorgenti))) + "\n")
+        for i, riga in enumerate(matrice):
+            out.write(f"{f'F{i + 1}':<8}" + "".join(f"{valore:>{larghezza}}" for valore in riga) + "\n")
+        out.write("\n")
+
+    titolo = "Elenco parole in comune:" if len(sorgenti) == 2 else "Elenco parole in comune a tutti i file:"
+    if num_parole_comuni:
+        out.write(f"{titolo}\n")
+        comuni_f.seek(0)
+        for parola in comuni_f:
+            out.write(f"- {parola}")
     else:
-        elenco_comuni_stringa = " Nessuna" # Mettiamo uno spazio per allinearlo ai ":"
-
-    # Crea il report delle statistiche
-    report = (
-        f"--- Statistiche di Confronto File ---\n\n"
-        f"File 1: '{file1_path}'\n"
-        f"File 2: '{file2_path}'\n"
-        f"-------------------------------------\n\n"
-        f"Numero di parole in comune: {num_parole_comuni}\n"
-        f"Percentuale parole comuni sul totale delle parole uniche: {percentuale_comuni:.2f}%\n\n"
-        f"Numero di parole presenti SOLO nel primo file: {num_parole_uniche_file1}\n"
-        f"Numero di parole presenti SOLO nel secondo file: {num_parole_uniche_file2}\n\n"
-        f"Elenco parole in comune:{elenco_comuni_stringa}\n" 
-    )
-    #Stampa il report a schermo
-    print("\n--- STATISTICHE ---")
-    print(report)
-
-    #Scrive il report sul file delle statistiche
-    with open(output_statistiche_path, 'w', encoding='utf-8') as f:
-        f.write(report)
-    print(f"File di statistiche '{output_statistiche_path}' creato con successo.")
\ No newline at end of file
+        out.write(f"{titolo} Nessuna\n")
+
+
+# --- Collisioni tra categorie di NewDict/ ---
+def trova_collisioni(dir_path: Path,
+                     output_path: Path,
+                     tmp_dir: Optional[Path] = None,
+                     run_size: int = SORT_RUN_SIZE) -> Tuple[List[str], StatisticheSovrapposizione, Counter]:
+    """
+    Cerca le voci presenti in più file di categoria di dir_path (normalizzate come in tool.py)
+    e le scrive in output_path con la categoria che prevale:
+      - parole singole: tra le categorie compatibili con POS/tag del token vince la prima
+        secondo CATEGORY_PRIORITY; la colonna VINCITORE è quella che prevale quando il token
+        è compatibile con tutte;
+      - frasi: FlashText tiene una sola categoria per frase, quella dell'ultimo file caricato
+        (in ordine di nome): le altre non vengono mai assegnate.
+    Restituisce (categorie, statistiche di sovrapposizione, collisioni per coppia di categorie).
+    """
+    sorgenti = sorted(dir_path.glob("*.txt"))
+    categorie = [path.stem.lower() for path in sorgenti]
+    stats = StatisticheSovrapposizione(len(sorgenti))
+    coppie: Counter = Counter()
+    with open(output_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(["TIPO", "VOCE", "CATEGORIE", "VINCITORE", "REGOLA"])
+        for voce, maschera in iter_fusione(sorgenti, normalizza_voce_dizionario, tmp_dir, run_size):
+            stats.aggiungi(maschera)
+            if maschera & (maschera - 1) == 0:
+                continue  # una sola categoria
+            tipo, testo = voce.split("\t", 1)
+            presenti = [categorie[i] for i in range(len(categorie)) if maschera >> i & 1]
+            ordinate = sorted(presenti, key=category_sort_key)
+            for i, a in enumerate(ordinate):
+                for b in ordinate[i + 1:]:
+                    coppie[(a, b)] += 1
+            if tipo == "frase":
+                vincitore, regola = presenti[-1], "ultimo file caricato"
+            else:
+                candidate = [c for c in ordinate if c in POS_CATEGORY_MAPPING]
+                vincitore = candidate[0] if candidate else ""
+                regola = "CATEGORY_PRIORITY" if candidate else "nessuna regola POS"
+            writer.writerow([tipo, testo, ",".join(ordinate), vincitore, regola])
+    return categorie, stats, coppie
+
+
+def esegui_collisioni(dir_path: Path, output_path: Path, matrice_path: Optional[Path],
+                      tmp_dir: Optional[Path], run_size: int) -> None:
+    if not dir_path.is_dir():
+        print(f"ERRORE: La directory dei dizionari '{dir_path}' non esiste.")
+        exit(1)
+    categorie, stats, coppie = trova_collisioni(dir_path, output_path, tmp_dir, run_size)
+    n_collisioni = sum(conteggio for maschera, conteggio in stats.per_maschera.items() if maschera & (maschera - 1))
+    print(f"Voci distinte in '{dir_path}': {stats.totale()} in {len(categorie)} categorie.")
+    print(f"Voci presenti in più categorie: {n_collisioni} (dettaglio in '{output_path}').")
+    if coppie:
+        print("Coppie di categorie con più voci in comune:")
+        for (a, b), conteggio in coppie.most_common(TOP_COLLISION_PAIRS):
+            print(f"  {a:<12} {b:<12} {conteggio}")
+    if matrice_path is not None:
+        scrivi_matrice_csv(matrice_path, categorie, stats.matrice())
+        print(f"Matrice di sovrapposizione tra categorie scritta in '{matrice_path}'.")
+
+
+# --- Main Logic ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Unisce N elenchi di parole (ordinamento esterno e fusione a k vie) con statistiche di "
+                    "sovrapposizione, oppure cerca le voci in comune tra le categorie di NewDict/.")
+    parser.add_argument("sources", type=Path, nargs="*", default=DEFAULT_SOURCES,
+                        help="file da unire, una parola per riga (default: Vague_1.txt Vagues_2.txt)")
+    parser.add_argument("--output", type=Path, default=output_unione_path,
+                        help=f"file con l'unione delle parole (default {output_unione_path})")
+    parser.add_argument("--stats", type=Path, default=output_statistiche_path,
+                        help=f"report delle statistiche (default {output_statistiche_path})")
+    parser.add_argument("--matrix", type=Path, default=None,
+                        help="scrive anche la matrice di sovrapposizione in CSV")
+    parser.add_argument("--collisions", type=Path, nargs="?", const=DICTIONARIES_DIR, default=None,
+                        help=f"analizza le voci in più categorie della directory dei dizionari (default {DICTIONARIES_DIR})")
+    parser.add_argument("--collisions-output", type=Path, default=output_collisioni_path,
+                        help=f"CSV delle collisioni tra categorie (default {output_collisioni_path})")
+    parser.add_argument("--run-size", type=int, default=SORT_RUN_SIZE,
+                        help=f"voci ordinate in memoria per blocco dell'ordinamento esterno (default {SORT_RUN_SIZE})")
+    parser.add_argument("--tmp-dir", type=Path, default=None, help="directory dei blocchi temporanei (default quella di sistema)")
+    args = parser.parse_args()
+    run_size = max(1, args.run_size)
+
+    if args.collisions is not None:
+        esegui_collisioni(args.collisions, args.collisions_output, args.matrix, args.tmp_dir, run_size)
+        exit(0)
+
+    sorgenti = args.sources
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as comuni_f:
+        stats = unisci_file(sorgenti, args.output, comuni_f, args.tmp_dir, run_size)
+
+        # Se tutti i file sono vuoti o mancanti, interrompe l'esecuzione
+        if stats.totale() == 0:
+            args.output.unlink(missing_ok=True)
+            print("Tutti i file di input sono vuoti o non trovati. Script terminato.")
+            exit(0)
+        print(f"File '{args.output}' creato con successo con {stats.totale()} parole uniche.")
+
+        # Stampa il report a schermo e lo scrive sul file delle statistiche
+        print("\n--- STATISTICHE ---")
+        scrivi_report(sys.stdout, sorgenti, stats, comuni_f)
+        print()
+        with open(args.stats, 'w', encoding='utf-8') as f:
+            scrivi_report(f, sorgenti, stats, comuni_f)
+    print(f"File di statistiche '{args.stats}' creato con successo.")
+
+    if args.matrix is not None:
+        scrivi_matrice_csv(args.matrix, [str(path) for path in sorgenti], stats.matrice())
+        print(f"Matrice di sovrapposizione scritta in '{args.matrix}'.")
@@ -0,0 +1,166 @@
+import contextlib
+import csv
+import json
+import resource
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Optional
+
+# --- Configurazione ---
+METRICS_FILE = Path("metrics.json")
+# File del profilo per profiler: statistiche binarie per cProfile, testo per pyinstrument
+PROFILE_FILES = {"cprofile": Path(".cache") / "tool_profile.pstats",
+                 "pyinstrument": Path(".cache") / "tool_profile.txt"}
+PROFILERS = tuple(PROFILE_FILES)
+# Funzioni mostrate nel riepilogo del profilo cProfile
+PROFILE_TOP_N = 25
+
+
+class StageMetrics:
+    """
+    Tempi e contatori per fase di tool.py. add_time(nome, secondi) somma il tempo e le
+    chiamate di una fase, count(nome) incrementa un contatore, count_category(categoria)
+    conta i match per categoria. Le metriche di più processi si sommano con merge.
+    """
+
+    def __init__(self):
+        self.stage_seconds: Dict[str, float] = Counter()
+        self.stage_calls: Dict[str, int] = Counter()
+        self.counters: Dict[str, int] = Counter()
+        self.category_matches: Dict[str, int] = Counter()
+        self.extra: Dict[str, object] = {}
+        self._start = time.perf_counter()
+
+    def add_time(self, name: str, seconds: float, calls: int = 1) -> None:
+        self.stage_seconds[name] += seconds
+        self.stage_calls[name] += calls
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] += n
+
+    def count_category(self, category: str, n: int = 1) -> None:
+        self.category_matches[category] += n
+
+    def merge(self, other: Dict[str, object]) -> None:
+        """Somma le metriche esportate da to_dict (es. quelle di un worker)."""
+        for name, values in other.get("stages", {}).items():
+            self.add_time(name, values["seconds"], values["calls"])
+        for name, value in other.get("counters", {}).items():
+            self.counters[name] += value
+        for category, value in other.get("category_matches", {}).items():
+            self.category_matches[category] += value
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "stages": {name: {"seconds": round(self.stage_seconds[name], 6), "calls": self.stage_calls[name]}
+                       for name in self.stage_seconds},
+            "counters": dict(self.counters),
+            "category_matches": dict(sorted(self.category_matches.items(), key=lambda item: -item[1])),
+        }
+
+    def report(self) -> Dict[str, object]:
+        """Metriche complete: fasi, contatori, throughput, tassi di hit delle cache e picco di RSS."""
+        elapsed = time.perf_counter() - self._start
+        report = {"elapsed_seconds": round(elapsed, 6), **self.to_dict()}
+        throughput = {}
+        for counter, key in (("requirements", "requirements_per_sec"), ("tokens", "tokens_per_sec")):
+            if self.counters.get(counter) and elapsed > 0:
+                throughput[key] = round(self.counters[counter] / elapsed, 2)
+        report["throughput"] = throughput
+        hit_rates = {}
+        for name in ("resolver", "parse_cache"):
+            lookups = self.counters.get(f"{name}_hits", 0) + self.counters.get(f"{name}_misses", 0)
+            if lookups:
+                hit_rates[name] = round(self.counters[f"{name}_hits"] / lookups, 4)
+        report["cache_hit_rates"] = hit_rates
+        report["peak_rss_mb"] = peak_rss_mb()
+        report.update(self.extra)
+        return report
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    """Picco di memoria residente del processo e dei figli terminati (es. worker), in MiB."""
+    # ru_maxrss è in KiB su Linux e in byte su macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit / (1024 * 1024)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit / (1024 * 1024)
+    return {"self": round(own, 1), "children": round(children, 1)}
+
+
+def write_metrics(report: Dict[str, object], path: Path) -> None:
+    """Scrive il report in JSON oppure, se path termina in .csv, come righe (sezione;metrica;valore)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix.lower() != ".csv":
+        path.write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        return
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(["sezione", "metrica", "valore"])
+        for section, values in report.items():
+            if not isinstance(values, dict):
+                writer.writerow(["totale", section, values])
+                continue
+            for name, value in values.items():
+                if isinstance(value, dict):
+                    for sub_name, sub_value in value.items():
+                        writer.writerow([section, f"{name}.{sub_name}", sub_value])
+                else:
+                    writer.writerow([section, name, value])
+
+
+def print_stage_summary(report: Dict[str, object]) -> None:
+    elapsed = report["elapsed_seconds"] or 1.0
+    print("Tempi per fase:")
+    for name, values in sorted(report["stages"].items(), key=lambda item: -item[1]["seconds"]):
+        print(f"  {name:<14} {values['seconds']:>9.3f}s  ({100 * values['seconds'] / elapsed:5.1f}%)  {values['calls']} chiamate")
+    for key, value in report["throughput"].items():
+        print(f"  {key}: {value}")
+    print(f"  picco RSS: {report['peak_rss_mb']['self']} MiB (processi figli: {report['peak_rss_mb']['children']} MiB)")
+
+
+@contextlib.contextmanager
+def profiling(profiler: Optional[str], output: Optional[Path] = None):
+    """
+    Se profiler è "cprofile" o "pyinstrument" profila il blocco e salva il risultato in output
+    (pstats per cProfile, testo per pyinstrument; se None il file di PROFILE_FILES del
+    profiler usato); con profiler None non fa nulla.
+    pyinstrument è opzionale: se non è installato si usa cProfile.
+    """
+    if profiler is None:
+        yield
+        return
+
+    if profiler == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("Avviso: pyinstrument non è installato (pip install pyinstrument), uso cProfile.")
+            profiler = "cprofile"
+
+    if output is None:
+        output = PROFILE_FILES[profiler]
+    output.parent.mkdir(parents=True, exist_ok=True)
+    if profiler == "pyinstrument":
+        sampler = Profiler()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            output.write_text(sampler.output_text(unicode=True, color=False), encoding="utf-8")
+            print(f"Profilo pyinstrument salvato in '{output}'.")
+        return
+
+    import cProfile
+    import pstats
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(str(output))
+        print(f"\nProfilo cProfile salvato in '{output}' (python -m pstats {output}). Funzioni più costose:")
+        pstats.Stats(profile).sort_stats("cumulative").print_stats(PROFILE_TOP_N)
@@ -0,0 +1,272 @@
+import argparse
+import csv
+import re
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+from AssociazioneID import ArffFormatError, Requirement, parse_requirement_line
+
+# --- Configurazione ---
+REQUIREMENTS_FILE = Path("Dataset_With_R_ID.txt")
+DUPLICATES_FILE = Path("Cluster_Duplicati.csv")
+DUPLICATES_HEADER = ["CLUSTER", "ID", "RAPPRESENTANTE", "JACCARD"]
+# Soglia di somiglianza di Jaccard tra gli insiemi di shingle di due requisiti
+JACCARD_THRESHOLD = 0.6
+# Parole consecutive per shingle
+SHINGLE_SIZE = 2
+NUM_PERMUTATIONS = 128
+MINHASH_SEED = 42
+# Shingle elaborati insieme nel calcolo vettoriale delle firme (memoria ~ 8 * NUM_PERMUTATIONS byte ciascuno)
+MINHASH_CHUNK_SHINGLES = 1 << 16
+# Peso dei falsi negativi nella scelta di bande e righe: le coppie candidate sono comunque
+# verificate con la Jaccard esatta, quindi un falso positivo costa solo un confronto in più
+LSH_FALSE_NEGATIVE_WEIGHT = 0.9
+SHINGLE_WORD_RX = re.compile(r"\w+", flags=re.UNICODE)
+# Primo di Mersenne 2^31 - 1: coefficienti e hash ridotti modulo p, quindi a * x + b < 2^63 sta in un uint64.
+# I coefficienti devono coprire tutto [1, p): con a piccolo rispetto a p la permutazione resterebbe quasi
+# monotona in x e la stima della Jaccard sarebbe distorta.
+_MERSENNE_PRIME = (1 << 31) - 1
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> frozenset:
+    """Hash crc32 degli shingle di size parole consecutive (in minuscolo) del testo."""
+    words = SHINGLE_WORD_RX.findall(text.casefold())
+    if len(words) <= size:
+        return frozenset([zlib.crc32(" ".join(words).encode("utf-8"))]) if words else frozenset()
+    return frozenset(zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) for i in range(len(words) - size + 1))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    intersection = len(a & b)
+    return intersection / (len(a) + len(b) - intersection)
+
+
+def lsh_parameters(threshold: float, num_permutations: int = NUM_PERMUTATIONS,
+                   false_negative_weight: float = LSH_FALSE_NEGATIVE_WEIGHT) -> Tuple[int, int]:
+    """
+    (bande, righe per banda) che minimizzano l'area pesata di falsi positivi e falsi negativi
+    della curva di LSH 1 - (1 - s^righe)^bande attorno alla soglia.
+    """
+    def area(low: float, high: float, probability) -> float:
+        steps = 200
+        width = (high - low) / steps
+        return sum(probability(low + (i + 0.5) * width) for i in range(steps)) * width
+
+    best = None
+    for rows in range(1, num_permutations + 1):
+        bands = num_permutations // rows
+        false_positive = area(0.0, threshold, lambda s: 1 - (1 - s ** rows) ** bands)
+        false_negative = area(threshold, 1.0, lambda s: (1 - s ** rows) ** bands)
+        error = (1 - false_negative_weight) * false_positive + false_negative_weight * false_negative
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+def minhash_signatures(shingle_sets: List[frozenset], num_permutations: int = NUM_PERMUTATIONS,
+                       seed: int = MINHASH_SEED):
+    """
+    Firme MinHash (matrice n x num_permutations di uint64) con permutazioni (a * x + b) mod p,
+    calcolate con NumPy a blocchi di MINHASH_CHUNK_SHINGLES shingle. Le righe degli insiemi vuoti
+    restano al valore massimo.
+    """
+    # NumPy è importato solo qui: tool.py legge i cluster senza richiederlo
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _MERSENNE_PRIME, num_permutations, dtype=np.uint64)
+    b = rng.integers(0, _MERSENNE_PRIME, num_permutations, dtype=np.uint64)
+    signatures = np.full((len(shingle_sets), num_permutations), _MERSENNE_PRIME, dtype=np.uint64)
+
+    rows: List[int] = []
+    hashes: List[int] = []
+    starts: List[int] = []
+
+    def flush():
+        if not rows:
+            return
+        values = np.array(hashes, dtype=np.uint64) % np.uint64(_MERSENNE_PRIME)
+        permuted = (values[:, None] * a + b) % np.uint64(_MERSENNE_PRIME)
+        signatures[rows] = np.minimum.reduceat(permuted, starts, axis=0)
+        rows.clear()
+        hashes.clear()
+        starts.clear()
+
+    for row, shingle_set in enumerate(shingle_sets):
+        if not shingle_set:
+            continue
+        if hashes and len(hashes) + len(shingle_set) > MINHASH_CHUNK_SHINGLES:
+            flush()
+        rows.append(row)
+        starts.append(len(hashes))
+        hashes.extend(shingle_set)
+    flush()
+    return signatures
+
+
+def lsh_candidate_groups(signatures, bands: int, rows: int, valid=None) -> Iterable[List[int]]:
+    """
+    Per ogni banda, i gruppi (di almeno due righe) con la stessa porzione di firma: solo le
+    coppie all'interno di un gruppo vengono confrontate. valid esclude le righe senza shingle.
+    """
+    import numpy as np
+
+    indices = np.arange(len(signatures)) if valid is None else np.flatnonzero(valid)
+    if len(indices) < 2:
+        return
+    multipliers = np.random.default_rng(MINHASH_SEED + 1).integers(1, 1 << 63, rows, dtype=np.uint64) | np.uint64(1)
+    for band in range(bands):
+        # Hash della porzione di firma in un solo uint64 (le collisioni costano solo una verifica in più)
+        keys = (signatures[indices, band * rows:(band + 1) * rows] * multipliers).sum(axis=1, dtype=np.uint64)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        boundaries = np.flatnonzero(np.diff(sorted_keys)) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [len(sorted_keys)]))
+        for start, end in zip(starts[ends - starts > 1].tolist(), ends[ends - starts > 1].tolist()):
+            yield indices[order[start:end]].tolist()
+
+
+class DisjointSet:
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+
+    def find(self, item: int) -> int:
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, a: int, b: int) -> None:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            # La radice è sempre il requisito che compare per primo nel file
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+
+def find_near_duplicates(texts: List[str], threshold: float = JACCARD_THRESHOLD, shingle_size: int = SHINGLE_SIZE,
+                         num_permutations: int = NUM_PERMUTATIONS) -> Tuple[List[List[int]], Dict[str, int]]:
+    """
+    Cluster di quasi-duplicati: componenti connesse del grafo in cui due testi sono collegati se
+    la Jaccard esatta dei loro shingle è almeno threshold. Le coppie da verificare sono solo
+    quelle candidate di LSH (firme MinHash divise in bande), quindi il tempo non cresce con il
+    quadrato dei requisiti. Ogni cluster (di almeno due testi) è una lista di posizioni in
+    ordine crescente: il primo è il rappresentante. Restituisce anche i contatori del calcolo.
+    """
+    shingle_sets = [shingles(text, shingle_size) for text in texts]
+    bands, rows = lsh_parameters(threshold, num_permutations)
+    signatures = minhash_signatures(shingle_sets, num_permutations)
+    valid = [bool(shingle_set) for shingle_set in shingle_sets]
+
+    components = DisjointSet(len(texts))
+    verified = 0
+    for group in lsh_candidate_groups(signatures, bands, rows, valid):
+        for i, item in enumerate(group):
+            for other in group[:i]:
+                # Coppie già nello stesso cluster (es. gruppi di duplicati esatti) non vanno riverificate
+                if components.find(item) == components.find(other):
+                    continue
+                verified += 1
+                if jaccard(shingle_sets[item], shingle_sets[other]) >= threshold:
+                    components.union(item, other)
+
+    clusters: Dict[int, List[int]] = {}
+    for position in range(len(texts)):
+        clusters.setdefault(components.find(position), []).append(position)
+    result = [members for _, members in sorted(clusters.items()) if len(members) > 1]
+    stats = {"requirements": len(texts), "bands": bands, "rows": rows, "verified_pairs": verified,
+             "clusters": len(result), "duplicates": sum(len(members) - 1 for members in result)}
+    return result, stats
+
+
+# --- Lettura e scrittura ---
+def read_requirements(path: Path) -> List[Requirement]:
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_num, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                records.append(parse_requirement_line(line, line_num))
+            except ArffFormatError as e:
+                print(f"Avviso: Riga {line_num} non parsabile (ignorata): {e}")
+    return records
+
+
+def write_clusters(path: Path, records: List[Requirement], clusters: List[List[int]], shingle_size: int) -> None:
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(DUPLICATES_HEADER)
+        for cluster_id, members in enumerate(clusters, 1):
+            representative = records[members[0]]
+            representative_shingles = shingles(representative.text, shingle_size)
+            for position in members:
+                similarity = jaccard(representative_shingles, shingles(records[position].text, shingle_size))
+                writer.writerow([cluster_id, records[position].id, representative.id, f"{similarity:.4f}"])
+
+
+def read_representatives(path: Path = DUPLICATES_FILE) -> Dict[str, str]:
+    """ID di ogni requisito duplicato -> ID del rappresentante del suo cluster (i rappresentanti esclusi)."""
+    representatives: Dict[str, str] = {}
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f, delimiter=";")
+        header = next(reader, None)
+        if header != DUPLICATES_HEADER:
+            raise ValueError(f"'{path}' non è un file di cluster di NearDuplicates.py (intestazione {header})")
+        for _, req_id, representative, _ in reader:
+            if req_id != representative:
+                representatives[req_id] = representative
+    return representatives
+
+
+def print_clusters(records: List[Requirement], clusters: List[List[int]], limit: int) -> None:
+    for cluster_id, members in enumerate(clusters[:limit], 1):
+        print(f"  Cluster {cluster_id}: " + ", ".join(records[position].id for position in members))
+        for position in members[:2]:
+            text = records[position].text
+            print(f"    {records[position].id}: {text[:100]}{'...' if len(text) > 100 else ''}")
+
+
+# --- Main Logic ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Trova i requisiti quasi duplicati (MinHash + LSH sugli shingle di parole) prima dell'etichettatura.")
+    parser.add_argument("--input", type=Path, default=REQUIREMENTS_FILE,
+                        help=f"requisiti con ID (default {REQUIREMENTS_FILE})")
+    parser.add_argument("--output", type=Path, default=DUPLICATES_FILE,
+                        help=f"file dei cluster, letto da tool.py --dedupe e Selecter.py --dedupe-clusters (default {DUPLICATES_FILE})")
+    parser.add_argument("--threshold", type=float, default=JACCARD_THRESHOLD,
+                        help=f"somiglianza di Jaccard minima tra due requisiti (default {JACCARD_THRESHOLD})")
+    parser.add_argument("--shingle-size", type=int, default=SHINGLE_SIZE,
+                        help=f"parole consecutive per shingle (default {SHINGLE_SIZE})")
+    parser.add_argument("--permutations", type=int, default=NUM_PERMUTATIONS,
+                        help=f"permutazioni MinHash (default {NUM_PERMUTATIONS})")
+    parser.add_argument("--show", type=int, default=10, help="cluster da stampare (default 10)")
+    args = parser.parse_args()
+
+    if not 0 < args.threshold <= 1 or args.shingle_size < 1 or args.permutations < 1:
+        print("ERRORE: --threshold deve essere in (0, 1], --shingle-size e --permutations almeno 1.")
+        exit(1)
+    try:
+        requirements = read_requirements(args.input)
+    except FileNotFoundError:
+        print(f"ERRORE: file '{args.input}' non trovato. Eseguire prima AssociazioneID.py.")
+        exit(1)
+
+    start = time.perf_counter()
+    clusters, stats = find_near_duplicates([record.text for record in requirements], args.threshold,
+                                           args.shingle_size, args.permutations)
+    elapsed = time.perf_counter() - start
+    write_clusters(args.output, requirements, clusters, args.shingle_size)
+    print(f"Requisiti: {stats['requirements']}, cluster di quasi-duplicati: {stats['clusters']} "
+          f"({stats['duplicates']} requisiti oltre ai rappresentanti) in {elapsed:.2f}s")
+    print(f"LSH: {stats['bands']} bande x {stats['rows']} righe, {stats['verified_pairs']} coppie verificate "
+          f"(Jaccard >= {args.threshold:g} su shingle di {args.shingle_size} parole)")
+    print_clusters(requirements, clusters, args.show)
+    print(f"Cluster scritti in '{args.output}'.")
@@ -0,0 +1,190 @@
+import argparse
+import hashlib
+import sqlite3
+import time
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+# --- Configurazione ---
+PARSE_CACHE_FILE = Path(".cache") / "parse_cache.sqlite"
+# Attributi dei token salvati: bastano a ricostruire text, idx, lemma_, pos_ e tag_
+PARSE_CACHE_ATTRS = ["ORTH", "LEMMA", "POS", "TAG", "SPACY"]
+
+
+def model_cache_key(model_name: str, excluded_components: Sequence[str]) -> str:
+    """
+    Identifica modello, versione e componenti esclusi senza caricarlo: le analisi di versioni
+    diverse dello stesso modello, o caricate con componenti diversi, non vengono mai mescolate.
+    """
+    return (f"{model_name}=={package_version(model_name)}/spacy=={package_version('spacy')}"
+            f"/exclude={','.join(sorted(excluded_components))}")
+
+
+def package_version(package: str) -> str:
+    # importlib.metadata non importa il pacchetto: niente import di spaCy solo per la versione
+    try:
+        return version(package)
+    except PackageNotFoundError:
+        return "unknown"
+
+
+class ParseCache:
+    """
+    Cache su disco (SQLite) delle analisi spaCy dei requisiti. Ogni voce è un DocBin
+    con i soli attributi usati dal matching, indicizzato dall'hash SHA-256 di
+    (modello, versione, testo del requisito).
+    """
+
+    def __init__(self, path: Path, model_key: str):
+        self.path = path
+        self.model_key = model_key
+        self.hits = 0
+        self.misses = 0
+        self._vocab = None
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Più processi (tool.py --workers) possono scrivere sulla stessa cache: si attende il lock
+        self.conn = sqlite3.connect(str(path), timeout=60)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " data BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS docs_last_used ON docs(last_used)")
+        self.conn.commit()
+
+    def text_key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_key}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: List[str], vocab) -> Dict[str, "spacy.tokens.Doc"]:
+        """Restituisce i doc già in cache per i testi richiesti (testo -> Doc)."""
+        from spacy.tokens import DocBin
+
+        keys = {self.text_key(text): text for text in texts}
+        found: Dict[str, "spacy.tokens.Doc"] = {}
+        key_list = list(keys)
+        # SQLite limita il numero di parametri per query: si interroga a blocchi
+        for i in range(0, len(key_list), 500):
+            chunk = key_list[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(f"SELECT key, data FROM docs WHERE key IN ({placeholders})", chunk)
+            for key, data in rows:
+                found[keys[key]] = next(DocBin().from_bytes(data).get_docs(vocab))
+        if found:
+            now = time.time()
+            self.conn.executemany("UPDATE docs SET last_used = ? WHERE key = ?",
+                                  [(now, self.text_key(text)) for text in found])
+        return found
+
+    def put_many(self, docs) -> None:
+        from spacy.tokens import DocBin
+
+        now = time.time()
+        rows = []
+        for doc in docs:
+            data = DocBin(attrs=PARSE_CACHE_ATTRS, store_user_data=False, docs=[doc]).to_bytes()
+            rows.append((self.text_key(doc.text), self.model_key, data, now))
+        self.conn.executemany("INSERT OR REPLACE INTO docs (key, model, data, last_used) VALUES (?, ?, ?, ?)", rows)
+
+    def parse_batch(self, texts: List[str], load_nlp: Callable[[], object], batch_size: int) -> list:
+        """
+        Restituisce i doc dei testi nello stesso ordine: quelli in cache vengono ricostruiti
+        dal DocBin, solo i mancanti passano dal modello (e vengono salvati). load_nlp viene
+        chiamata solo se manca almeno un testo, così un batch tutto in cache non carica il modello.
+        """
+        cached = self.get_many(texts, self._cache_vocab())
+        missing = [text for text in dict.fromkeys(texts) if text not in cached]
+        if missing:
+            nlp = load_nlp()
+            parsed = list(nlp.pipe(missing, batch_size=max(batch_size, 1)))
+            self.put_many(parsed)
+            cached.update(zip(missing, parsed))
+        self.conn.commit()
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return [cached[text] for text in texts]
+
+    def _cache_vocab(self):
+        # Il DocBin salva le proprie stringhe: per ricostruire i doc basta un Vocab vuoto
+        if self._vocab is None:
+            from spacy.vocab import Vocab
+            self._vocab = Vocab()
+        return self._vocab
+
+    def stats(self) -> Dict[str, object]:
+        entries, payload_bytes = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM docs").fetchone()
+        per_model = dict(self.conn.execute("SELECT model, COUNT(*) FROM docs GROUP BY model"))
+        return {
+            "file": str(self.path),
+            "file_bytes": self.path.stat().st_size if self.path.exists() else 0,
+            "entries": entries,
+            "payload_bytes": payload_bytes,
+            "per_model": per_model,
+        }
+
+    def compact(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                drop_other_models: bool = True) -> int:
+        """
+        Elimina le voci di altri modelli/versioni (se richiesto) e poi le meno usate di recente
+        finché la cache rientra nei limiti; infine esegue VACUUM. Restituisce le voci eliminate.
+        """
+        removed = 0
+        if drop_other_models:
+            removed += self.conn.execute("DELETE FROM docs WHERE model != ?", (self.model_key,)).rowcount
+
+        if max_entries is not None:
+            removed += self.conn.execute(
+                "DELETE FROM docs WHERE key IN ("
+                " SELECT key FROM docs ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (max_entries,)
+            ).rowcount
+
+        if max_bytes is not None:
+            kept_bytes = 0
+            to_delete = []
+            for key, size in self.conn.execute("SELECT key, LENGTH(data) FROM docs ORDER BY last_used DESC"):
+                kept_bytes += size
+                if kept_bytes > max_bytes:
+                    to_delete.append((key,))
+            self.conn.executemany("DELETE FROM docs WHERE key = ?", to_delete)
+            removed += len(to_delete)
+
+        self.conn.commit()
+        self.conn.execute("VACUUM")
+        return removed
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
+
+
+def print_stats(stats: Dict[str, object]) -> None:
+    print(f"Cache di parsing: '{stats['file']}'")
+    print(f"  Voci: {stats['entries']}")
+    print(f"  Dati serializzati: {stats['payload_bytes'] / 1024:.1f} KiB (file: {stats['file_bytes'] / 1024:.1f} KiB)")
+    for model, count in sorted(stats["per_model"].items()):
+        print(f"    {model}: {count} voci")
+
+
+# --- Main Logic ---
+if __name__ == "__main__":
+    from tool import SPACY_EXCLUDED_COMPONENTS, SPACY_MODEL_NAME
+
+    parser = argparse.ArgumentParser(description="Gestione della cache di parsing spaCy dei requisiti.")
+    parser.add_argument("--cache", type=Path, default=PARSE_CACHE_FILE, help=f"file della cache (default {PARSE_CACHE_FILE})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="mostra dimensione e numero di voci della cache")
+    compact_parser = sub.add_parser("compact", help="elimina voci vecchie o di altri modelli e compatta il file")
+    compact_parser.add_argument("--max-entries", type=int, default=None, help="numero massimo di voci da tenere (le più recenti)")
+    compact_parser.add_argument("--max-mb", type=float, default=None, help="dimensione massima dei dati in MiB")
+    compact_parser.add_argument("--keep-other-models", action="store_true", help="non eliminare le voci di altri modelli/versioni")
+    args = parser.parse_args()
+
+    cache = ParseCache(args.cache, model_cache_key(SPACY_MODEL_NAME, SPACY_EXCLUDED_COMPONENTS))
+    if args.command == "compact":
+        max_bytes = int(args.max_mb * 1024 * 1024) if args.max_mb is not None else None
+        removed = cache.compact(args.max_entries, max_bytes, drop_other_models=not args.keep_other_models)
+        print(f"Eliminate {removed} voci dalla cache.")
+    print_stats(cache.stats())
+    cache.close()
@@ -0,0 +1,153 @@
+import argparse
+import contextlib
+import csv
+import time
+from pathlib import Path
+
+from AssociazioneID import ArffFormatError, format_requirement_line, iter_requirement_records, open_text
+from ParseCache import ParseCache, PARSE_CACHE_FILE, model_cache_key
+from Selecter import ReservoirSampler, SAMPLE_SIZE, STRATIFY_COLUMNS, category_file_order, sample_rows_into
+from Splitter import CategoryWriterPool
+from tool import OUTPUT_HEADER, SPACY_BATCH_SIZE, SPACY_EXCLUDED_COMPONENTS, SPACY_MODEL_NAME, Labeler, unique_match_rows
+
+# --- Configurazione ---
+INPUT_FILE = Path("Dataset.arff")
+DICTIONARIES_DIR = Path("NewDict")
+OUTPUT_FILE = Path("Requisiti_Selezionati.csv")
+# Percorsi usati per i file intermedi quando vengono richiesti senza indicarne uno
+IDS_FILE = Path("Dataset_With_R_ID.txt")
+LABELED_FILE = Path("Labeled_Dataset.csv")
+CATEGORIES_DIR = Path("Sorted_by_Categories")
+
+
+def tee_records(records, out_f):
+    """Restituisce i record invariati scrivendoli anche su out_f (se indicato) come righe di Dataset_With_R_ID.txt."""
+    for record in records:
+        if out_f is not None:
+            out_f.write(f"{format_requirement_line(record)}\n")
+        yield record
+
+
+def tee_rows(rows, csv_writer):
+    """Restituisce le righe CSV invariate scrivendole anche con csv_writer (se indicato)."""
+    for row in rows:
+        if csv_writer is not None:
+            csv_writer.writerow(row)
+        yield row
+
+
+def route_rows(rows, category_pool: CategoryWriterPool):
+    """Restituisce le righe invariate scrivendo quelle con categoria nel file della categoria."""
+    category_col_index = OUTPUT_HEADER.index("CATEGORIA")
+    for row in rows:
+        category = row[category_col_index]
+        if category != "NULL":
+            category_pool.writerow(category, row)
+        yield row
+
+
+def labeled_rows(records, labeler: Labeler, batch_size, parse_cache):
+    """Etichetta i record e restituisce le stesse righe che tool.py scrive in Labeled_Dataset.csv."""
+    for record, matches in labeler.label_records(records, batch_size, parse_cache):
+        yield from unique_match_rows(record, matches)
+
+
+def run_pipeline(input_path: Path = INPUT_FILE,
+                 output_path: Path = OUTPUT_FILE,
+                 ids_path: Path = None,
+                 labeled_path: Path = None,
+                 categories_dir: Path = None,
+                 sample_size: int = SAMPLE_SIZE,
+                 batch_size: int = SPACY_BATCH_SIZE,
+                 use_parse_cache: bool = True,
+                 seed: int = None,
+                 stratify: str = None,
+                 dedupe_by_id: bool = False):
+    """
+    Esegue in un solo passaggio AssociazioneID -> tool -> Splitter -> Selecter: i record
+    scorrono come generatori dal file ARFF (anche .gz/.bz2) fino al campionamento, senza
+    scrivere né rileggere i file intermedi. Ogni intermedio viene scritto solo se ne è indicato il percorso.
+    """
+    labeler = Labeler(DICTIONARIES_DIR)
+    # Cache, file intermedi e pool vengono chiusi (in ordine inverso) anche se un'apertura successiva fallisce
+    with contextlib.ExitStack() as stack:
+        parse_cache = None
+        if use_parse_cache:
+            parse_cache = ParseCache(PARSE_CACHE_FILE, model_cache_key(SPACY_MODEL_NAME, SPACY_EXCLUDED_COMPONENTS))
+            stack.callback(parse_cache.close)
+
+        ids_f = stack.enter_context(ids_path.open("w", encoding="utf-8")) if ids_path else None
+        labeled_f = stack.enter_context(labeled_path.open("w", encoding="utf-8", newline="")) if labeled_path else None
+        labeled_writer = csv.writer(labeled_f, delimiter=';') if labeled_f else None
+        if labeled_writer is not None:
+            labeled_writer.writerow(OUTPUT_HEADER)
+
+        category_pool = None
+        if categories_dir:
+            category_pool = CategoryWriterPool(categories_dir, OUTPUT_HEADER)
+            stack.callback(category_pool.close)
+        sampler = ReservoirSampler(sample_size, seed, dedupe_by_id)
+        print(f"Seed del campionamento: {sampler.seed}")
+
+        with open_text(input_path) as in_f:
+            # 1. lettura ARFF + ID  ->  2. etichettatura  ->  3. instradamento per categoria  ->  4. campionamento
+            records = tee_records(iter_requirement_records(in_f), ids_f)
+            rows = tee_rows(labeled_rows(records, labeler, batch_size, parse_cache),
+                            labeled_writer)
+            if category_pool is not None:
+                rows = route_rows(rows, category_pool)
+            processed_rows = sample_rows_into(sampler, OUTPUT_HEADER, rows, stratify)
+
+    print(f"Righe etichettate: {processed_rows}. Trovati {len(sampler.rows_seen)} strati validi.")
+
+    # Scrittura del campione: stesso ordine di Selecter.py (file di categoria in ordine di nome)
+    total_selected_rows = 0
+    with output_path.open("w", encoding="utf-8", newline="") as out_f:
+        csv_writer = csv.writer(out_f, delimiter=';')
+        csv_writer.writerow(OUTPUT_HEADER)
+        for stratum, sampled in sampler.samples(category_file_order):
+            csv_writer.writerows(sampled)
+            total_selected_rows += len(sampled)
+    if sampler.shortfalls:
+        missing = sum(entry[0] for entry in sampler.shortfalls.values())
+        print(f"AVVISO: {len(sampler.shortfalls)} strati con meno requisiti per la deduplica ({missing} in totale).")
+
+    return total_selected_rows, len(sampler.rows_seen)
+
+
+# --- Main Logic ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Pipeline completa Dataset.arff -> Requisiti_Selezionati.csv in un solo passaggio.")
+    parser.add_argument("--input", type=Path, default=INPUT_FILE, help=f"file ARFF di input, anche .gz/.bz2 (default {INPUT_FILE})")
+    parser.add_argument("--output", type=Path, default=OUTPUT_FILE, help=f"campione finale (default {OUTPUT_FILE})")
+    parser.add_argument("--write-ids", type=Path, nargs="?", const=IDS_FILE, default=None,
+                        help=f"scrive anche i requisiti con ID (default {IDS_FILE})")
+    parser.add_argument("--write-labeled", type=Path, nargs="?", const=LABELED_FILE, default=None,
+                        help=f"scrive anche il dataset etichettato (default {LABELED_FILE})")
+    parser.add_argument("--write-categories", type=Path, nargs="?", const=CATEGORIES_DIR, default=None,
+                        help=f"scrive anche i file per categoria (default {CATEGORIES_DIR}/)")
+    parser.add_argument("--sample-size", type=int, default=SAMPLE_SIZE, help=f"requisiti per categoria (default {SAMPLE_SIZE})")
+    parser.add_argument("--batch-size", type=int, default=SPACY_BATCH_SIZE, help=f"batch di nlp.pipe (default {SPACY_BATCH_SIZE})")
+    parser.add_argument("--seed", type=int, default=None, help="seed per un campionamento riproducibile")
+    parser.add_argument("--stratify", choices=sorted(STRATIFY_COLUMNS), default=None,
+                        help="campiona separatamente per classe o per progetto all'interno di ogni categoria")
+    parser.add_argument("--dedupe", action="store_true", help="non estrae lo stesso requisito (ID) in più categorie")
+    parser.add_argument("--no-parse-cache", action="store_true", help="non usa la cache di parsing spaCy")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    try:
+        selected, strata = run_pipeline(args.input, args.output, args.write_ids, args.write_labeled,
+                                        args.write_categories, args.sample_size, args.batch_size,
+                                        not args.no_parse_cache, args.seed, args.stratify, args.dedupe)
+    except FileNotFoundError as e:
+        print(f"ERRORE: file non trovato: {e.filename}")
+        exit(1)
+    except ArffFormatError as e:
+        print(f"ERRORE: {args.input}: {e}")
+        exit(1)
+
+    print("\n--- Pipeline Completata ---")
+    print(f"Creato il file '{args.output}' con {selected} requisiti campionati da {strata} strati "
+          f"in {time.perf_counter() - start_time:.2f}s.")
@@ -1,93 +1,296 @@
+import argparse
 import csv
+import hashlib
+import heapq
 import random
+from collections import Counter
 from pathlib import Path
 
+from LabelStore import LABEL_STORE_FILE, open_label_store
+from NearDuplicates import DUPLICATES_FILE, read_representatives
+
 # --- Configurazione ---
 INPUT_DIR = Path("Sorted_by_Categories")
+LABELED_FILE = Path("Labeled_Dataset.csv")
 OUTPUT_FILE = "Requisiti_Selezionati.csv"
 SAMPLE_SIZE = 27
+# Colonne utilizzabili per stratificare il campione all'interno di ogni categoria
+STRATIFY_COLUMNS = {"class": "Classe dei requisiti", "project": "ID progetto"}
+# Con la deduplica per ID ogni strato tiene SAMPLE_SIZE * DEDUPE_OVERSAMPLE candidati,
+# da cui si pescano i sostituti dei requisiti già estratti in altre categorie
+DEDUPE_OVERSAMPLE = 4
+
+
+def _stable_random(seed: int, *parts: str) -> float:
+    """Numero pseudo-casuale in [0, 1) che dipende solo dal seed e dalle parti indicate."""
+    data = "\x1f".join((str(seed),) + parts).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big") / 2 ** 64
+
+
+def _natural_key(value: str):
+    return (0, int(value), "") if value.isdigit() else (1, 0, value)
 
-def create_final_sample_set():
+
+class ReservoirSampler:
     """
-    Scansiona la directory di input, campiona casualmente un numero fisso di requisiti
-    da ogni file di categoria e li consolida in un unico file CSV di output.
+    Campionamento a serbatoio in un solo passaggio, separato per strato (categoria ed
+    eventualmente classe o progetto). Ogni riga riceve una chiave pseudo-casuale derivata dal
+    seed e dal suo contenuto e ogni strato tiene solo le sample_size righe con chiave minima,
+    cioè un campione uniforme senza ripetizioni che usa O(sample_size) memoria per strato e
+    non dipende dall'ordine di lettura delle righe.
+
+    Con dedupe_by_id la chiave dipende solo dall'ID del requisito, ogni strato tiene più
+    candidati distinti e a fine lettura un requisito già estratto in uno strato precedente
+    viene sostituito dal candidato successivo. Se per questo uno strato resta con meno righe di
+    quante ne avrebbe senza deduplica, samples() registra in shortfalls quante ne mancano.
+
+    Con clusters (ID -> rappresentante, da NearDuplicates.read_representatives) la deduplica
+    vale per cluster: in tutto il campione viene estratto al più un membro di ogni cluster di
+    quasi-duplicati, quello con la chiave minore tra i candidati.
+    """
+
+    def __init__(self, sample_size: int = SAMPLE_SIZE, seed: int = None, dedupe_by_id: bool = False,
+                 oversample: int = DEDUPE_OVERSAMPLE, clusters: dict = None):
+        self.sample_size = sample_size
+        self.seed = seed if seed is not None else random.randrange(2 ** 63)
+        self.clusters = clusters if clusters is not None else {}
+        self.dedupe_by_id = dedupe_by_id or clusters is not None
+        self.capacity = sample_size * max(1, oversample) if self.dedupe_by_id else sample_size
+        self.rows_seen = Counter()
+        self._heaps = {}    # strato -> max-heap di (-chiave, progressivo, ID, riga)
+        self._members = {}  # strato -> ID presenti nel serbatoio (solo con dedupe_by_id)
+        self._truncated = set()  # strati da cui il serbatoio ha scartato candidati
+        self._seq = 0
+        # strato -> (righe mancanti per la deduplica, candidati già estratti o del cluster di uno
+        # già estratto, serbatoio troncato)
+        self.shortfalls = {}
+
+    def add(self, stratum: tuple, req_id: str, row) -> None:
+        self.rows_seen[stratum] += 1
+        self._seq += 1
+        heap = self._heaps.setdefault(stratum, [])
+
+        if self.dedupe_by_id:
+            members = self._members.setdefault(stratum, set())
+            if req_id in members:
+                return
+            key = _stable_random(self.seed, *stratum, req_id)
+        else:
+            key = _stable_random(self.seed, *stratum, *row)
+
+        if len(heap) < self.capacity:
+            heapq.heappush(heap, (-key, self._seq, req_id, row))
+        elif key < -heap[0][0]:
+            _, _, evicted_id, _ = heapq.heapreplace(heap, (-key, self._seq, req_id, row))
+            self._truncated.add(stratum)
+            if self.dedupe_by_id:
+                members.discard(evicted_id)
+        else:
+            self._truncated.add(stratum)
+            return
+        if self.dedupe_by_id:
+            members.add(req_id)
+
+    def samples(self, stratum_order_key=None):
+        """
+        Restituisce [(strato, righe campionate)] con gli strati ordinati da stratum_order_key
+        e le righe nell'ordine in cui sono state lette.
+        """
+        selected_ids = set()
+        result = []
+        self.shortfalls = {}
+        for stratum in sorted(self._heaps, key=stratum_order_key):
+            chosen = []
+            skipped = 0
+            for neg_key, seq, req_id, row in sorted(self._heaps[stratum], key=lambda entry: -entry[0]):
+                if len(chosen) == self.sample_size:
+                    break
+                if self.dedupe_by_id:
+                    # Senza clusters ogni requisito è il rappresentante di se stesso
+                    representative = self.clusters.get(req_id, req_id)
+                    if representative in selected_ids:
+                        skipped += 1
+                        continue
+                    selected_ids.add(representative)
+                chosen.append((seq, row))
+            # Senza deduplica lo strato avrebbe min(sample_size, candidati distinti) righe
+            missing = min(self.sample_size, len(self._heaps[stratum])) - len(chosen)
+            if missing > 0:
+                self.shortfalls[stratum] = (missing, skipped, stratum in self._truncated)
+            result.append((stratum, [row for _, row in sorted(chosen, key=lambda entry: entry[0])]))
+        return result
+
+
+def category_file_order(stratum: tuple):
+    """Ordina gli strati come i file di Sorted_by_Categories/ (nome file, poi valore dello strato)."""
+    safe_category_name = stratum[0].lower().replace(" ", "_")
+    return (f"{safe_category_name}_requirements.csv",) + tuple(_natural_key(value) for value in stratum[1:])
+
+
+def sample_rows_into(sampler: ReservoirSampler, header, rows, stratify: str = None) -> int:
+    """
+    Passa al sampler le righe (senza intestazione) di un file etichettato, usando come strato
+    la colonna CATEGORIA (saltando i NULL) ed eventualmente la colonna di stratify.
+    Restituisce il numero di righe lette.
+    """
+    id_col = header.index("ID")
+    category_col = header.index("CATEGORIA")
+    stratify_col = header.index(STRATIFY_COLUMNS[stratify]) if stratify else None
+
+    read = 0
+    for row in rows:
+        if not row:
+            continue
+        read += 1
+        row_category = row[category_col]
+        if row_category == "NULL":
+            continue
+        stratum = (row_category,) if stratify_col is None else (row_category, row[stratify_col])
+        sampler.add(stratum, row[id_col], row)
+    return read
+
+
+def create_final_sample_set(sample_size: int = SAMPLE_SIZE, seed: int = None, stratify: str = None,
+                            dedupe_by_id: bool = False, from_labeled: Path = None,
+                            output_file: str = OUTPUT_FILE, from_store: Path = None,
+                            oversample: int = DEDUPE_OVERSAMPLE, clusters_file: Path = None):
+    """
+    Campiona casualmente (fino a) sample_size requisiti per ogni categoria, leggendo i file di
+    INPUT_DIR, direttamente il dataset etichettato from_labeled oppure lo store normalizzato
+    from_store, e li consolida in un unico file CSV di output. Con clusters_file (il file di
+    NearDuplicates.py) estrae al più un requisito per cluster di quasi-duplicati.
     """
     print("--- Inizio Script di Campionamento Casuale ---")
+    clusters = None
+    if clusters_file is not None:
+        try:
+            clusters = read_representatives(clusters_file)
+        except FileNotFoundError:
+            print(f"ERRORE: Il file dei cluster '{clusters_file}' non è stato trovato. Eseguire prima NearDuplicates.py.")
+            return
+        except ValueError as e:
+            print(f"ERRORE: {e}")
+            return
+        print(f"Quasi-duplicati da '{clusters_file}': {len(clusters)} requisiti raggruppati con un rappresentante.")
+    sampler = ReservoirSampler(sample_size, seed, dedupe_by_id, oversample, clusters)
+    print(f"Seed del campionamento: {sampler.seed}")
+    header = None
 
-    # --- 1. Controlli Preliminari ---
-    if not INPUT_DIR.is_dir():
-        print(f"ERRORE: La directory di input '{INPUT_DIR}' non è stata trovata.")
-        print("Assicurati di aver eseguito prima lo script che crea i file per categoria.")
-        return
+    # --- 1. Lettura in Streaming e Campionamento ---
+    if from_store is not None:
+        try:
+            with open_label_store(from_store) as store:
+                header = store.header()
+                read = sample_rows_into(sampler, header, store.iter_labeled_rows(), stratify=stratify)
+                print(f"Lette {read} righe dallo store '{from_store}'.")
+        except FileNotFoundError:
+            print(f"ERRORE: Lo store '{from_store}' non è stato trovato.")
+            return
+        except ValueError as e:
+            print(f"ERRORE: Intestazione non valida in '{from_store}': {e}")
+            return
+    elif from_labeled is not None:
+        try:
+            with open(from_labeled, mode='r', encoding='utf-8', newline='') as infile:
+                csv_reader = csv.reader(infile, delimiter=';')
+                header = next(csv_reader)
+                read = sample_rows_into(sampler, header, csv_reader, stratify=stratify)
+                print(f"Lette {read} righe da '{from_labeled}'.")
+        except FileNotFoundError:
+            print(f"ERRORE: Il file di input '{from_labeled}' non è stato trovato.")
+            return
+        except (StopIteration, ValueError) as e:
+            print(f"ERRORE: Intestazione non valida in '{from_labeled}': {e}")
+            return
+    else:
+        # --- Controlli Preliminari ---
+        if not INPUT_DIR.is_dir():
+            print(f"ERRORE: La directory di input '{INPUT_DIR}' non è stata trovata.")
+            print("Assicurati di aver eseguito prima lo script che crea i file per categoria.")
+            return
 
-    # Trova tutti i file CSV nella directory di input
-    category_files = sorted(list(INPUT_DIR.glob("*.csv")))
-    if not category_files:
-        print(f"ERRORE: Nessun file .csv trovato nella directory '{INPUT_DIR}'.")
-        return
+        # Trova tutti i file CSV nella directory di input
+        category_files = sorted(list(INPUT_DIR.glob("*.csv")))
+        if not category_files:
+            print(f"ERRORE: Nessun file .csv trovato nella directory '{INPUT_DIR}'.")
+            return
 
-    print(f"Trovati {len(category_files)} file di categoria da processare.")
+        print(f"Trovati {len(category_files)} file di categoria da processare.")
 
-    # --- 2. Processo di Campionamento e Scrittura ---
-    header_written = False
-    total_selected_rows = 0
+        for filepath in category_files:
+            print(f"\nProcessando il file: '{filepath.name}'...")
+            try:
+                with open(filepath, mode='r', encoding='utf-8', newline='') as infile:
+                    csv_reader = csv.reader(infile, delimiter=';')
+                    file_header = next(csv_reader)
+                    if header is None:
+                        header = file_header
+                    read = sample_rows_into(sampler, file_header, csv_reader, stratify=stratify)
+                    if not read:
+                        print("  -> File vuoto (solo intestazione). Saltato.")
+                    else:
+                        print(f"  -> Lette {read} righe.")
+            except StopIteration:
+                print(f"  -> AVVISO: Il file '{filepath.name}' sembra essere completamente vuoto. Saltato.")
+            except Exception as e:
+                print(f"  -> ERRORE durante la lettura del file '{filepath.name}': {e}")
+
+    if header is None:
+        print("ERRORE: Nessuna intestazione trovata, nessun file scritto.")
+        return
 
+    # --- 2. Scrittura del Campione ---
+    total_selected_rows = 0
     try:
-        # Apriamo il file di output in modalità scrittura
-        with open(OUTPUT_FILE, mode='w', encoding='utf-8', newline='') as outfile:
+        with open(output_file, mode='w', encoding='utf-8', newline='') as outfile:
             csv_writer = csv.writer(outfile, delimiter=';')
-
-            # Iteriamo su ogni file di categoria trovato
-            for filepath in category_files:
-                print(f"\nProcessando il file: '{filepath.name}'...")
-
-                try:
-                    with open(filepath, mode='r', encoding='utf-8', newline='') as infile:
-                        csv_reader = csv.reader(infile, delimiter=';')
-                        
-                        # Leggiamo l'intestazione e i dati
-                        header = next(csv_reader)
-                        all_rows = list(csv_reader) # Leggiamo tutte le righe di dati in una lista
-                        
-                        # Scriviamo l'intestazione nel file di output, ma solo una volta
-                        if not header_written:
-                            csv_writer.writerow(header)
-                            header_written = True
-                        
-                        if not all_rows:
-                            print("  -> File vuoto (solo intestazione). Saltato.")
-                            continue
-
-                        # --- Logica di Campionamento ---
-                        num_rows_in_file = len(all_rows)
-                        
-                        if num_rows_in_file <= SAMPLE_SIZE:
-                            # Se ci sono 27 o meno requisiti, li prendiamo tutti
-                            print(f"  -> Trovati {num_rows_in_file} requisiti (meno di {SAMPLE_SIZE}). Selezionati tutti.")
-                            sampled_rows = all_rows
-                        else:
-                            # Se ce ne sono più di 27, ne selezioniamo 27 a caso
-                            print(f"  -> Trovati {num_rows_in_file} requisiti. Selezionando {SAMPLE_SIZE} a caso.")
-                            sampled_rows = random.sample(all_rows, SAMPLE_SIZE)
-
-                        # Scriviamo le righe campionate nel file di output
-                        csv_writer.writerows(sampled_rows)
-                        total_selected_rows += len(sampled_rows)
-
-                except StopIteration:
-                     print(f"  -> AVVISO: Il file '{filepath.name}' sembra essere completamente vuoto. Saltato.")
-                except Exception as e:
-                     print(f"  -> ERRORE durante la lettura del file '{filepath.name}': {e}")
-
+            csv_writer.writerow(header)
+            for stratum, sampled_rows in sampler.samples(category_file_order):
+                seen = sampler.rows_seen[stratum]
+                label = " / ".join(stratum)
+                if seen <= sample_size:
+                    print(f"  -> '{label}': trovati {seen} requisiti (meno di {sample_size}). Selezionati {len(sampled_rows)}.")
+                else:
+                    print(f"  -> '{label}': trovati {seen} requisiti. Selezionati {len(sampled_rows)} a caso.")
+                if stratum in sampler.shortfalls:
+                    missing, skipped, truncated = sampler.shortfalls[stratum]
+                    reason = (f"candidati del serbatoio esauriti, aumentare --oversample (ora {oversample})" if truncated
+                              else "non ci sono altri requisiti distinti")
+                    print(f"     AVVISO: {missing} in meno per la deduplica: {skipped} candidati già estratti "
+                          f"{'o quasi-duplicati di uno già estratto' if clusters else 'in altre categorie'}, {reason}.")
+                csv_writer.writerows(sampled_rows)
+                total_selected_rows += len(sampled_rows)
     except Exception as e:
-        print(f"\nERRORE CRITICO durante la scrittura del file di output '{OUTPUT_FILE}': {e}")
+        print(f"\nERRORE CRITICO durante la scrittura del file di output '{output_file}': {e}")
         return
 
     print("\n--- Elaborazione Completata ---")
-    print(f"Creato il file '{OUTPUT_FILE}' con un totale di {total_selected_rows} requisiti campionati.")
-    print(f"Il file contiene un campione di (fino a) {SAMPLE_SIZE} requisiti da ognuna delle {len(category_files)} categorie.")
+    print(f"Creato il file '{output_file}' con un totale di {total_selected_rows} requisiti campionati.")
+    print(f"Il file contiene un campione di (fino a) {sample_size} requisiti da ognuno dei {len(sampler.rows_seen)} strati.")
+    if sampler.shortfalls:
+        missing = sum(entry[0] for entry in sampler.shortfalls.values())
+        print(f"AVVISO: {len(sampler.shortfalls)} strati con meno requisiti per la deduplica ({missing} in totale).")
 
 
 # Esegui la funzione principale quando lo script viene lanciato
 if __name__ == "__main__":
-    create_final_sample_set()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Campiona (fino a) N requisiti per categoria.")
+    parser.add_argument("--sample-size", type=int, default=SAMPLE_SIZE, help=f"requisiti per strato (default {SAMPLE_SIZE})")
+    parser.add_argument("--seed", type=int, default=None, help="seed per un campionamento riproducibile")
+    parser.add_argument("--stratify", choices=sorted(STRATIFY_COLUMNS), default=None,
+                        help="campiona separatamente per classe o per progetto all'interno di ogni categoria")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="non estrae lo stesso requisito (ID) in più categorie")
+    parser.add_argument("--dedupe-clusters", type=Path, nargs="?", const=DUPLICATES_FILE, default=None,
+                        help=f"estrae al più un requisito per cluster di NearDuplicates.py, implica --dedupe (default {DUPLICATES_FILE})")
+    parser.add_argument("--oversample", type=int, default=DEDUPE_OVERSAMPLE,
+                        help=f"con --dedupe, candidati tenuti per strato in multipli di --sample-size (default {DEDUPE_OVERSAMPLE})")
+    parser.add_argument("--from-labeled", type=Path, nargs="?", const=LABELED_FILE, default=None,
+                        help=f"legge direttamente il dataset etichettato invece di {INPUT_DIR}/ (default {LABELED_FILE})")
+    parser.add_argument("--from-store", type=Path, nargs="?", const=LABEL_STORE_FILE, default=None,
+                        help=f"legge lo store normalizzato di tool.py --store (default {LABEL_STORE_FILE})")
+    parser.add_argument("--output", default=OUTPUT_FILE, help=f"file di output (default {OUTPUT_FILE})")
+    args = parser.parse_args()
+
+    create_final_sample_set(args.sample_size, args.seed, args.stratify, args.dedupe, args.from_labeled, args.output,
+                            args.from_store, args.oversample, args.dedupe_clusters)
@@ -1,104 +1,183 @@
+import argparse
 import csv
-from collections import defaultdict
+from collections import OrderedDict
 from pathlib import Path
 
+from LabelStore import LABEL_STORE_FILE, open_label_store
+
 # --- Configurazione ---
 INPUT_FILE = Path("Labeled_Dataset.csv")
 OUTPUT_DIR = Path("Sorted_by_Categories")
+# Numero massimo di file di categoria aperti contemporaneamente (i meno usati vengono chiusi)
+MAX_OPEN_FILES = 8
+# Buffer di scrittura di ogni file aperto, in byte
+WRITE_BUFFER_SIZE = 64 * 1024
+
+
+def category_output_path(output_dir: Path, category: str) -> Path:
+    """Percorso del file CSV di una categoria (es. 'functional_requirement_requirements.csv')."""
+    # Sostituiamo spazi o caratteri non validi se necessario, anche se i nomi delle tue categorie sono semplici.
+    safe_category_name = category.lower().replace(" ", "_")
+    return output_dir / f"{safe_category_name}_requirements.csv"
 
-def group_and_write_files_by_category():
+
+class CategoryWriterPool:
     """
-    Legge Labeled_Dataset.csv, raggruppa i requisiti per categoria
-    e scrive un file CSV separato per ogni categoria in una nuova directory.
+    Scrive le righe nei file per categoria man mano che arrivano, tenendo aperti al massimo
+    max_open_files file bufferizzati. Quando il limite è raggiunto viene chiuso il file usato
+    meno di recente; se la sua categoria ricompare, il file viene riaperto in append.
+    La memoria usata non dipende quindi dalla dimensione dell'input.
     """
-    
-    # defaultdict ci permette di raggruppare facilmente.
-    # La struttura sarà: {'categoria1': [riga1, riga2], 'categoria2': [riga3]}
-    # dove ogni 'riga' è una lista di stringhe (le colonne del CSV).
-    grouped_data = defaultdict(list)
-    header = []
 
-    print(f"Inizio elaborazione: lettura del file '{INPUT_FILE}'...")
+    def __init__(self, output_dir: Path, header, max_open_files: int = MAX_OPEN_FILES,
+                 buffer_size: int = WRITE_BUFFER_SIZE):
+        self.output_dir = output_dir
+        self.header = header
+        self.max_open_files = max(1, max_open_files)
+        self.buffer_size = buffer_size
+        self._open = OrderedDict()  # categoria -> (file, writer), dal meno al più recente
+        # Righe scritte per categoria, nell'ordine in cui le categorie sono comparse
+        self.row_counts = {}
+        self.failed = set()
+        self._dir_ready = False
 
-    # --- 1. Lettura e Raggruppamento dei Dati ---
-    try:
-        with open(INPUT_FILE, mode='r', encoding='utf-8', newline='') as infile:
-            reader = csv.reader(infile, delimiter=';')
-            
-            # Leggiamo e salviamo l'intestazione, è cruciale per i file di output
-            try:
-                header = next(reader)
-                category_col_index = header.index("CATEGORIA")
-            except (StopIteration, ValueError) as e:
-                print(f"Errore: Impossibile leggere l'intestazione o trovare la colonna 'CATEGORIA' in '{INPUT_FILE}'. ({e})")
+    def writerow(self, category: str, row) -> None:
+        entry = self._open.get(category)
+        if entry is None:
+            if category in self.failed:
                 return
+            entry = self._open_writer(category)
+            if entry is None:
+                return
+        else:
+            self._open.move_to_end(category)
+        entry[1].writerow(row)
+        self.row_counts[category] += 1
+
+    def _open_writer(self, category: str):
+        if not self._dir_ready:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            print(f"Directory di output '{self.output_dir}' creata o già esistente.")
+            self._dir_ready = True
+
+        if len(self._open) >= self.max_open_files:
+            _, (oldest_file, _) = self._open.popitem(last=False)
+            oldest_file.close()
+
+        output_filepath = category_output_path(self.output_dir, category)
+        first_time = category not in self.row_counts
+        try:
+            # La prima volta il file viene ricreato con l'intestazione, poi solo esteso
+            outfile = open(output_filepath, mode='w' if first_time else 'a', encoding='utf-8', newline='',
+                           buffering=self.buffer_size)
+        except Exception as e:
+            print(f"  -> ERRORE durante la scrittura del file per la categoria '{category}': {e}")
+            self.failed.add(category)
+            self.row_counts.pop(category, None)
+            return None
+
+        writer = csv.writer(outfile, delimiter=';')
+        if first_time:
+            writer.writerow(self.header)
+            self.row_counts[category] = 0
+        self._open[category] = (outfile, writer)
+        return outfile, writer
+
+    def close(self) -> None:
+        while self._open:
+            _, (outfile, _) = self._open.popitem(last=False)
+            outfile.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def write_rows_by_category(header, rows, output_dir: Path = OUTPUT_DIR):
+    """
+    Scrive in streaming ogni riga (senza intestazione) nel file CSV della sua categoria,
+    escludendo i 'NULL'. Restituisce (righe lette, pool con i conteggi per categoria).
+    """
+    category_col_index = header.index("CATEGORIA")
+    rows_processed = 0
+    with CategoryWriterPool(output_dir, header) as pool:
+        for row in rows:
+            if not row or len(row) <= category_col_index:
+                continue
 
-            # Iteriamo sulle righe di dati
-            rows_processed = 0
-            for row in reader:
-                if not row or len(row) <= category_col_index:
-                    continue
-                
-                category = row[category_col_index]
-                
-                # Aggiungiamo la riga al gruppo corretto, escludendo i 'NULL'
-                if category != "NULL":
-                    grouped_data[category].append(row)
-                
-                rows_processed += 1
-            
-            print(f"Lette {rows_processed} righe di dati. Trovate {len(grouped_data)} categorie valide.")
+            category = row[category_col_index]
+
+            # Scriviamo la riga nel file della sua categoria, escludendo i 'NULL'
+            if category != "NULL":
+                pool.writerow(category, row)
+
+            rows_processed += 1
+    return rows_processed, pool
+
+
+def group_and_write_files_by_category(from_store: Path = None):
+    """
+    Legge Labeled_Dataset.csv (oppure lo store normalizzato from_store scritto da
+    tool.py --store) e scrive in streaming ogni riga nel file CSV della sua categoria,
+    in una nuova directory.
+    """
+    source = from_store if from_store is not None else INPUT_FILE
+    print(f"Inizio elaborazione: lettura del file '{source}'...")
+
+    # --- 1. Lettura e Scrittura in Streaming dei Dati ---
+    try:
+        if from_store is not None:
+            with open_label_store(from_store) as store:
+                try:
+                    header = store.header()
+                    header.index("CATEGORIA")
+                except ValueError as e:
+                    print(f"Errore: Impossibile leggere l'intestazione o trovare la colonna 'CATEGORIA' in '{source}'. ({e})")
+                    return
+                rows_processed, pool = write_rows_by_category(header, store.iter_labeled_rows())
+        else:
+            with open(INPUT_FILE, mode='r', encoding='utf-8', newline='') as infile:
+                reader = csv.reader(infile, delimiter=';')
+
+                # Leggiamo e salviamo l'intestazione, è cruciale per i file di output
+                try:
+                    header = next(reader)
+                    header.index("CATEGORIA")
+                except (StopIteration, ValueError) as e:
+                    print(f"Errore: Impossibile leggere l'intestazione o trovare la colonna 'CATEGORIA' in '{INPUT_FILE}'. ({e})")
+                    return
+
+                # Iteriamo sulle righe di dati
+                rows_processed, pool = write_rows_by_category(header, reader)
+
+        print(f"Lette {rows_processed} righe di dati. Trovate {len(pool.row_counts) + len(pool.failed)} categorie valide.")
 
     except FileNotFoundError:
-        print(f"ERRORE: File di input '{INPUT_FILE}' non trovato.")
+        print(f"ERRORE: File di input '{source}' non trovato.")
         print("Assicurati che lo script 'tool.py' sia stato eseguito correttamente.")
         return
     except Exception as e:
-        print(f"Si è verificato un errore inaspettato durante la lettura del file: {e}")
+        print(f"Si è verificato un errore inaspettato durante l'elaborazione del file: {e}")
         return
 
-    if not grouped_data:
+    if not pool.row_counts and not pool.failed:
         print("Nessun requisito con categorie valide trovato. Nessun file verrà creato.")
         return
 
-    # --- 2. Creazione della Directory di Output ---
-    try:
-        OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-        print(f"Directory di output '{OUTPUT_DIR}' creata o già esistente.")
-    except Exception as e:
-        print(f"Errore critico: Impossibile creare la directory di output '{OUTPUT_DIR}'. Errore: {e}")
-        return
+    # --- 2. Riepilogo dei File Creati ---
+    for category, rows_in_category in pool.row_counts.items():
+        print(f"  -> Creato file '{category_output_path(OUTPUT_DIR, category)}' con {rows_in_category} requisiti.")
 
-    # --- 3. Scrittura dei File Separati per Categoria ---
-    files_created_count = 0
-    print("Inizio scrittura dei file separati per categoria...")
-
-    # Iteriamo su ogni categoria e sulla sua lista di righe
-    for category, rows_in_category in grouped_data.items():
-        # Creiamo un nome di file sicuro per la categoria (es. 'functional_requirement.csv')
-        # Sostituiamo spazi o caratteri non validi se necessario, anche se i nomi delle tue categorie sono semplici.
-        safe_category_name = category.lower().replace(" ", "_")
-        output_filename = f"{safe_category_name}_requirements.csv"
-        output_filepath = OUTPUT_DIR / output_filename
-        
-        try:
-            with open(output_filepath, mode='w', encoding='utf-8', newline='') as outfile:
-                writer = csv.writer(outfile, delimiter=';')
-                
-                # Scriviamo l'intestazione in ogni file
-                writer.writerow(header)
-                
-                # Scriviamo tutte le righe per questa specifica categoria
-                writer.writerows(rows_in_category)
-            
-            print(f"  -> Creato file '{output_filepath}' con {len(rows_in_category)} requisiti.")
-            files_created_count += 1
-        except Exception as e:
-            print(f"  -> ERRORE durante la scrittura del file per la categoria '{category}': {e}")
-
-    print(f"\nElaborazione completata! Creati {files_created_count} file nella directory '{OUTPUT_DIR}'.")
+    print(f"\nElaborazione completata! Creati {len(pool.row_counts)} file nella directory '{OUTPUT_DIR}'.")
 
 
 # Esegui la funzione principale quando lo script viene lanciato
 if __name__ == "__main__":
-    group_and_write_files_by_category()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Divide il dataset etichettato in un file CSV per categoria.")
+    parser.add_argument("--from-store", type=Path, nargs="?", const=LABEL_STORE_FILE, default=None,
+                        help=f"legge lo store normalizzato di tool.py --store invece di {INPUT_FILE} (default {LABEL_STORE_FILE})")
+    args = parser.parse_args()
+
+    group_and_write_files_by_category(args.from_store)
@@ -0,0 +1,89 @@
+"""
+Benchmark delle analisi colonnari di LabelAnalytics.py su milioni di righe di match.
+
+Genera colonne sintetiche (seed fisso; requisiti con ~14 match ciascuno, parole con
+distribuzione Zipf come nei dizionari reali) e misura separatamente:
+  - lettura delle righe CSV in colonne (from_rows), su un campione, riportata in righe/s;
+  - salvataggio e caricamento della cache .npz;
+  - matrici categoria x classe e categoria x progetto (righe di match e requisiti distinti),
+    densità di ambiguità e parole più frequenti per categoria.
+
+Esecuzione (dalla radice del progetto):
+    python -m benchmarks.bench_analytics
+    python -m benchmarks.bench_analytics --rows 10000000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from LabelAnalytics import LabeledColumns
+from tool import CATEGORY_PRIORITY
+
+MATCHES_PER_REQUIREMENT = 14
+N_PROJECTS = 50
+N_CLASSES = 12
+N_WORDS = 50_000
+CSV_SAMPLE_ROWS = 200_000
+SEED = 42
+
+
+def synthetic_columns(n_rows: int) -> LabeledColumns:
+    rng = np.random.default_rng(SEED)
+    n_requirements = max(1, n_rows // MATCHES_PER_REQUIREMENT)
+    match_req = np.sort(rng.integers(0, n_requirements, n_rows)).astype(np.int32)
+    match_word = np.minimum(rng.zipf(1.3, n_rows) - 1, N_WORDS - 1).astype(np.int32)
+    return LabeledColumns(
+        [f"R{i + 1}" for i in range(n_requirements)],
+        rng.integers(0, N_PROJECTS, n_requirements).astype(np.int32),
+        rng.integers(0, N_CLASSES, n_requirements).astype(np.int32),
+        rng.integers(5, 60, n_requirements).astype(np.int32),
+        match_req, rng.integers(0, len(CATEGORY_PRIORITY), n_rows).astype(np.int32), match_word,
+        [str(i + 1) for i in range(N_PROJECTS)], [f"C{i}" for i in range(N_CLASSES)], list(CATEGORY_PRIORITY),
+        [f"w{i}" for i in range(N_WORDS)])
+
+
+def csv_rows(columns: LabeledColumns, limit: int):
+    text = "The system shall refresh the display every 60 seconds."
+    for i in range(min(limit, len(columns.match_req))):
+        req = columns.match_req[i]
+        yield (columns.req_ids[req], columns.projects[columns.req_project[req]], text,
+               columns.classes[columns.req_class[req]], columns.categories[columns.match_category[i]],
+               columns.words[columns.match_word[i]])
+
+
+def timed(label: str, action, rows: int):
+    start = time.perf_counter()
+    result = action()
+    seconds = time.perf_counter() - start
+    print(f"  {label:<40} {seconds * 1000:>9.1f} ms {rows / seconds / 1e6:>8.1f} M righe/s")
+    return result
+
+
+def main(n_rows: int):
+    columns = synthetic_columns(n_rows)
+    print(f"Colonne sintetiche: {len(columns.match_req)} righe di match, {len(columns.req_ids)} requisiti")
+
+    sample = list(csv_rows(columns, CSV_SAMPLE_ROWS))
+    timed(f"from_rows ({len(sample)} righe CSV)", lambda: LabeledColumns.from_rows(sample), len(sample))
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = Path(tmp) / "analytics.npz"
+        timed("salvataggio cache .npz", lambda: columns.save(cache), n_rows)
+        loaded = timed("caricamento cache .npz", lambda: LabeledColumns.load(cache), n_rows)
+    assert loaded is not None and np.array_equal(loaded.match_word, columns.match_word)
+
+    for field in ("class", "project"):
+        for unit in ("matches", "requirements"):
+            timed(f"categoria x {field} ({unit})", lambda: columns.cooccurrence(field, unit), n_rows)
+    timed("densità di ambiguità", columns.ambiguity, n_rows)
+    timed("top 10 parole per categoria", lambda: columns.top_words(10), n_rows)
+
+
+# --- Main Logic ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark delle analisi colonnari dei risultati etichettati.")
+    parser.add_argument("--rows", type=int, default=5_000_000, help="righe di match sintetiche (default 5000000)")
+    args = parser.parse_args()
+    main(args.rows)
@@ -0,0 +1,82 @@
+"""
+Benchmark del confronto tra due esecuzioni di CompareRuns.py su output da milioni di righe.
+
+Replica Labeled_Dataset.csv (con ID rinumerati) fino al numero di righe richiesto e crea una
+seconda esecuzione modificata: "should" passa da mv a optional, un requisito su cento perde
+il primo match e uno su mille manca. Misura la fusione ordinata in streaming, il percorso con
+ordinamento esterno (--sort) e il picco di memoria residente, che non deve crescere con le righe.
+
+Esecuzione (dalla radice del progetto):
+    python -m benchmarks.bench_compare_runs
+    python -m benchmarks.bench_compare_runs --rows 5000000
+"""
+import argparse
+import csv
+import tempfile
+import time
+from itertools import groupby
+from pathlib import Path
+
+from CompareRuns import compare_runs
+from LabelQuery import LABELED_FILE
+from Metrics import peak_rss_mb
+from tool import OUTPUT_HEADER
+
+
+def write_runs(source: Path, old_path: Path, new_path: Path, n_rows: int) -> int:
+    with open(source, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f, delimiter=";")
+        next(reader)
+        groups = [list(rows) for _, rows in groupby(reader, key=lambda row: row[0])]
+    written = 0
+    next_id = 0
+    with open(old_path, "w", encoding="utf-8", newline="") as old_f, open(new_path, "w", encoding="utf-8", newline="") as new_f:
+        old_writer = csv.writer(old_f, delimiter=";")
+        new_writer = csv.writer(new_f, delimiter=";")
+        old_writer.writerow(OUTPUT_HEADER)
+        new_writer.writerow(OUTPUT_HEADER)
+        while written < n_rows:
+            for rows in groups:
+                next_id += 1
+                req_id = f"R{next_id}"
+                old_rows = [[req_id] + row[1:] for row in rows]
+                old_writer.writerows(old_rows)
+                written += len(old_rows)
+                if next_id % 1000 == 0:
+                    continue
+                new_rows = [row[:4] + ["optional", row[5]] if row[4] == "mv" and row[5].lower() == "should" else row
+                            for row in old_rows]
+                if next_id % 100 == 0 and len(new_rows) > 1:
+                    new_rows = new_rows[1:]
+                new_writer.writerows(new_rows)
+                if written >= n_rows:
+                    break
+    return written
+
+
+def main(n_rows: int, source: Path):
+    with tempfile.TemporaryDirectory() as tmp:
+        old_path, new_path = Path(tmp) / "old.csv", Path(tmp) / "new.csv"
+        written = write_runs(source, old_path, new_path, n_rows)
+        size_mb = (old_path.stat().st_size + new_path.stat().st_size) / (1024 * 1024)
+        print(f"Esecuzioni sintetiche: {written} righe ciascuna ({size_mb:.0f} MiB in totale)")
+        rss_before = peak_rss_mb()["self"]
+
+        for label, sort in (("fusione ordinata", False), ("con ordinamento esterno", True)):
+            start = time.perf_counter()
+            report = compare_runs(old_path, new_path, sort=sort, tmp_dir=Path(tmp))
+            elapsed = time.perf_counter() - start
+            print(f"  {label:<26} {elapsed:>7.2f} s {2 * written / elapsed / 1e6:>6.2f} M righe/s  "
+                  f"picco RSS {peak_rss_mb()['self']:.0f} MiB (prima del confronto {rss_before:.0f} MiB)")
+        matches = report["matches"]
+        print(f"Match: +{matches['added']} / -{matches['removed']}, {matches['reassigned']} riassegnazioni; "
+              f"requisiti solo nella prima esecuzione: {report['requirements']['removed']}")
+
+
+# --- Main Logic ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del confronto in streaming tra due esecuzioni etichettate.")
+    parser.add_argument("--rows", type=int, default=2_000_000, help="righe per esecuzione (default 2000000)")
+    parser.add_argument("--source", type=Path, default=LABELED_FILE, help=f"CSV etichettato da replicare (default {LABELED_FILE})")
+    args = parser.parse_args()
+    main(args.rows, args.source)
@@ -0,0 +1,125 @@
+"""
+Benchmark di memoria e velocità di ricerca della tabella delle parole singole dei dizionari.
+
+Confronta, sulle parole di NewDict/:
+  - la struttura precedente: Dict[str, Set[str]] più il dict parola -> tupla ordinata delle
+    candidate che il CategoryResolver costruiva all'avvio;
+  - CategoryTable letta dall'indice compilato in un dict parola -> tupla internata delle categorie;
+  - CategoryTable condivisa, con gli array letti direttamente dall'mmap dell'indice.
+
+La memoria è quella allocata da Python durante il caricamento (tracemalloc), parole comprese,
+insieme al tempo di caricamento; le pagine dell'mmap della modalità condivisa non sono contate perché appartengono alla page
+cache e sono condivise da tutti i processi che mappano lo stesso indice. La velocità è il tempo
+medio per token della ricerca delle categorie candidate (il percorso della modalità solo
+dizionario e dei miss della cache del resolver) sui token di Dataset_With_R_ID.txt.
+
+Esecuzione (dalla radice del progetto):
+    python -m benchmarks.bench_dict_memory
+"""
+import contextlib
+import gc
+import io
+import mmap
+import pickle
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from CategoryTable import CategoryTable
+from tool import (
+    DICTIONARIES_DIR, POS_CATEGORY_MAPPING, WORD_RX, CategoryResolver, category_sort_key, load_all_dicts_optimized,
+    norm_word,
+)
+
+REQUIREMENTS_FILE = Path("Dataset_With_R_ID.txt")
+REPEATS = 5
+
+
+def legacy_load(payload: bytes):
+    """Struttura precedente: mappa con un set per parola e candidate ordinate internate per insieme."""
+    singles_category_map = pickle.loads(payload)
+    interned = {}
+    candidates = {}
+    for word, categories in singles_category_map.items():
+        key = frozenset(categories)
+        ordered = interned.get(key)
+        if ordered is None:
+            ordered = interned[key] = tuple(sorted((c for c in categories if c.lower() in POS_CATEGORY_MAPPING),
+                                                   key=category_sort_key))
+        candidates[word] = ordered
+    return singles_category_map, candidates
+
+
+def measure_load(load):
+    """Esegue load() e restituisce (risultato, MiB allocati e ancora vivi, secondi senza tracemalloc)."""
+    gc.collect()
+    start = time.perf_counter()
+    load()
+    seconds = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    result = load()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current / (1024 * 1024), seconds
+
+
+def ns_per_lookup(lookup, tokens) -> float:
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for token in tokens:
+            lookup(token)
+        best = min(best, time.perf_counter() - start)
+    return best / len(tokens) * 1e9
+
+
+def main():
+    with contextlib.redirect_stdout(io.StringIO()):
+        table, _ = load_all_dicts_optimized(DICTIONARIES_DIR)
+    legacy_payload = pickle.dumps({word: set(categories) for word, categories in table.items()},
+                                  protocol=pickle.HIGHEST_PROTOCOL)
+    table_payload = table.to_bytes()
+    del table
+
+    text = REQUIREMENTS_FILE.read_text(encoding="utf-8") if REQUIREMENTS_FILE.exists() else ""
+    tokens = [norm_word(token) for token in WORD_RX.findall(text)] or ["system", "shall", "quickly"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        table_file = Path(tmp) / "table.bin"
+        table_file.write_bytes(table_payload)
+        with open(table_file, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (legacy_map, legacy_candidates), legacy_mb, legacy_s = measure_load(lambda: legacy_load(legacy_payload))
+        (dict_table, _), dict_mb, dict_s = measure_load(lambda: CategoryTable.from_buffer(table_payload))
+        (shared_table, _), shared_mb, shared_s = measure_load(lambda: CategoryTable.from_buffer(mm, shared=True))
+        dict_resolver = CategoryResolver(dict_table)
+        shared_resolver = CategoryResolver(shared_table)
+
+        rows = [
+            ("Dict[str, Set[str]] + candidate", legacy_mb, legacy_s, ns_per_lookup(legacy_candidates.get, tokens)),
+            ("CategoryTable (dict)", dict_mb, dict_s, ns_per_lookup(dict_resolver.candidates, tokens)),
+            ("CategoryTable (mmap condiviso)", shared_mb, shared_s, ns_per_lookup(shared_resolver.candidates, tokens)),
+        ]
+        mismatches = sum(1 for token in tokens
+                         if not ((legacy_candidates.get(token) or ()) == (dict_resolver.candidates(token) or ())
+                                 == (shared_resolver.candidates(token) or ())))
+
+        print(f"Parole singole: {len(dict_table)}, categorie: {len(dict_table.categories)}, "
+              f"token di prova: {len(tokens)}, indice serializzato: {len(table_payload) / 1024:.0f} KiB")
+        print(f"{'struttura':<34} {'memoria':>10} {'caricamento':>12} {'ricerca':>12}")
+        for name, mb, seconds, ns in rows:
+            print(f"{name:<34} {mb:>7.2f} MiB {seconds * 1000:>9.1f} ms {ns:>9.0f} ns")
+        print(f"Risultati diversi tra le strutture: {mismatches}")
+
+        del shared_resolver, shared_table
+        gc.collect()
+        mm.close()
+
+
+# --- Main Logic ---
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark del ricaricamento a caldo dei dizionari (DictManager.py).
+
+Su una copia temporanea di NewDict/ aggiunge a un file piccolo e al file più grande un numero
+crescente di parole e frasi nuove, misura il poll() che applica la modifica e quello che la
+annulla, e li confronta con il caricamento completo (load_all_dicts_optimized e indice
+compilato) che servirebbe senza ricaricamento incrementale. Alla fine verifica che i
+dizionari ricaricati coincidano con quelli letti da zero.
+
+Esecuzione (dalla radice del progetto):
+    python -m benchmarks.bench_dict_reload
+"""
+import contextlib
+import io
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from DictManager import DictManager
+from tool import DICTIONARIES_DIR, compile_dict_index, load_all_dicts_optimized, load_dict_index
+
+TARGET_FILES = ["Vague.txt", "adj.txt"]
+EDIT_SIZES = [1, 10, 100, 1000, 10000]  # voci aggiunte (una su dieci è una frase)
+
+
+def timed(action) -> float:
+    start = time.perf_counter()
+    action()
+    return time.perf_counter() - start
+
+
+def edit_lines(size: int):
+    return [f"zzbench{i:06d} phrase" if i % 10 == 9 else f"zzbench{i:06d}" for i in range(size)]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        dir_path = Path(tmp) / "NewDict"
+        index_path = Path(tmp) / "dict_index.bin"
+        shutil.copytree(DICTIONARIES_DIR, dir_path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            full_load = timed(lambda: load_all_dicts_optimized(dir_path))
+            compile_dict_index(dir_path, index_path)
+            index_load = timed(lambda: load_dict_index(dir_path, index_path))
+            manager = DictManager(dir_path, index_path)
+        print(f"Caricamento completo: {full_load * 1000:.1f} ms dai .txt, {index_load * 1000:.1f} ms dall'indice")
+
+        print(f"{'file':<12} {'voci':>7} {'aggiunta':>12} {'rimozione':>12}")
+        for name in TARGET_FILES:
+            path = dir_path / name
+            original = path.read_text(encoding="utf-8")
+            for size in EDIT_SIZES:
+                path.write_text(original + "\n".join(edit_lines(size)) + "\n", encoding="utf-8")
+                add = timed(manager.poll)
+                path.write_text(original, encoding="utf-8")
+                remove = timed(manager.poll)
+                print(f"{name:<12} {size:>7} {add * 1000:>9.2f} ms {remove * 1000:>9.2f} ms")
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            singles_category_map, multi_phrase_processor = load_all_dicts_optimized(dir_path)
+        with manager.pinned() as snapshot:
+            same = (dict(snapshot.singles_category_map.items()) == dict(singles_category_map.items())
+                    and snapshot.multi_phrase_processor.get_all_keywords() == multi_phrase_processor.get_all_keywords())
+        print(f"Dizionari ricaricati identici a un caricamento da zero: {'sì' if same else 'NO'} "
+              f"(versione {manager.version})")
+
+
+# --- Main Logic ---
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark della ricerca di quasi-duplicati di NearDuplicates.py.
+
+Genera requisiti sintetici (seed fisso): frasi casuali su un vocabolario ampio, un quinto
+delle quali ha qualche copia con poche parole sostituite. Per dimensioni crescenti misura
+find_near_duplicates (shingle, firme MinHash, bande LSH e verifica esatta) e riporta le
+coppie verificate; sul campione più piccolo confronta tempo e cluster con il confronto
+esaustivo di tutte le coppie, che cresce con il quadrato dei requisiti, e riporta quanti
+requisiti raggruppati dal confronto esaustivo trova anche LSH.
+
+Esecuzione (dalla radice del progetto):
+    python -m benchmarks.bench_near_duplicates
+    python -m benchmarks.bench_near_duplicates --sizes 10000 100000 200000
+"""
+import argparse
+import random
+import time
+from typing import List
+
+from NearDuplicates import JACCARD_THRESHOLD, DisjointSet, find_near_duplicates, jaccard, shingles
+
+VOCABULARY_SIZE = 20_000
+WORDS_PER_REQUIREMENT = (8, 30)
+DUPLICATE_SHARE = 0.2
+COPIES_PER_DUPLICATE = (1, 4)
+EDITED_WORDS = (0, 3)
+EXHAUSTIVE_SIZE = 3_000
+SEED = 42
+
+
+def synthetic_requirements(n: int) -> List[str]:
+    rng = random.Random(SEED)
+    vocabulary = [f"w{i}" for i in range(VOCABULARY_SIZE)]
+    texts: List[str] = []
+    while len(texts) < n:
+        words = rng.choices(vocabulary, k=rng.randint(*WORDS_PER_REQUIREMENT))
+        texts.append(" ".join(words))
+        if rng.random() < DUPLICATE_SHARE:
+            for _ in range(rng.randint(*COPIES_PER_DUPLICATE)):
+                copy = list(words)
+                for _ in range(rng.randint(*EDITED_WORDS)):
+                    copy[rng.randrange(len(copy))] = rng.choice(vocabulary)
+                texts.append(" ".join(copy))
+    # I duplicati non sono adiacenti nel file
+    rng.shuffle(texts)
+    return texts[:n]
+
+
+def exhaustive_clusters(texts: List[str], threshold: float) -> List[List[int]]:
+    shingle_sets = [shingles(text) for text in texts]
+    components = DisjointSet(len(texts))
+    for i in range(len(texts)):
+        for j in range(i):
+            if jaccard(shingle_sets[i], shingle_sets[j]) >= threshold:
+                components.union(i, j)
+    clusters = {}
+    for position in range(len(texts)):
+        clusters.setdefault(components.find(position), []).append(position)
+    return [members for _, members in sorted(clusters.items()) if len(members) > 1]
+
+
+def main(sizes: List[int], threshold: float):
+    print(f"{'requisiti':>10} {'tempo':>10} {'coppie verificate':>18} {'cluster':>8} {'duplicati':>10}")
+    for n in sizes:
+        texts = synthetic_requirements(n)
+        start = time.perf_counter()
+        clusters, stats = find_near_duplicates(texts, threshold)
+        elapsed = time.perf_counter() - start
+        print(f"{n:>10} {elapsed:>8.2f} s {stats['verified_pairs']:>18} {stats['clusters']:>8} {stats['duplicates']:>10}")
+
+    texts = synthetic_requirements(EXHAUSTIVE_SIZE)
+    start = time.perf_counter()
+    clusters, _ = find_near_duplicates(texts, threshold)
+    lsh_time = time.perf_counter() - start
+    start = time.perf_counter()
+    expected = exhaustive_clusters(texts, threshold)
+    exhaustive_time = time.perf_counter() - start
+    # LSH può perdere qualche coppia con somiglianza vicina alla soglia
+    found = sum(len(members) for members in clusters)
+    total = sum(len(members) for members in expected)
+    print(f"Confronto esaustivo su {EXHAUSTIVE_SIZE} requisiti ({EXHAUSTIVE_SIZE * (EXHAUSTIVE_SIZE - 1) // 2} coppie): "
+          f"{exhaustive_time:.2f} s contro {lsh_time:.2f} s con LSH; "
+          f"{'cluster identici' if clusters == expected else f'{found} requisiti raggruppati su {total} ({found / total:.1%})'}")
+
+
+# --- Main Logic ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark della ricerca di quasi-duplicati con MinHash e LSH.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000, 100_000],
+                        help="numeri di requisiti sintetici (default 10000 50000 100000)")
+    parser.add_argument("--threshold", type=float, default=JACCARD_THRESHOLD,
+                        help=f"soglia di Jaccard (default {JACCARD_THRESHOLD})")
+    args = parser.parse_args()
+    main(args.sizes, args.threshold)
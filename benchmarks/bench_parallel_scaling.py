@@ -0,0 +1,82 @@
+"""
+Benchmark di scalabilità dell'etichettatura parallela a shard (tool.label_file_parallel).
+
+Costruisce un corpus più grande replicando Dataset_With_R_ID.txt SCALE volte (con ID
+rinumerati), lo etichetta con 1, 2, ..., N processi senza cache di parsing e riporta tempo,
+throughput e speedup rispetto a 1 processo, verificando che l'output sia sempre identico.
+Se il modello spaCy non è installato misura la modalità solo dizionario.
+
+Esecuzione (dalla radice del progetto):
+    python -m benchmarks.bench_parallel_scaling [--scale 20] [--max-workers N] [--shard-mb 0.5]
+"""
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from AssociazioneID import format_requirement_line
+from tool import DICTIONARIES_DIR, label_file_parallel, load_spacy_model, parse_requirement_lines
+
+REQUIREMENTS_FILE = Path("Dataset_With_R_ID.txt")
+SCALE = 20
+
+
+def build_corpus(source: Path, target: Path, scale: int) -> int:
+    """Scrive in target le righe di source ripetute scale volte con ID R1..Rn progressivi."""
+    with open(source, encoding="utf-8") as in_f:
+        records = list(parse_requirement_lines(in_f))
+    n = 0
+    with open(target, "w", encoding="utf-8") as out_f:
+        for _ in range(scale):
+            for record in records:
+                n += 1
+                out_f.write(f"{format_requirement_line(record._replace(id=f'R{n}'))}\n")
+    return n
+
+
+def file_digest(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scalabilità di tool.py --workers da 1 a N processi.")
+    parser.add_argument("--scale", type=int, default=SCALE, help=f"ripetizioni del dataset (default {SCALE})")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1,
+                        help="numero massimo di processi (default: numero di core)")
+    parser.add_argument("--shard-mb", type=float, default=0.5, help="dimensione degli shard in MiB (default 0.5)")
+    args = parser.parse_args()
+
+    try:
+        load_spacy_model()
+        dictionary_only = False
+    except OSError:
+        dictionary_only = True
+    print(f"Modalità: {'solo dizionario (modello spaCy non installato)' if dictionary_only else 'modello spaCy'}")
+    print(f"Core disponibili: {os.cpu_count()}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = Path(tmp) / "corpus.txt"
+        n_requirements = build_corpus(REQUIREMENTS_FILE, corpus, args.scale)
+        print(f"Corpus: {n_requirements} requisiti, {corpus.stat().st_size / 1024 / 1024:.1f} MiB")
+
+        print(f"{'processi':>8} {'tempo (s)':>10} {'req/s':>10} {'speedup':>8}")
+        reference = None
+        base_time = None
+        for workers in range(1, max(1, args.max_workers) + 1):
+            output = Path(tmp) / f"labeled_{workers}.csv"
+            start = time.perf_counter()
+            processed, _ = label_file_parallel(corpus, output, workers, int(args.shard_mb * 1024 * 1024),
+                                               DICTIONARIES_DIR, dictionary_only=dictionary_only)
+            elapsed = time.perf_counter() - start
+
+            digest = file_digest(output)
+            reference = reference or digest
+            assert digest == reference, f"Output con {workers} processi diverso da quello con 1 processo"
+            base_time = base_time or elapsed
+            print(f"{workers:>8} {elapsed:>10.2f} {processed / elapsed:>10.1f} {base_time / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Micro-benchmark della marcatura dei token coperti da frasi multi-parola.
+
+Confronta la scansione originale (ogni frase contro ogni token del doc) con le ricerche
+binarie sugli offset di tool.phrase_token_indices, su requisiti sintetici lunghi e densi
+di frasi prese dai dizionari. Usa solo il tokenizer di spaCy, non serve il modello.
+
+Esecuzione (dalla radice del progetto):
+    python -m benchmarks.bench_phrase_overlap
+"""
+import random
+import time
+from pathlib import Path
+
+import spacy
+from flashtext import KeywordProcessor
+
+from tool import norm_phrase, phrase_token_indices
+
+DICTIONARIES_DIR = Path("NewDict")
+PHRASE_FILES = ["Incompletes.txt", "Continuance.txt", "Vague.txt", "Optional.txt"]
+FILLER_WORDS = ["the", "system", "shall", "display", "data", "user", "report", "within", "seconds", "and"]
+REQUIREMENT_LENGTHS = [50, 200, 1000, 2000]  # parole per requisito
+REQUIREMENTS_PER_LENGTH = 10
+PHRASE_DENSITY = 0.3  # probabilità che al posto di una parola venga inserita una frase
+REPEATS = 3
+SEED = 42
+
+
+def legacy_phrase_token_indices(doc, phrase_spans):
+    """Versione originale: per ogni frase scorre tutti i token del doc."""
+    occupied = set()
+    for start_char, end_char in phrase_spans:
+        for token in doc:
+            if token.idx < end_char and token.idx + len(token.text) > start_char:
+                occupied.add(token.i)
+    return occupied
+
+
+def load_phrases():
+    phrases = []
+    for name in PHRASE_FILES:
+        path = DICTIONARIES_DIR / name
+        if not path.is_file():
+            continue
+        for line in path.read_text(encoding="utf-8").splitlines():
+            s = line.strip()
+            if (" " in s) or ("_" in s) or ("-" in s):
+                phrases.append(norm_phrase(s))
+    return phrases
+
+
+def synthetic_requirement(rng, phrases, n_words):
+    parts = []
+    for _ in range(n_words):
+        if rng.random() < PHRASE_DENSITY:
+            parts.append(rng.choice(phrases))
+        else:
+            parts.append(rng.choice(FILLER_WORDS))
+    return " ".join(parts) + "."
+
+
+def best_of(fn, docs_and_spans):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for doc, spans in docs_and_spans:
+            fn(doc, spans)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    phrases = load_phrases()
+    if not phrases:
+        print(f"Nessuna frase multi-parola trovata in {DICTIONARIES_DIR}/{PHRASE_FILES}.")
+        return
+
+    processor = KeywordProcessor(case_sensitive=False)
+    for phrase in phrases:
+        processor.add_keyword(phrase, "bench")
+
+    nlp = spacy.blank("en")
+    rng = random.Random(SEED)
+
+    print(f"Frasi nel dizionario di prova: {len(phrases)}")
+    print(f"{'parole':>8} {'token':>8} {'frasi':>8} {'scansione (s)':>14} {'offset (s)':>12} {'speedup':>8}")
+    for n_words in REQUIREMENT_LENGTHS:
+        docs_and_spans = []
+        for _ in range(REQUIREMENTS_PER_LENGTH):
+            text = synthetic_requirement(rng, phrases, n_words)
+            spans = [(s, e) for _, s, e in processor.extract_keywords(text, span_info=True)]
+            docs_and_spans.append((nlp.make_doc(text), spans))
+
+        for doc, spans in docs_and_spans:
+            assert legacy_phrase_token_indices(doc, spans) == phrase_token_indices(doc, spans)
+
+        legacy = best_of(legacy_phrase_token_indices, docs_and_spans)
+        indexed = best_of(phrase_token_indices, docs_and_spans)
+        n_tokens = sum(len(doc) for doc, _ in docs_and_spans) // len(docs_and_spans)
+        n_spans = sum(len(spans) for _, spans in docs_and_spans) // len(docs_and_spans)
+        speedup = legacy / indexed if indexed > 0 else float("inf")
+        print(f"{n_words:>8} {n_tokens:>8} {n_spans:>8} {legacy:>14.4f} {indexed:>12.4f} {speedup:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark dei tempi di avvio di tool.py.
+
+Ogni scenario gira in un processo Python nuovo (come un'invocazione da riga di comando) e
+viene ripetuto RUNS volte; si riporta la mediana del tempo a muro del processo:
+  - import di tool.py (non deve importare spaCy né caricare il modello)
+  - import di spaCy, per confronto
+  - primo requisito etichettato in modalità solo dizionario (niente modello)
+  - primo requisito etichettato con il modello spaCy (saltato se il modello non è installato)
+
+Esecuzione (dalla radice del progetto):
+    python -m benchmarks.bench_startup
+"""
+import statistics
+import subprocess
+import sys
+import time
+
+RUNS = 5
+SAMPLE_TEXT = "The system shall refresh the display every 60 seconds."
+
+SCENARIOS = [
+    ("import tool", "import tool"),
+    ("import spacy", "import spacy"),
+    ("primo label (solo dizionario)",
+     f"from tool import Labeler; Labeler().label({SAMPLE_TEXT!r}, dictionary_only=True)"),
+    ("primo label (modello spaCy)",
+     f"from tool import Labeler; Labeler().label({SAMPLE_TEXT!r})"),
+]
+
+
+def time_process(code: str):
+    """Tempo a muro di un processo che esegue code, oppure None se il processo fallisce."""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        last_line = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else ""
+        print(f"  -> Fallito: {last_line}")
+        return None
+    return elapsed
+
+
+def main():
+    # Processo vuoto: costo fisso dell'interprete, da sottrarre idealmente a tutti gli scenari
+    baseline = statistics.median(time_process("pass") for _ in range(RUNS))
+    print(f"Interprete senza import: {baseline:.3f}s (mediana di {RUNS} esecuzioni)")
+    # Il primo giro compila l'indice dei dizionari se manca, così non pesa sulle misure
+    time_process(SCENARIOS[2][1])
+
+    print(f"{'scenario':<32} {'mediana (s)':>12} {'min (s)':>9} {'max (s)':>9}")
+    for label, code in SCENARIOS:
+        timings = []
+        for _ in range(RUNS):
+            elapsed = time_process(code)
+            if elapsed is None:
+                break
+            timings.append(elapsed)
+        if len(timings) < RUNS:
+            print(f"{label:<32} {'n/d':>12}")
+            continue
+        print(f"{label:<32} {statistics.median(timings):>12.3f} {min(timings):>9.3f} {max(timings):>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+Suite di benchmark della pipeline su un corpus sintetico di dimensione configurabile.
+
+Genera un file nel formato di Dataset.arff (righe <progetto>,'<testo>',<classe>) con parole e
+frasi prese da NewDict/, poi misura separatamente ogni fase della pipeline in un processo:
+  ids         lettura ARFF e assegnazione degli ID (AssociazioneID.iter_requirement_records)
+  dict_build  lettura dei .txt e compilazione dell'indice dei dizionari
+  dict_load   caricamento dell'indice compilato
+  labeling    parsing ed etichettatura con scrittura del CSV (modello spaCy se installato,
+              altrimenti modalità solo dizionario: la modalità è registrata nei risultati)
+  split       scrittura dei file per categoria (Splitter)
+  sample      campionamento a serbatoio (Selecter)
+
+I risultati (tempo, elementi e throughput per fase, picco di RSS, ambiente) vengono scritti in
+JSON. Con --baseline vengono confrontati con un'esecuzione precedente: una fase il cui throughput
+scende oltre --threshold rispetto alla baseline è una regressione e lo script esce con codice 1.
+La baseline si crea sulla propria macchina con --save-baseline: non ne viene fornita una.
+
+Esecuzione (dalla radice del progetto):
+    python -m benchmarks.bench_suite --scale 10k
+    python -m benchmarks.bench_suite --scale 100k --save-baseline benchmarks/results/baseline_100k.json
+    python -m benchmarks.bench_suite --scale 100k --baseline benchmarks/results/baseline_100k.json --threshold 0.15
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from AssociazioneID import format_requirement_line, iter_requirement_records
+from Metrics import peak_rss_mb
+from ParseCache import package_version
+from Selecter import ReservoirSampler, category_file_order, sample_rows_into
+from Splitter import write_rows_by_category
+from tool import (
+    DICTIONARIES_DIR, OUTPUT_HEADER, SPACY_BATCH_SIZE, SPACY_MODEL_NAME, Labeler, compile_dict_index,
+    load_dict_index, load_spacy_model, parse_requirement_lines, unique_match_rows,
+)
+
+RESULTS_DIR = Path("benchmarks") / "results"
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+DEFAULT_THRESHOLD = 0.20  # calo massimo di throughput tollerato rispetto alla baseline
+SEED = 42
+
+# Distribuzione delle classi e dei progetti simile a quella del PROMISE
+CLASS_WEIGHTS = {"F": 255, "US": 67, "SE": 66, "O": 77, "PE": 54, "LF": 38, "A": 21, "SC": 21, "MN": 17,
+                 "L": 13, "FT": 10, "PO": 12}
+PROJECTS = 50
+WORDS_PER_REQUIREMENT = (8, 40)
+# Parole "di struttura" dei requisiti, mescolate a quelle dei dizionari
+FILLER_WORDS = ["the", "system", "shall", "must", "should", "be", "able", "to", "user", "data", "product",
+                "application", "within", "and", "of", "a", "each", "report", "display", "all"]
+DICTIONARY_WORD_RATIO = 0.45
+PHRASE_RATIO = 0.05
+
+
+def parse_scale(value: str) -> int:
+    value = value.strip().lower()
+    if value in SCALES:
+        return SCALES[value]
+    try:
+        return int(value.replace("_", ""))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"scala non valida '{value}' (es. 10k, 100k, 1m o un numero)")
+
+
+def load_vocabulary(dictionaries_dir: Path = DICTIONARIES_DIR):
+    """Parole singole e frasi dei dizionari, senza caratteri che il formato ARFF non ammette nel testo."""
+    words, phrases = set(), set()
+    for path in sorted(dictionaries_dir.glob("*.txt")):
+        for line in path.read_text(encoding="utf-8", errors="replace").splitlines():
+            entry = line.strip().replace("_", " ")
+            if not entry or "'" in entry or "," in entry:
+                continue
+            (phrases if " " in entry or "-" in entry else words).add(entry)
+    return sorted(words), sorted(phrases)
+
+
+def generate_corpus(path: Path, n_requirements: int, seed: int = SEED) -> int:
+    """Scrive un file in stile Dataset.arff con n_requirements requisiti sintetici; restituisce i byte scritti."""
+    rng = random.Random(seed)
+    words, phrases = load_vocabulary()
+    classes = list(CLASS_WEIGHTS)
+    weights = list(CLASS_WEIGHTS.values())
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("@RELATION synthetic\n\n")
+        f.write(f"@ATTRIBUTE ProjectID {{{','.join(str(p) for p in range(1, PROJECTS + 1))}}}\n")
+        f.write("@ATTRIBUTE RequirementText string\n")
+        f.write(f"@ATTRIBUTE _class_ {{{','.join(classes)}}}\n\n@DATA\n")
+        for _ in range(n_requirements):
+            parts = []
+            for _ in range(rng.randint(*WORDS_PER_REQUIREMENT)):
+                roll = rng.random()
+                if roll < PHRASE_RATIO and phrases:
+                    parts.append(rng.choice(phrases))
+                elif roll < PHRASE_RATIO + DICTIONARY_WORD_RATIO:
+                    parts.append(rng.choice(words))
+                else:
+                    parts.append(rng.choice(FILLER_WORDS))
+            text = " ".join(parts).capitalize() + "."
+            req_class = rng.choices(classes, weights)[0]
+            f.write(f"{rng.randint(1, PROJECTS)},'{text}',{req_class}\n")
+    return path.stat().st_size
+
+
+def timed(results: dict, stage: str, items: int, seconds: float) -> None:
+    results[stage] = {
+        "seconds": round(seconds, 4),
+        "items": items,
+        "items_per_sec": round(items / seconds, 2) if seconds > 0 else None,
+    }
+    rate = f"{results[stage]['items_per_sec']:>12.1f}/s" if seconds > 0 else f"{'n/d':>14}"
+    print(f"  {stage:<11} {seconds:>9.3f}s {items:>10} elementi {rate}")
+
+
+def run_suite(n_requirements: int, seed: int, dictionary_only: bool, work_dir: Path) -> dict:
+    stages = {}
+    corpus = work_dir / "corpus.arff"
+    start = time.perf_counter()
+    corpus_bytes = generate_corpus(corpus, n_requirements, seed)
+    print(f"Corpus generato: {n_requirements} requisiti, {corpus_bytes / 1024 / 1024:.1f} MiB "
+          f"in {time.perf_counter() - start:.2f}s")
+
+    # 1. Assegnazione degli ID
+    ids_file = work_dir / "ids.txt"
+    start = time.perf_counter()
+    with open(corpus, encoding="utf-8") as in_f, open(ids_file, "w", encoding="utf-8") as out_f:
+        n_ids = 0
+        for record in iter_requirement_records(in_f):
+            out_f.write(f"{format_requirement_line(record)}\n")
+            n_ids += 1
+    timed(stages, "ids", n_ids, time.perf_counter() - start)
+
+    # 2. Dizionari: compilazione dai .txt e caricamento dell'indice
+    index_path = work_dir / "dict_index.bin"
+    quiet = contextlib.redirect_stdout(io.StringIO())
+    start = time.perf_counter()
+    with quiet:
+        compile_dict_index(DICTIONARIES_DIR, index_path)
+    timed(stages, "dict_build", 1, time.perf_counter() - start)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        singles_category_map, _ = load_dict_index(DICTIONARIES_DIR, index_path)
+    timed(stages, "dict_load", len(singles_category_map), time.perf_counter() - start)
+
+    # 3. Etichettatura (il caricamento del modello è escluso: lo misura bench_startup)
+    labeler = Labeler(DICTIONARIES_DIR, index_path=index_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        labeler.dictionaries
+        if not dictionary_only:
+            labeler.nlp
+    labeled_file = work_dir / "labeled.csv"
+    start = time.perf_counter()
+    labeled_rows = 0
+    with open(ids_file, encoding="utf-8") as req_f, open(labeled_file, "w", encoding="utf-8", newline="") as out_f:
+        writer = csv.writer(out_f, delimiter=";")
+        writer.writerow(OUTPUT_HEADER)
+        for record, matches in labeler.label_records(parse_requirement_lines(req_f), SPACY_BATCH_SIZE,
+                                                     dictionary_only=dictionary_only):
+            rows = unique_match_rows(record, matches)
+            writer.writerows(rows)
+            labeled_rows += len(rows)
+    timed(stages, "labeling", n_ids, time.perf_counter() - start)
+
+    # 4. Split per categoria
+    start = time.perf_counter()
+    with open(labeled_file, encoding="utf-8", newline="") as in_f, contextlib.redirect_stdout(io.StringIO()):
+        reader = csv.reader(in_f, delimiter=";")
+        header = next(reader)
+        split_rows, _ = write_rows_by_category(header, reader, work_dir / "categories")
+    timed(stages, "split", split_rows, time.perf_counter() - start)
+
+    # 5. Campionamento
+    start = time.perf_counter()
+    sampler = ReservoirSampler(seed=seed)
+    with open(labeled_file, encoding="utf-8", newline="") as in_f:
+        reader = csv.reader(in_f, delimiter=";")
+        header = next(reader)
+        sampled_rows = sample_rows_into(sampler, header, reader)
+    selected = sum(len(rows) for _, rows in sampler.samples(category_file_order))
+    timed(stages, "sample", sampled_rows, time.perf_counter() - start)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "requirements": n_requirements,
+            "seed": seed,
+            "corpus_bytes": corpus_bytes,
+            "labeled_rows": labeled_rows,
+            "selected_rows": selected,
+            "labeling_mode": "dictionary_only" if dictionary_only else "spacy",
+            "spacy_model": f"{SPACY_MODEL_NAME}=={package_version(SPACY_MODEL_NAME)}",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "peak_rss_mb": peak_rss_mb()["self"],
+        },
+        "stages": stages,
+    }
+
+
+def compare_with_baseline(results: dict, baseline: dict, threshold: float) -> list:
+    """Restituisce le fasi il cui throughput è sceso più di threshold rispetto alla baseline."""
+    regressions = []
+    for key in ("requirements", "labeling_mode"):
+        if baseline["meta"].get(key) != results["meta"].get(key):
+            print(f"Avviso: '{key}' diverso dalla baseline ({baseline['meta'].get(key)} -> {results['meta'].get(key)}): "
+                  "il confronto è poco significativo.")
+
+    print(f"\nConfronto con la baseline del {baseline['meta'].get('timestamp')} (soglia -{threshold:.0%}):")
+    for stage, current in results["stages"].items():
+        previous = baseline["stages"].get(stage)
+        if not previous or not previous.get("items_per_sec") or not current.get("items_per_sec"):
+            print(f"  {stage:<11} n/d")
+            continue
+        change = current["items_per_sec"] / previous["items_per_sec"] - 1
+        regression = change < -threshold
+        if regression:
+            regressions.append(stage)
+        print(f"  {stage:<11} {previous['items_per_sec']:>12.1f}/s -> {current['items_per_sec']:>12.1f}/s "
+              f"({change:+.1%}){'  REGRESSIONE' if regression else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per fase della pipeline su un corpus sintetico.")
+    parser.add_argument("--scale", type=parse_scale, default=SCALES["10k"],
+                        help="requisiti da generare: 10k, 100k, 1m o un numero (default 10k)")
+    parser.add_argument("--seed", type=int, default=SEED, help=f"seed del corpus e del campionamento (default {SEED})")
+    parser.add_argument("--dictionary-only", action="store_true", help="etichetta senza modello spaCy")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="esecuzioni della suite; per ogni fase si tiene la più veloce (default 1)")
+    parser.add_argument("--output", type=Path, default=None,
+                        help=f"file JSON dei risultati (default {RESULTS_DIR}/bench_<scala>_<data>.json)")
+    parser.add_argument("--baseline", type=Path, default=None, help="risultati JSON di riferimento da confrontare")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"calo di throughput oltre il quale una fase è una regressione (default {DEFAULT_THRESHOLD})")
+    parser.add_argument("--save-baseline", type=Path, default=None, help="salva i risultati anche come baseline")
+    args = parser.parse_args()
+
+    dictionary_only = args.dictionary_only
+    if not dictionary_only:
+        try:
+            load_spacy_model()
+        except OSError:
+            print(f"Modello spaCy '{SPACY_MODEL_NAME}' non installato: etichettatura in modalità solo dizionario.")
+            dictionary_only = True
+
+    results = None
+    for run in range(1, max(1, args.repeat) + 1):
+        if args.repeat > 1:
+            print(f"\n--- Esecuzione {run}/{args.repeat} ---")
+        with tempfile.TemporaryDirectory(prefix="bench_suite_") as tmp:
+            run_results = run_suite(args.scale, args.seed, dictionary_only, Path(tmp))
+        if results is None:
+            results = run_results
+            continue
+        for stage, values in run_results["stages"].items():
+            if values["seconds"] < results["stages"][stage]["seconds"]:
+                results["stages"][stage] = values
+        results["meta"]["peak_rss_mb"] = run_results["meta"]["peak_rss_mb"]
+    results["meta"]["repeat"] = max(1, args.repeat)
+    print(f"  picco RSS: {results['meta']['peak_rss_mb']} MiB")
+
+    output = args.output or RESULTS_DIR / f"bench_{args.scale}_{datetime.now():%Y%m%d_%H%M%S}.json"
+    for path in filter(None, (output, args.save_baseline)):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+        print(f"Risultati scritti in '{path}'.")
+
+    if args.baseline is not None:
+        try:
+            baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            print(f"ERRORE: baseline '{args.baseline}' non trovata (crearla con --save-baseline).")
+            sys.exit(1)
+        if compare_with_baseline(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+CategoryResolver deve scegliere per ogni token la prima categoria (in ordine di priorità)
+tra quelle della parola e del lemma compatibile con POS/tag, senza stato tra un token e
+l'altro: lo stesso token riceve la stessa categoria in qualunque ordine venga risolto.
+
+Esecuzione (dalla radice del progetto):
+    python -m unittest tests.test_category_resolver
+"""
+import random
+import unittest
+
+from tool import CATEGORY_PRIORITY, DICTIONARIES_DIR, POS_CATEGORY_MAPPING, CategoryResolver, Labeler, norm_word
+
+POS_TAGS = [("VERB", "VBN"), ("VERB", "VBD"), ("VERB", "VBG"), ("VERB", "VB"), ("AUX", "MD"), ("NOUN", "NN"),
+            ("NOUN", "NNS"), ("ADJ", "JJ"), ("ADV", "RB"), ("DET", "DT"), ("ADP", "IN"), ("PRON", "PRP")]
+
+
+def reference_resolve(singles_category_map, text, lemma, pos, tag):
+    """Il ciclo della versione originale, ma su una copia degli insiemi della mappa."""
+    w_original = norm_word(text)
+    potential_categories = set(singles_category_map.get(w_original, set()))
+    w_lemma = norm_word(lemma)
+    if w_original != w_lemma:
+        potential_categories.update(singles_category_map.get(w_lemma, set()))
+    if not potential_categories:
+        return None
+
+    def get_priority(category):
+        try:
+            return CATEGORY_PRIORITY.index(category.lower())
+        except ValueError:
+            return len(CATEGORY_PRIORITY)
+
+    for cat in sorted(potential_categories, key=lambda category: (get_priority(category), category)):
+        rule = POS_CATEGORY_MAPPING.get(cat.lower())
+        if rule is None:
+            continue
+        if "pos" in rule and pos in rule["pos"]:
+            return cat
+        if "tag" in rule and tag in rule["tag"]:
+            return cat
+    return None
+
+
+class CategoryResolverTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.table = Labeler(DICTIONARIES_DIR).singles_category_map
+        rng = random.Random(42)
+        vocabulary = rng.sample(sorted(cls.table), 300) + [f"zzmissing{i}" for i in range(20)]
+        cls.tokens = []
+        for _ in range(50_000):
+            text = rng.choice(vocabulary)
+            # Lo stesso testo riceve lemmi diversi, come gli omografi (es. "left": leave / left)
+            lemma = text if rng.random() < 0.5 else rng.choice(vocabulary)
+            cls.tokens.append((text, lemma) + rng.choice(POS_TAGS))
+
+    def test_matches_reference(self):
+        reference_map = {word: set(categories) for word, categories in self.table.items()}
+        resolver = CategoryResolver(self.table)
+        for token in self.tokens:
+            self.assertEqual(resolver.resolve(*token), reference_resolve(reference_map, *token), token)
+
+    def test_same_token_same_category_in_any_order(self):
+        resolver = CategoryResolver(self.table)
+        expected = {token: resolver.resolve(*token) for token in self.tokens}
+
+        shuffled = list(self.tokens)
+        random.Random(7).shuffle(shuffled)
+        for resolver in (CategoryResolver(self.table), resolver):
+            for token in shuffled:
+                self.assertEqual(resolver.resolve(*token), expected[token], token)
+
+
+if __name__ == "__main__":
+    unittest.main()
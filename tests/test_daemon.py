@@ -0,0 +1,60 @@
+"""
+LabelingDaemon.py deve rispondere a ogni richiesta in base al solo testo (e ai dizionari):
+le richieste precedenti e i testi dello stesso micro-batch non cambiano le etichette.
+
+Esecuzione (dalla radice del progetto):
+    python -m unittest tests.test_daemon
+"""
+import asyncio
+import random
+import unittest
+from itertools import islice
+from pathlib import Path
+
+from LabelingDaemon import MicroBatcher
+from tool import DICTIONARIES_DIR, Labeler, load_spacy_model, parse_requirement_lines
+
+REQUIREMENTS_FILE = Path("Dataset_With_R_ID.txt")
+REQUIREMENTS = 300
+
+
+async def label_all(batcher: MicroBatcher, texts):
+    batcher.start()
+    try:
+        return await asyncio.gather(*(batcher.label(text) for text in texts))
+    finally:
+        batcher.close()
+
+
+class DaemonDeterminismTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(REQUIREMENTS_FILE, 'r', encoding='utf-8') as f:
+            cls.texts = [record[2] for record in parse_requirement_lines(islice(f, REQUIREMENTS))]
+
+    def assert_independent_of_previous_requests(self, dictionary_only: bool):
+        # Un testo alla volta, nell'ordine del file...
+        batcher = MicroBatcher(Labeler(DICTIONARIES_DIR), dictionary_only=dictionary_only)
+        expected = {text: batcher._label_texts([text])[0] for text in self.texts}
+        # ...e in ordine casuale e in micro-batch, due volte con un altro daemon
+        shuffled = list(self.texts)
+        random.Random(3).shuffle(shuffled)
+        labeler = Labeler(DICTIONARIES_DIR)
+        for _ in range(2):
+            results = asyncio.run(label_all(MicroBatcher(labeler, dictionary_only=dictionary_only), shuffled))
+            for text, matches in zip(shuffled, results):
+                self.assertEqual(matches, expected[text], text)
+
+    def test_dictionary_only(self):
+        self.assert_independent_of_previous_requests(dictionary_only=True)
+
+    def test_spacy(self):
+        try:
+            load_spacy_model()
+        except OSError:
+            self.skipTest("modello spaCy non installato")
+        self.assert_independent_of_previous_requests(dictionary_only=False)
+
+
+if __name__ == "__main__":
+    unittest.main()
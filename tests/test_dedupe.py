@@ -0,0 +1,70 @@
+"""
+tool.py --dedupe deve dare lo stesso output dell'etichettatura normale, anche per i cluster
+di NearDuplicates.py i cui testi non sono identici.
+
+Esecuzione (dalla radice del progetto):
+    python -m unittest tests.test_dedupe
+"""
+import unittest
+from pathlib import Path
+
+from NearDuplicates import find_near_duplicates, read_requirements
+from tool import DICTIONARIES_DIR, Labeler, unique_match_rows
+
+REQUIREMENTS_FILE = Path("Dataset_With_R_ID.txt")
+
+
+def labeled_rows(labeled):
+    return [row for record, spans in labeled
+            for row in unique_match_rows(record, [(word, category, record[2]) for word, category, _, _ in spans])]
+
+
+class DedupeTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.labeler = Labeler(DICTIONARIES_DIR)
+        records = read_requirements(REQUIREMENTS_FILE)
+        by_id = {record.id: record for record in records}
+        # R3/R5 (Jaccard 0.46) e un duplicato esatto di R3 aggiunto in fondo
+        cls.records = [by_id["R3"], by_id["R4"], by_id["R5"], by_id["R6"],
+                       by_id["R3"]._replace(id="R3BIS"), by_id["R5"]._replace(id="R5BIS")]
+
+    def cluster_representatives(self, threshold: float):
+        clusters, _ = find_near_duplicates([record.text for record in self.records], threshold)
+        representatives = {}
+        for members in clusters:
+            for position in members[1:]:
+                representatives[self.records[position].id] = self.records[members[0]].id
+        return representatives
+
+    def test_dedupe_matches_plain_labeling(self):
+        representatives = self.cluster_representatives(0.45)
+        # Il cluster di R3 contiene anche R5, che ha un testo diverso
+        self.assertEqual(representatives.get("R5"), "R3")
+        self.assertNotEqual(self.records[0].text, self.records[2].text)
+
+        plain = labeled_rows(self.labeler.label_records_with_spans(self.records, dictionary_only=True))
+        deduplicated = labeled_rows(self.labeler.label_records_deduplicated(self.records, representatives,
+                                                                            dictionary_only=True))
+        self.assertEqual(deduplicated, plain)
+
+    def test_only_identical_texts_are_copied(self):
+        representatives = self.cluster_representatives(0.45)
+        labeled = []
+
+        def label(records, *args, **kwargs):
+            records = list(records)
+            labeled.extend(record.id for record in records)
+            return Labeler.label_records_with_spans(self.labeler, records, *args, **kwargs)
+
+        self.labeler.label_records_with_spans = label
+        try:
+            list(self.labeler.label_records_deduplicated(self.records, representatives, dictionary_only=True))
+        finally:
+            del self.labeler.label_records_with_spans
+        self.assertNotIn("R3BIS", labeled)
+        self.assertIn("R5", labeled)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+tool.py --incremental, dopo una modifica ai dizionari, deve scrivere lo stesso file di
+un'etichettatura completa con i dizionari modificati.
+
+Esecuzione (dalla radice del progetto):
+    python -m unittest tests.test_incremental
+"""
+import csv
+import io
+import shutil
+import tempfile
+import unittest
+from itertools import islice
+from pathlib import Path
+
+from LabelingState import LabelingState
+from tool import (DICTIONARIES_DIR, OUTPUT_HEADER, Labeler, load_spacy_model, parse_requirement_lines,
+                  run_incremental_labeling, unique_match_rows)
+
+REQUIREMENTS_FILE = Path("Dataset_With_R_ID.txt")
+REQUIREMENT_LINES = 400
+
+
+def full_output(requirements_file: Path, dictionaries_dir: Path) -> bytes:
+    out = io.StringIO(newline='')
+    csv_writer = csv.writer(out, delimiter=';')
+    csv_writer.writerow(OUTPUT_HEADER)
+    with open(requirements_file, 'r', encoding='utf-8') as f:
+        for record, matches in Labeler(dictionaries_dir, use_dict_index=False).label_records(parse_requirement_lines(f)):
+            csv_writer.writerows(unique_match_rows(record, matches))
+    return out.getvalue().encode('utf-8')
+
+
+class IncrementalTest(unittest.TestCase):
+    def setUp(self):
+        try:
+            load_spacy_model()
+        except OSError:
+            self.skipTest("modello spaCy non installato")
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = Path(tmp_dir.name)
+        self.dictionaries_dir = self.tmp_dir / "NewDict"
+        shutil.copytree(DICTIONARIES_DIR, self.dictionaries_dir)
+        self.requirements_file = self.tmp_dir / "requisiti.txt"
+        with open(REQUIREMENTS_FILE, 'r', encoding='utf-8') as f:
+            self.requirements_file.write_text("".join(islice(f, REQUIREMENT_LINES)), encoding='utf-8')
+        self.output_file = self.tmp_dir / "Labeled_Dataset.csv"
+
+    def run_incremental(self):
+        state = LabelingState(self.tmp_dir / "labeling_state.sqlite")
+        try:
+            return run_incremental_labeling(str(self.requirements_file), str(self.output_file),
+                                            Labeler(self.dictionaries_dir, use_dict_index=False), 0, None, state)
+        finally:
+            state.close()
+
+    def edit_dictionaries(self):
+        # Parole e una frase aggiunte, una parola rimossa
+        with open(self.dictionaries_dir / "Vague.txt", 'a', encoding='utf-8') as f:
+            f.write("\ndisplay\nrefresh\nevery second\n")
+        mv_path = self.dictionaries_dir / "mv.txt"
+        words = mv_path.read_text(encoding='utf-8').split("\n")
+        mv_path.write_text("\n".join(word for word in words if word != "should"), encoding='utf-8')
+
+    def test_incremental_after_dictionary_edit_equals_full_run(self):
+        self.run_incremental()
+        self.assertEqual(self.output_file.read_bytes(), full_output(self.requirements_file, self.dictionaries_dir))
+
+        self.edit_dictionaries()
+        total, relabeled, _ = self.run_incremental()
+        self.assertLess(relabeled, total)
+        self.assertGreater(relabeled, 0)
+        self.assertEqual(self.output_file.read_bytes(), full_output(self.requirements_file, self.dictionaries_dir))
+
+
+if __name__ == "__main__":
+    unittest.main()
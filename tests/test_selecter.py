@@ -0,0 +1,57 @@
+"""
+Selecter.py --dedupe-clusters deve estrarre al più un requisito per cluster di quasi-duplicati,
+con lo stesso campione qualunque sia l'ordine di lettura delle righe.
+
+Esecuzione (dalla radice del progetto):
+    python -m unittest tests.test_selecter
+"""
+import random
+import unittest
+
+from Selecter import ReservoirSampler
+
+CATEGORIES = ["adj", "noun", "verb", "vague"]
+
+
+def labeled_rows(n_requirements: int):
+    rng = random.Random(1)
+    rows = []
+    for i in range(1, n_requirements + 1):
+        for category in rng.sample(CATEGORIES, rng.randint(1, len(CATEGORIES))):
+            rows.append((category, f"R{i}", [f"R{i}", category]))
+    return rows
+
+
+class ClusterDedupeTest(unittest.TestCase):
+    def setUp(self):
+        self.rows = labeled_rows(400)
+        # Cluster di 5 requisiti consecutivi, rappresentato dal primo
+        self.clusters = {f"R{i}": f"R{i - (i - 1) % 5}" for i in range(1, 401) if (i - 1) % 5}
+
+    def sample(self, rows, clusters):
+        sampler = ReservoirSampler(sample_size=10, seed=42, clusters=clusters)
+        for category, req_id, row in rows:
+            sampler.add((category,), req_id, row)
+        return [(stratum, [row[0] for row in sampled]) for stratum, sampled in sampler.samples()]
+
+    def test_one_requirement_per_cluster(self):
+        selected = [req_id for _, ids in self.sample(self.rows, self.clusters) for req_id in ids]
+        representatives = [self.clusters.get(req_id, req_id) for req_id in selected]
+        self.assertEqual(len(representatives), len(set(representatives)))
+        self.assertEqual(len(selected), 10 * len(CATEGORIES))
+
+    def test_same_sample_in_any_order(self):
+        shuffled = list(self.rows)
+        random.Random(7).shuffle(shuffled)
+        expected = [(stratum, sorted(ids)) for stratum, ids in self.sample(self.rows, self.clusters)]
+        self.assertEqual([(stratum, sorted(ids)) for stratum, ids in self.sample(shuffled, self.clusters)], expected)
+
+    def test_without_clusters_ids_are_distinct(self):
+        sampler_ids = [req_id for _, ids in self.sample(self.rows, {}) for req_id in ids]
+        self.assertEqual(len(sampler_ids), len(set(sampler_ids)))
+        # Senza cluster vengono estratti anche membri dello stesso gruppo di 5
+        self.assertGreater(len(sampler_ids), len({self.clusters.get(i, i) for i in sampler_ids}))
+
+
+if __name__ == "__main__":
+    unittest.main()
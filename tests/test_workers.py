@@ -0,0 +1,62 @@
+"""
+tool.py --workers deve scrivere lo stesso file dell'etichettatura seriale, anche con spaCy.
+
+Esecuzione (dalla radice del progetto):
+    python -m unittest tests.test_workers
+"""
+import csv
+import io
+import tempfile
+import unittest
+from itertools import islice
+from pathlib import Path
+
+from tool import (DICTIONARIES_DIR, OUTPUT_HEADER, Labeler, label_file_parallel, load_spacy_model,
+                  parse_requirement_lines, unique_match_rows)
+
+REQUIREMENTS_FILE = Path("Dataset_With_R_ID.txt")
+REQUIREMENT_LINES = 600
+SHARD_SIZE = 8 * 1024
+
+
+def serial_output(requirements_file: Path, dictionary_only: bool) -> str:
+    out = io.StringIO(newline='')
+    csv_writer = csv.writer(out, delimiter=';')
+    csv_writer.writerow(OUTPUT_HEADER)
+    with open(requirements_file, 'r', encoding='utf-8') as f:
+        for record, matches in Labeler(DICTIONARIES_DIR).label_records(parse_requirement_lines(f),
+                                                                       dictionary_only=dictionary_only):
+            csv_writer.writerows(unique_match_rows(record, matches))
+    return out.getvalue()
+
+
+class WorkersTest(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = Path(tmp_dir.name)
+        # Un estratto del dataset, diviso in più shard
+        self.requirements_file = self.tmp_dir / "requisiti.txt"
+        with open(REQUIREMENTS_FILE, 'r', encoding='utf-8') as f:
+            self.requirements_file.write_text("".join(islice(f, REQUIREMENT_LINES)), encoding='utf-8')
+
+    def assert_workers_match_serial(self, dictionary_only: bool):
+        output_file = self.tmp_dir / "Labeled_Dataset.csv"
+        label_file_parallel(self.requirements_file, output_file, 2, SHARD_SIZE, DICTIONARIES_DIR,
+                            use_dict_index=False, dictionary_only=dictionary_only)
+        self.assertEqual(output_file.read_bytes(),
+                         serial_output(self.requirements_file, dictionary_only).encode('utf-8'))
+
+    def test_dictionary_only(self):
+        self.assert_workers_match_serial(dictionary_only=True)
+
+    def test_spacy(self):
+        try:
+            load_spacy_model()
+        except OSError:
+            self.skipTest("modello spaCy non installato")
+        self.assert_workers_match_serial(dictionary_only=False)
+
+
+if __name__ == "__main__":
+    unittest.main()
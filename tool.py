@@ -1,24 +1,69 @@
 import re 
+import hashlib
+import mmap
+import pickle
+import struct
 from pathlib import Path 
-from typing import Dict, Set, List, Tuple 
+from typing import Dict, Set, List, Tuple, Optional 
+from functools import lru_cache
+from bisect import bisect_left, bisect_right
 from flashtext import KeywordProcessor 
-import spacy 
 import csv
+import time
+import argparse
 import traceback 
+import io
+import os
+import contextlib
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from CategoryTable import CategoryTable
+from AssociazioneID import ArffFormatError, parse_requirement_line
+from ParseCache import ParseCache, PARSE_CACHE_FILE, model_cache_key, print_stats
+from LabelingState import LabelingState, LABELING_STATE_FILE
+from LabelStore import LabelStore, LABEL_STORE_FILE
+from NearDuplicates import DUPLICATES_FILE, read_representatives
+from Metrics import METRICS_FILE, PROFILE_FILES, PROFILERS, StageMetrics, print_stage_summary, profiling, write_metrics
 
 #Configurazione e Modello spaCy
 SPACY_MODEL_NAME = "en_core_web_sm"
+# Del modello leggiamo solo pos_, tag_, lemma_ e idx: parser e NER non servono.
+# "tok2vec" resta caricato perché è il livello di embedding da cui legge il tagger.
+SPACY_EXCLUDED_COMPONENTS = ["parser", "ner", "senter"]
+# Numero di requisiti passati insieme a nlp.pipe (0 = un documento alla volta)
+SPACY_BATCH_SIZE = 256
 
-try:
-    nlp = spacy.load(SPACY_MODEL_NAME)
-    print(f"[DEBUG] Modello spaCy '{SPACY_MODEL_NAME}' caricato con successo.")
-except OSError:
-    print(f"Errore: Modello spaCy '{SPACY_MODEL_NAME}' non trovato.")
-    print(f"Assicurati di averlo installato eseguendo: python -m spacy download {SPACY_MODEL_NAME}")
-    exit(1)
+DICTIONARIES_DIR = Path("NewDict")
 
 WORD_RX = re.compile(r"\b\w+\b", flags=re.UNICODE) 
-REQUIREMENT_LINE_PARSE_RX = re.compile(r"^(R\d+):\s*(\d+),\s*'(.*?)',\s*([A-Za-z0-9_]+)\s*$")
+# Indice compilato dei dizionari (mappa delle parole singole + trie FlashText delle frasi)
+DICT_INDEX_FILE = Path(".cache") / "dict_index.bin"
+DICT_INDEX_MAGIC = b"TRDICTIX"
+# Da incrementare a ogni modifica del formato o della normalizzazione delle voci
+DICT_INDEX_VERSION = 2
+_DICT_INDEX_HEADER = struct.Struct("<8sI32s")  # magic, versione, sha256 dei sorgenti
+# La tabella delle parole singole inizia al primo multiplo di 8 byte dopo l'intestazione
+_DICT_INDEX_TABLE_OFFSET = -(-_DICT_INDEX_HEADER.size // 8) * 8
+# FlashText considera parola solo [A-Za-z0-9_]: serve a indicizzare le parole delle frasi
+FLASHTEXT_WORD_RX = re.compile(r"[A-Za-z0-9_]+")
+# Da incrementare quando cambia il modo in cui lo stato incrementale viene calcolato
+LABELING_STATE_VERSION = 1
+OUTPUT_HEADER = ["ID", "ID progetto", "REQUISITO (testo)", "Classe dei requisiti", "CATEGORIA", "PAROLA"]
+# Modalità parallela: dimensione indicativa (in byte) dei blocchi del file dei requisiti dati a ogni worker
+SHARD_SIZE_BYTES = 1024 * 1024
+
+def load_spacy_model(model_name: str = SPACY_MODEL_NAME):
+    """
+    Carica il modello spaCy con i soli componenti usati. spaCy viene importato qui e non in
+    testa al modulo: il solo import costa circa un secondo. Solleva OSError se il modello
+    non è installato.
+    """
+    import spacy
+    return spacy.load(model_name, exclude=SPACY_EXCLUDED_COMPONENTS)
+
 
 def norm_word(s: str) -> str:
     return s.casefold().strip()
@@ -59,15 +104,40 @@ CATEGORY_PRIORITY = [
     "verb", "noun", "adj", "adv", "pronoun", "det", "preposition", "conjunction"
 ]
 
+# Posizione di ogni categoria in CATEGORY_PRIORITY (le categorie non elencate vanno in coda)
+CATEGORY_RANK = {category: rank for rank, category in enumerate(CATEGORY_PRIORITY)}
+# Numero massimo di decisioni (testo, lemma, POS, tag) -> categoria tenute in cache
+RESOLUTION_CACHE_SIZE = 50_000
+
+def category_sort_key(category: str) -> Tuple[int, str]:
+    return (CATEGORY_RANK.get(category.lower(), len(CATEGORY_PRIORITY)), category)
+
 # Funzioni di Caricamento Dizionari e Matching 
-def load_all_dicts_optimized(dir_path: Path):
+def parse_dict_entry(line: str) -> Optional[Tuple[bool, str]]:
+    """
+    Classifica una riga di un file di dizionario: (True, frase normalizzata) per le frasi
+    multi-parola, (False, parola normalizzata) per le parole singole, None per le righe vuote.
+    """
+    s = line.strip()
+    if not s:
+        return None
+    if (" " in s) or ("_" in s) or ("-" in s):
+        return True, norm_phrase(s)
+    return False, norm_word(s)
+
+
+def load_all_dicts_optimized(dir_path: Path) -> Tuple[CategoryTable, KeywordProcessor]:
+    """
+    Legge NewDict/*.txt: le parole singole finiscono nella CategoryTable (categorie internate
+    in ordine di CATEGORY_PRIORITY), le frasi multi-parola nel KeywordProcessor di FlashText.
+    """
     singles_category_map: Dict[str, Set[str]] = {}
     multi_phrase_processor = KeywordProcessor(case_sensitive=False)
 
     print(f"Caricamento dizionari ottimizzato dalla directory: {dir_path}")
     if not dir_path.is_dir():
         print(f"[ERRORE] La directory dei dizionari '{dir_path}' non esiste o non è una directory valida.")
-        return singles_category_map, multi_phrase_processor
+        return CategoryTable.from_mapping(singles_category_map), multi_phrase_processor
 
     dict_files_found = list(dir_path.glob("*.txt"))
     if not dict_files_found:
@@ -84,149 +154,1153 @@ def load_all_dicts_optimized(dir_path: Path):
         lines_read, phrases_added, words_added = 0, 0, 0
         for line in path.read_text(encoding="utf-8").splitlines():
             lines_read += 1
-            s = line.strip()
-            if not s:
+            entry = parse_dict_entry(line)
+            if entry is None:
                 continue
 
-            if (" " in s) or ("_" in s) or ("-" in s):
-                p_norm = norm_phrase(s)
-                multi_phrase_processor.add_keyword(p_norm, categoria)
+            is_phrase, normalized = entry
+            if is_phrase:
+                multi_phrase_processor.add_keyword(normalized, categoria)
                 phrases_added += 1
             else:
-                w_norm = norm_word(s)
-                singles_category_map.setdefault(w_norm, set()).add(categoria)
+                singles_category_map.setdefault(normalized, set()).add(categoria)
                 words_added += 1
         print(f"    [DEBUG] Lette {lines_read} righe. Aggiunte {phrases_added} frasi e {words_added} parole singole per la categoria '{categoria}'.")
     
     print(f"  Caricate {len(singles_category_map)} parole singole e {len(multi_phrase_processor.get_all_keywords())} frasi multi-parola.")
+    return CategoryTable.from_mapping(singles_category_map, category_sort_key), multi_phrase_processor
+
+
+
+def dict_sources_hash(dir_path: Path) -> bytes:
+    """
+    Calcola l'hash SHA-256 del contenuto dei file .txt dei dizionari (nome e byte di ogni file,
+    in ordine), usato come chiave dell'indice compilato.
+    """
+    return hash_dict_sources((path.name, path.read_bytes()) for path in sorted(dir_path.glob("*.txt")))
+
+
+def hash_dict_sources(named_contents) -> bytes:
+    """Come dict_sources_hash, su coppie (nome del file, byte) già lette e in ordine di percorso."""
+    digest = hashlib.sha256()
+    for name, content in named_contents:
+        digest.update(name.encode("utf-8") + b"\0")
+        digest.update(content)
+        digest.update(b"\0")
+    return digest.digest()
+
+
+def compile_dict_index(dir_path: Path, index_path: Path = DICT_INDEX_FILE):
+    """
+    Passo "compila dizionari": carica NewDict/*.txt e scrive in index_path un unico file binario
+    versionato con la tabella delle parole singole (array, leggibili direttamente dall'mmap)
+    e il KeywordProcessor delle frasi, indicizzato dall'hash del contenuto dei sorgenti.
+    """
+    sources_hash = dict_sources_hash(dir_path)
+    singles_category_map, multi_phrase_processor = load_all_dicts_optimized(dir_path)
+    write_dict_index(index_path, sources_hash, singles_category_map, multi_phrase_processor)
     return singles_category_map, multi_phrase_processor
 
 
+def write_dict_index(index_path: Path, sources_hash: bytes, singles_category_map: CategoryTable,
+                     multi_phrase_processor: KeywordProcessor) -> None:
+    """Scrive l'indice compilato di dizionari già caricati da sorgenti con hash sources_hash."""
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = index_path.with_suffix(index_path.suffix + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(_DICT_INDEX_HEADER.pack(DICT_INDEX_MAGIC, DICT_INDEX_VERSION, sources_hash))
+        f.write(b"\0" * (_DICT_INDEX_TABLE_OFFSET - _DICT_INDEX_HEADER.size))
+        f.write(singles_category_map.to_bytes())
+        pickle.dump(multi_phrase_processor, f, protocol=pickle.HIGHEST_PROTOCOL)
+    # Sostituzione atomica: un'altra esecuzione non legge mai un indice scritto a metà
+    tmp_path.replace(index_path)
+    print(f"  Indice dizionari compilato in '{index_path}'.")
 
-def tokenize_and_match_with_spacy(requirement_text: str,
-                                   singles_category_map: Dict[str, Set[str]],
-                                   multi_phrase_processor: KeywordProcessor,
-                                   nlp) -> List[Tuple[str, str, str]]:
-    found_matches: List[Tuple[str, str, str]] = []
-    doc = nlp(requirement_text)
+
+def read_dict_index(index_path: Path, expected_hash: bytes, shared: bool = False):
+    """
+    Legge l'indice compilato mappandolo in memoria. Restituisce None se il file manca,
+    ha un formato/versione diversi, è stato compilato da sorgenti diverse o con un altro
+    ordine di CATEGORY_PRIORITY. Con shared la tabella delle parole singole resta sull'mmap
+    (condiviso tra i processi che leggono lo stesso indice) invece di essere copiata in un dict.
+    """
+    try:
+        with open(index_path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(mm) < _DICT_INDEX_TABLE_OFFSET:
+                return None
+            magic, version, sources_hash = _DICT_INDEX_HEADER.unpack_from(mm, 0)
+            if magic != DICT_INDEX_MAGIC or version != DICT_INDEX_VERSION or sources_hash != expected_hash:
+                return None
+            with memoryview(mm) as payload:
+                table_view = payload[_DICT_INDEX_TABLE_OFFSET:]
+                singles_category_map, table_size = CategoryTable.from_buffer(table_view, shared=shared)
+                multi_phrase_processor = pickle.loads(payload[_DICT_INDEX_TABLE_OFFSET + table_size:])
+                if not shared:
+                    table_view.release()
+        finally:
+            if not shared:
+                mm.close()
+        if list(singles_category_map.categories) != sorted(singles_category_map.categories, key=category_sort_key):
+            return None
+        return singles_category_map, multi_phrase_processor
+    except (OSError, ValueError, struct.error, pickle.UnpicklingError, EOFError):
+        return None
+
+
+def load_dict_index(dir_path: Path, index_path: Path = DICT_INDEX_FILE, shared: bool = False):
+    """
+    Restituisce (singles_category_map, multi_phrase_processor) dall'indice compilato,
+    ricompilandolo solo se manca o se un file di NewDict/ è cambiato. Per shared vedi read_dict_index.
+    """
+    if not dir_path.is_dir():
+        return load_all_dicts_optimized(dir_path)
+
+    sources_hash = dict_sources_hash(dir_path)
+    loaded = read_dict_index(index_path, sources_hash, shared)
+    if loaded is not None:
+        singles_category_map, multi_phrase_processor = loaded
+        print(f"Dizionari caricati dall'indice compilato '{index_path}': "
+              f"{len(singles_category_map)} parole singole e {len(multi_phrase_processor)} frasi multi-parola.")
+        return singles_category_map, multi_phrase_processor
+
+    print(f"Indice dizionari '{index_path}' assente o non aggiornato: ricompilazione.")
+    compiled = compile_dict_index(dir_path, index_path)
+    if shared:
+        return read_dict_index(index_path, sources_hash, shared) or compiled
+    return compiled
+
+
+class CategoryResolver:
+    """
+    Risolve la categoria di un token singolo. Le categorie candidate di una parola sono la sua
+    maschera nella CategoryTable, i cui bit seguono già l'ordine di CATEGORY_PRIORITY; la
+    decisione finale è memorizzata in una cache LRU limitata indicizzata da (maschera delle
+    candidate, POS, tag).
+
+    La risoluzione è una funzione pura del token: le categorie candidate sono l'unione di quelle
+    della parola e del lemma nella tabella, senza stato portato da un token all'altro, quindi lo
+    stesso token riceve la stessa categoria in qualunque ordine (e processo) venga risolto.
+    """
+
+    def __init__(self, singles_category_map: CategoryTable, cache_size: int = RESOLUTION_CACHE_SIZE):
+        self.singles_category_map = singles_category_map
+        # Le categorie senza regola in POS_CATEGORY_MAPPING non possono mai essere scelte
+        self.selectable_mask = singles_category_map.mask_of(
+            c for c in singles_category_map.categories if c.lower() in POS_CATEGORY_MAPPING)
+        # candidates(parola normalizzata) -> categorie selezionabili in ordine di priorità (None o ()
+        # se non ce ne sono); se tutte le categorie hanno una regola è direttamente la ricerca nella tabella
+        if self.selectable_mask == singles_category_map.mask_of(singles_category_map.categories):
+            self.candidates = singles_category_map.get
+        else:
+            self.candidates = self._selectable_candidates
+        self.decide = lru_cache(maxsize=cache_size)(self._decide)
+
+    def _selectable_candidates(self, word: str) -> Tuple[str, ...]:
+        table = self.singles_category_map
+        return table.names(table.mask(word) & self.selectable_mask)
+
+    def resolve(self, text: str, lemma: str, pos: str, tag: str) -> Optional[str]:
+        table = self.singles_category_map
+        # --- FASE 1: Ricerca della PAROLA ORIGINALE (token.text) ---
+        # Questa ha la priorità perché è più specifica (es. cerca "allowed")
+        w_original = norm_word(text)
+        mask = table.mask(w_original)
+
+        # --- FASE 2: Ricerca del LEMMA (token.lemma_) ---
+        # Se non troviamo la parola originale, o per coprire varianti (es. plurale), cerchiamo il lemma:
+        # le categorie di parola e lemma si uniscono con un OR delle maschere.
+        w_lemma = norm_word(lemma)
+        if w_original != w_lemma:
+            mask |= table.mask(w_lemma)
+        return self.decide(mask & self.selectable_mask, pos, tag)
+
+    def _decide(self, mask: int, pos: str, tag: str) -> Optional[str]:
+        # La prima categoria (in ordine di priorità) compatibile con POS/tag del token vince
+        for cat in self.singles_category_map.names(mask):
+            rule = POS_CATEGORY_MAPPING[cat.lower()]
+            if "pos" in rule and pos in rule["pos"]:
+                return cat
+            if "tag" in rule and tag in rule["tag"]:
+                return cat
+        return None
+
+    def cache_stats(self) -> Dict[str, int]:
+        info = self.decide.cache_info()
+        return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
+
+
+_last_resolver: Optional[CategoryResolver] = None
+
+
+def get_category_resolver(singles_category_map: CategoryTable) -> CategoryResolver:
+    """
+    Restituisce il resolver associato alla mappa: viene ricostruito solo se la mappa
+    passata non è la stessa dell'ultima chiamata.
+    """
+    global _last_resolver
+    if _last_resolver is None or _last_resolver.singles_category_map is not singles_category_map:
+        _last_resolver = CategoryResolver(singles_category_map)
+    return _last_resolver
+
+
+def covered_token_indices(token_starts: List[int], token_ends: List[int],
+                          phrase_spans: List[Tuple[int, int]]) -> Set[int]:
+    """
+    Restituisce gli indici dei token (dati da offset di inizio e fine ordinati) che si
+    sovrappongono ad almeno uno degli span (start_char, end_char): per ogni span bastano
+    due ricerche binarie invece di scorrere tutti i token.
+    """
     occupied_token_indices: Set[int] = set()
+    for start_char, end_char in phrase_spans:
+        # Ultimo token che inizia entro start_char: è coperto solo se termina dopo start_char
+        first = bisect_right(token_starts, start_char) - 1
+        if first < 0 or token_ends[first] <= start_char:
+            first += 1
+        # Tutti i token che iniziano prima di end_char, a partire da first
+        last = bisect_left(token_starts, end_char)
+        occupied_token_indices.update(range(first, last))
+    return occupied_token_indices
+
+
+def phrase_token_indices(doc, phrase_spans: List[Tuple[int, int]]) -> Set[int]:
+    """Indici dei token del doc coperti da almeno uno degli span (vedi covered_token_indices)."""
+    if not phrase_spans:
+        return set()
+    token_starts = [token.idx for token in doc]
+    token_ends = [token.idx + len(token) for token in doc]
+    return covered_token_indices(token_starts, token_ends, phrase_spans)
+
+
+def match_spans_in_doc(requirement_text: str,
+                       singles_category_map: CategoryTable,
+                       multi_phrase_processor: KeywordProcessor,
+                       doc,
+                       resolver: Optional["CategoryResolver"] = None,
+                       metrics: Optional[StageMetrics] = None) -> List[Tuple[str, str, int, int]]:
+    """
+    Come tokenize_and_match_with_spacy su un doc già analizzato, ma ogni match è
+    (parola o frase, categoria, offset iniziale, offset finale) in caratteri del testo.
+    Con metrics vengono misurati i tempi delle fasi flashtext, overlap e lookup.
+    """
+    found_matches: List[Tuple[str, str, int, int]] = []
+    if resolver is None:
+        resolver = get_category_resolver(singles_category_map)
+    if metrics is not None:
+        t_start = time.perf_counter()
 
     # 1. Ricerca di frasi multi-parola (prioritaria)
     multi_keywords_with_spans = multi_phrase_processor.extract_keywords(requirement_text, span_info=True)
     for match_category, start_char, end_char in multi_keywords_with_spans:
         original_matched_text = requirement_text[start_char:end_char]
-        found_matches.append((original_matched_text, match_category, requirement_text))
-        
-        for token in doc:
-            if (token.idx < end_char and token.idx + len(token.text) > start_char):
-                occupied_token_indices.add(token.i)
+        found_matches.append((original_matched_text, match_category, start_char, end_char))
+    if metrics is not None:
+        t_phrases = time.perf_counter()
+
+    # I token coperti da una frase non vengono più cercati come parole singole
+    phrase_spans = [(start_char, end_char) for _, start_char, end_char in multi_keywords_with_spans]
+    occupied_token_indices = phrase_token_indices(doc, phrase_spans)
+    if metrics is not None:
+        t_overlap = time.perf_counter()
 
-    # 2. Ricerca di parole singole con NUOVA STRATEGIA A DUE PASSATE
+    # 2. Ricerca di parole singole: la decisione (testo, lemma, POS, tag) -> categoria è del resolver
     for token in doc:
         if token.i in occupied_token_indices:
             continue
 
-        # --- FASE 1: Ricerca della PAROLA ORIGINALE (token.text) ---
-        # Questa ha la priorità perché è più specifica (es. cerca "allowed")
-        w_original = norm_word(token.text)
-        potential_categories = singles_category_map.get(w_original, set())
-        
-        # --- FASE 2: Ricerca del LEMMA (token.lemma_) ---
-        # Se non troviamo la parola originale, o per coprire varianti (es. plurale), cerchiamo il lemma.
-        w_lemma = norm_word(token.lemma_)
-        if w_original != w_lemma:
-            potential_categories.update(singles_category_map.get(w_lemma, set()))
+        category = resolver.resolve(token.text, token.lemma_, token.pos_, token.tag_)
+        if category is not None:
+            found_matches.append((token.text, category, token.idx, token.idx + len(token.text)))
 
-        # Se abbiamo trovato delle categorie candidate (o dalla parola originale o dal lemma)
-        if potential_categories:
-            
-            def get_priority(category):
-                try:
-                    return CATEGORY_PRIORITY.index(category.lower())
-                except ValueError:
-                    return len(CATEGORY_PRIORITY)
+    if metrics is not None:
+        metrics.add_time("flashtext", t_phrases - t_start)
+        metrics.add_time("overlap", t_overlap - t_phrases)
+        metrics.add_time("lookup", time.perf_counter() - t_overlap)
+        record_match_counts(metrics, len(doc), found_matches)
+    return found_matches
 
-            sorted_categories = sorted(list(potential_categories), key=get_priority)
 
-            for cat in sorted_categories:
-                rule = POS_CATEGORY_MAPPING.get(cat.lower())
+def record_match_counts(metrics: StageMetrics, n_tokens: int, matches: List[Tuple[str, str, int, int]]) -> None:
+    metrics.count("tokens", n_tokens)
+    metrics.count("matches", len(matches))
+    for _, category, _, _ in matches:
+        metrics.count_category(category)
 
-                if rule is None:
-                    continue
 
-                match_found = False
-                if "pos" in rule and token.pos_ in rule["pos"]:
-                    match_found = True
-                elif "tag" in rule and token.tag_ in rule["tag"]:
-                    match_found = True
-                
-                if match_found:
-                    found_matches.append((token.text, cat, requirement_text))
-                    break # Trovata la migliore corrispondenza, esci
+def tokenize_and_match_with_spacy(requirement_text: str,
+                                   singles_category_map: CategoryTable,
+                                   multi_phrase_processor: KeywordProcessor,
+                                   nlp,
+                                   doc=None,
+                                   resolver: Optional["CategoryResolver"] = None) -> List[Tuple[str, str, str]]:
+    # Il doc può arrivare già analizzato (es. da nlp.pipe nella modalità a batch)
+    if doc is None:
+        doc = nlp(requirement_text)
+    spans = match_spans_in_doc(requirement_text, singles_category_map, multi_phrase_processor, doc, resolver)
+    return [(word, category, requirement_text) for word, category, _, _ in spans]
+
+
+def match_dictionary_only_spans(requirement_text: str,
+                                singles_category_map: CategoryTable,
+                                multi_phrase_processor: KeywordProcessor,
+                                resolver: Optional[CategoryResolver] = None,
+                                metrics: Optional[StageMetrics] = None) -> List[Tuple[str, str, int, int]]:
+    """
+    Modalità veloce "solo dizionario", senza modello spaCy: stesse frasi multi-parola di
+    tokenize_and_match_with_spacy, ma i token sono le parole di WORD_RX e ognuno prende la
+    categoria a priorità più alta tra quelle del dizionario, senza lemmi né disambiguazione POS.
+    I match sono (parola o frase, categoria, offset iniziale, offset finale).
+    """
+    found_matches: List[Tuple[str, str, int, int]] = []
+    if resolver is None:
+        resolver = get_category_resolver(singles_category_map)
+    if metrics is not None:
+        t_start = time.perf_counter()
 
+    multi_keywords_with_spans = multi_phrase_processor.extract_keywords(requirement_text, span_info=True)
+    for match_category, start_char, end_char in multi_keywords_with_spans:
+        found_matches.append((requirement_text[start_char:end_char], match_category, start_char, end_char))
+    if metrics is not None:
+        t_phrases = time.perf_counter()
+
+    words = list(WORD_RX.finditer(requirement_text))
+    occupied_token_indices = set()
+    if multi_keywords_with_spans:
+        occupied_token_indices = covered_token_indices([w.start() for w in words], [w.end() for w in words],
+                                                       [(start, end) for _, start, end in multi_keywords_with_spans])
+    if metrics is not None:
+        t_overlap = time.perf_counter()
+
+    for i, word in enumerate(words):
+        if i in occupied_token_indices:
+            continue
+        candidates = resolver.candidates(norm_word(word.group()))
+        if candidates:
+            found_matches.append((word.group(), candidates[0], word.start(), word.end()))
+
+    if metrics is not None:
+        metrics.add_time("flashtext", t_phrases - t_start)
+        metrics.add_time("overlap", t_overlap - t_phrases)
+        metrics.add_time("lookup", time.perf_counter() - t_overlap)
+        record_match_counts(metrics, len(words), found_matches)
     return found_matches
 
+
+def match_dictionary_only(requirement_text: str,
+                          singles_category_map: CategoryTable,
+                          multi_phrase_processor: KeywordProcessor,
+                          resolver: Optional[CategoryResolver] = None) -> List[Tuple[str, str, str]]:
+    """Come match_dictionary_only_spans, con i match nella forma (parola, categoria, testo)."""
+    spans = match_dictionary_only_spans(requirement_text, singles_category_map, multi_phrase_processor, resolver)
+    return [(word, category, requirement_text) for word, category, _, _ in spans]
+
+
+def parse_requirement_lines(lines):
+    """
+    Legge le righe di Dataset_With_R_ID.txt e restituisce (in streaming) i record
+    Requirement (ID, ID progetto, testo, classe), con apici ed escape interpretati come
+    nel file ARFF. Le righe vuote vengono saltate, quelle non parsabili segnalate e ignorate.
+    """
+    for line_num, line in enumerate(lines, 1):
+        stripped_line = line.strip()
+        if not stripped_line:
+            continue
+
+        try:
+            yield parse_requirement_line(stripped_line, line_num)
+        except ArffFormatError as e:
+            print(f"Avviso: Riga {line_num} non parsabile (ignorata): {e}")
+
+
+def iter_chunks(items, size: int):
+    """Divide un iterabile in liste consecutive di al più size elementi."""
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_requirement_docs(records, nlp, batch_size: int = SPACY_BATCH_SIZE):
+    """
+    Analizza in streaming i record (ID, ID progetto, testo, classe) e restituisce coppie
+    (record, doc) nello stesso ordine. Con batch_size > 0 i testi passano da nlp.pipe a blocchi
+    di batch_size documenti; con batch_size <= 0 ogni requisito viene analizzato da solo.
+    """
+    if batch_size <= 0:
+        for record in records:
+            yield record, nlp(record[2])
+        return
+
+    text_and_records = ((record[2], record) for record in records)
+    for doc, record in nlp.pipe(text_and_records, as_tuples=True, batch_size=batch_size):
+        yield record, doc
+
+
+class Labeler:
+    """
+    Raccoglie dizionari, resolver e modello spaCy caricandoli solo al primo utilizzo:
+    importare tool.py o creare un Labeler non costa nulla, e la modalità solo dizionario
+    (o una cache di parsing completa) non carica mai il modello. Con un dict_manager
+    (vedi DictManager.py) i dizionari sono quelli, ricaricabili a caldo, del manager.
+    """
+
+    def __init__(self,
+                 dictionaries_dir: Path = DICTIONARIES_DIR,
+                 model_name: str = SPACY_MODEL_NAME,
+                 use_dict_index: bool = True,
+                 index_path: Path = DICT_INDEX_FILE,
+                 metrics: Optional[StageMetrics] = None,
+                 shared_dicts: bool = False,
+                 dict_manager=None):
+        self.dictionaries_dir = dictionaries_dir
+        self.model_name = model_name
+        self.use_dict_index = use_dict_index
+        self.index_path = index_path
+        # Tabella delle parole singole letta direttamente dall'mmap dell'indice (vedi read_dict_index)
+        self.shared_dicts = shared_dicts
+        self._nlp = None
+        self._dictionaries = None
+        self._resolver: Optional[CategoryResolver] = None
+        # Tempi e contatori per fase (opzionali, vedi Metrics.py)
+        self.metrics = metrics
+        self.dict_manager = dict_manager
+
+    @property
+    def nlp(self):
+        if self._nlp is None:
+            start = time.perf_counter()
+            self._nlp = load_spacy_model(self.model_name)
+            if self.metrics is not None:
+                self.metrics.add_time("load_model", time.perf_counter() - start)
+            print(f"Modello spaCy '{self.model_name}' caricato.")
+        return self._nlp
+
+    @property
+    def dictionaries(self) -> Tuple[CategoryTable, KeywordProcessor]:
+        if self.dict_manager is not None:
+            snapshot = self.dict_manager.current()
+            return snapshot.singles_category_map, snapshot.multi_phrase_processor
+        if self._dictionaries is None:
+            start = time.perf_counter()
+            if self.use_dict_index:
+                self._dictionaries = load_dict_index(self.dictionaries_dir, self.index_path, self.shared_dicts)
+            else:
+                self._dictionaries = load_all_dicts_optimized(self.dictionaries_dir)
+            if self.metrics is not None:
+                self.metrics.add_time("load_dicts", time.perf_counter() - start)
+        return self._dictionaries
+
+    @property
+    def singles_category_map(self) -> CategoryTable:
+        return self.dictionaries[0]
+
+    @property
+    def multi_phrase_processor(self) -> KeywordProcessor:
+        return self.dictionaries[1]
+
+    @property
+    def resolver(self) -> CategoryResolver:
+        if self.dict_manager is not None:
+            return self.dict_manager.current().resolver
+        if self._resolver is None:
+            self._resolver = CategoryResolver(self.singles_category_map)
+        return self._resolver
+
+    @contextlib.contextmanager
+    def pinned(self):
+        """
+        (singles_category_map, multi_phrase_processor, resolver) coerenti per tutto il blocco:
+        con un dict_manager, un ricaricamento a caldo durante il blocco non li modifica.
+        """
+        if self.dict_manager is None:
+            yield self.singles_category_map, self.multi_phrase_processor, self.resolver
+            return
+        with self.dict_manager.pinned() as snapshot:
+            yield snapshot.singles_category_map, snapshot.multi_phrase_processor, snapshot.resolver
+
+    def is_empty(self) -> bool:
+        return not (self.singles_category_map or self.multi_phrase_processor.get_all_keywords())
+
+    def match_doc(self, requirement_text: str, doc) -> List[Tuple[str, str, str]]:
+        with self.pinned() as (singles_category_map, multi_phrase_processor, resolver):
+            return tokenize_and_match_with_spacy(requirement_text, singles_category_map, multi_phrase_processor,
+                                                 self._nlp, doc=doc, resolver=resolver)
+
+    def label(self, requirement_text: str, dictionary_only: bool = False) -> List[Tuple[str, str, str]]:
+        if dictionary_only:
+            with self.pinned() as (singles_category_map, multi_phrase_processor, resolver):
+                return match_dictionary_only(requirement_text, singles_category_map, multi_phrase_processor, resolver)
+        return self.match_doc(requirement_text, self.nlp(requirement_text))
+
+    def label_batch(self, texts: List[str], batch_size: int = SPACY_BATCH_SIZE,
+                    dictionary_only: bool = False) -> List[List[Tuple[str, str, str]]]:
+        """
+        Etichetta una lista di testi con un solo passaggio di nlp.pipe; restituisce i match nello
+        stesso ordine. Tutti i testi del batch vedono gli stessi dizionari.
+        """
+        if dictionary_only:
+            with self.pinned() as (singles_category_map, multi_phrase_processor, resolver):
+                return [match_dictionary_only(text, singles_category_map, multi_phrase_processor, resolver)
+                        for text in texts]
+        docs = self.nlp.pipe(texts, batch_size=max(batch_size, 1))
+        with self.pinned() as (singles_category_map, multi_phrase_processor, resolver):
+            return [tokenize_and_match_with_spacy(text, singles_category_map, multi_phrase_processor, self._nlp,
+                                                  doc=doc, resolver=resolver)
+                    for text, doc in zip(texts, docs)]
+
+    def parse_docs(self, records, batch_size: int = SPACY_BATCH_SIZE, parse_cache: Optional[ParseCache] = None):
+        """
+        Come parse_requirement_docs. Con una parse_cache i doc già analizzati vengono riletti dal
+        disco e il modello viene caricato solo se serve analizzare un testo mancante.
+        """
+        if parse_cache is None:
+            yield from parse_requirement_docs(records, self.nlp, batch_size)
+            return
+        for chunk in iter_chunks(records, max(batch_size, 1)):
+            docs = parse_cache.parse_batch([record[2] for record in chunk], lambda: self.nlp, batch_size)
+            yield from zip(chunk, docs)
+
+    def label_records(self, records, batch_size: int = SPACY_BATCH_SIZE,
+                      parse_cache: Optional[ParseCache] = None, dictionary_only: bool = False):
+        """Etichetta in streaming i record e restituisce coppie (record, matches)."""
+        for record, spans in self.label_records_with_spans(records, batch_size, parse_cache, dictionary_only):
+            yield record, [(word, category, record[2]) for word, category, _, _ in spans]
+
+    def label_records_with_spans(self, records, batch_size: int = SPACY_BATCH_SIZE,
+                                 parse_cache: Optional[ParseCache] = None, dictionary_only: bool = False):
+        """Come label_records, ma i match sono (parola, categoria, offset iniziale, offset finale)."""
+        metrics = self.metrics
+        if dictionary_only:
+            for record in records:
+                if metrics is not None:
+                    metrics.count("requirements")
+                with self.pinned() as (singles_category_map, multi_phrase_processor, resolver):
+                    spans = match_dictionary_only_spans(record[2], singles_category_map, multi_phrase_processor,
+                                                        resolver, metrics)
+                yield record, spans
+            return
+
+        parsed = self.parse_docs(records, batch_size, parse_cache)
+        while True:
+            if metrics is not None:
+                # Il tempo di parsing esclude l'eventuale caricamento del modello, che ha una fase a sé
+                start = time.perf_counter()
+                load_model_before = metrics.stage_seconds.get("load_model", 0.0)
+            item = next(parsed, None)
+            if item is None:
+                return
+            record, doc = item
+            if metrics is not None:
+                load_model_time = metrics.stage_seconds.get("load_model", 0.0) - load_model_before
+                metrics.add_time("parse", time.perf_counter() - start - load_model_time)
+                metrics.count("requirements")
+            with self.pinned() as (singles_category_map, multi_phrase_processor, resolver):
+                spans = match_spans_in_doc(record[2], singles_category_map, multi_phrase_processor, doc,
+                                           resolver, metrics)
+            yield record, spans
+
+    def label_records_deduplicated(self, records, representatives: Dict[str, str],
+                                   batch_size: int = SPACY_BATCH_SIZE, parse_cache: Optional[ParseCache] = None,
+                                   dictionary_only: bool = False):
+        """
+        Come label_records_with_spans, ma con i cluster di quasi-duplicati di NearDuplicates.py
+        (representatives: ID duplicato -> ID rappresentante) i match del rappresentante vengono
+        copiati sui membri con lo stesso identico testo, restituiti nello stesso ordine del file.
+        Tutti gli altri membri vengono etichettati: i cluster sono componenti connesse, quindi un
+        membro può essere molto diverso dal rappresentante, e anche una differenza di spazi o di
+        maiuscole può cambiare l'analisi di spaCy. Un membro che precede il rappresentante nel file
+        viene anch'esso etichettato.
+        """
+        with_members = set(representatives.values())
+        # Record letti e non ancora restituiti, con l'ID del rappresentante per quelli da copiare
+        pending = deque()
+        representative_texts: Dict[str, str] = {}
+        representative_spans: Dict[str, list] = {}
+
+        def records_to_label():
+            for record in records:
+                representative = representatives.get(record[0])
+                if representative is not None and representative_texts.get(representative) == record[2]:
+                    pending.append((record, representative))
+                    continue
+                if representative is not None and self.metrics is not None:
+                    self.metrics.count("dedupe_relabeled_requirements")
+                pending.append((record, None))
+                if record[0] in with_members:
+                    representative_texts[record[0]] = record[2]  # i match arrivano quando viene etichettato
+                yield record
+
+        def copies_before_next_labeled():
+            while pending and pending[0][1] is not None:
+                record, representative = pending.popleft()
+                if self.metrics is not None:
+                    self.metrics.count("deduplicated_requirements")
+                yield record, list(representative_spans[representative])
+
+        for record, spans in self.label_records_with_spans(records_to_label(), batch_size, parse_cache,
+                                                           dictionary_only):
+            yield from copies_before_next_labeled()
+            pending.popleft()
+            if record[0] in representative_texts:
+                representative_spans[record[0]] = spans
+            yield record, spans
+        yield from copies_before_next_labeled()
+
+
+def unique_match_rows(record, matches: List[Tuple[str, str, str]]) -> List[List[str]]:
+    """
+    Converte i match di un requisito nelle righe del CSV di output: una riga per ogni
+    coppia (categoria, parola) distinta, oppure una sola riga NULL;NULL se non ci sono match.
+    """
+    base_output_parts = list(record)
+    if not matches:
+        return [base_output_parts + ["NULL", "NULL"]]
+
+    rows: List[List[str]] = []
+    unique_matches_for_this_req: Set[Tuple[str, str]] = set()
+    for original_word_phrase, category, _ in matches:
+        if (category, original_word_phrase) not in unique_matches_for_this_req:
+            rows.append(base_output_parts + [category, original_word_phrase])
+            unique_matches_for_this_req.add((category, original_word_phrase))
+    return rows
+
+
+def dictionary_entries(singles_category_map: CategoryTable,
+                       multi_phrase_processor: KeywordProcessor) -> Set[Tuple[str, str, str]]:
+    """Voci effettivamente usate dal matching come (tipo, voce normalizzata, categoria)."""
+    entries = {("word", word, category) for word, categories in singles_category_map.items() for category in categories}
+    entries.update(("phrase", phrase, category) for phrase, category in multi_phrase_processor.get_all_keywords().items())
+    return entries
+
+
+def requirement_index_keys(requirement_text: str, doc) -> Set[str]:
+    """
+    Chiavi dell'indice inverso di un requisito: testo e lemma normalizzati di ogni token
+    ("w:") e parole nel senso di FlashText ("p:"), usate per trovare le frasi.
+    """
+    keys = {"w:" + norm_word(token.text) for token in doc}
+    keys.update("w:" + norm_word(token.lemma_) for token in doc)
+    keys.update("p:" + word for word in FLASHTEXT_WORD_RX.findall(requirement_text.lower()))
+    return keys
+
+
+def labeling_config_fingerprint(model_name: str) -> str:
+    """Hash di tutto ciò che, oltre ai dizionari, influenza le etichette: se cambia serve un rietichettamento completo."""
+    pos_mapping = sorted((category, sorted((key, sorted(values)) for key, values in rule.items()))
+                         for category, rule in POS_CATEGORY_MAPPING.items())
+    config = repr((LABELING_STATE_VERSION, CATEGORY_PRIORITY, pos_mapping,
+                   model_cache_key(model_name, SPACY_EXCLUDED_COMPONENTS)))
+    return hashlib.sha256(config.encode("utf-8")).hexdigest()
+
+
+def _file_signature(path: Path) -> str:
+    st = path.stat()
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _iter_output_groups(csv_reader):
+    """Raggruppa le righe consecutive di Labeled_Dataset.csv per ID del requisito."""
+    current_id, rows = None, []
+    for row in csv_reader:
+        if not row:
+            continue
+        if row[0] != current_id and rows:
+            yield current_id, rows
+            rows = []
+        current_id = row[0]
+        rows.append(row)
+    if rows:
+        yield current_id, rows
+
+
+def run_incremental_labeling(requirements_file: str,
+                             output_file: str,
+                             labeler: "Labeler",
+                             batch_size: int,
+                             parse_cache: Optional[ParseCache],
+                             state: LabelingState) -> Tuple[int, int, int]:
+    """
+    Rietichetta solo i requisiti toccati dalle differenze tra i dizionari attuali e quelli
+    dell'ultima esecuzione (più quelli nuovi o con testo cambiato) e aggiorna output_file
+    copiando invariate le righe degli altri. Se lo stato manca, la configurazione è cambiata
+    o il file di output non è quello scritto dall'ultima esecuzione, rietichetta tutto.
+    Restituisce (requisiti totali, requisiti rietichettati, match scritti).
+    """
+    output_path = Path(output_file)
+    with open(requirements_file, 'r', encoding='utf-8') as req_f:
+        records = list(parse_requirement_lines(req_f))
+    current_ids = {record[0] for record in records}
+    current_entries = dictionary_entries(labeler.singles_category_map, labeler.multi_phrase_processor)
+    fingerprint = labeling_config_fingerprint(labeler.model_name)
+
+    previous = state.requirements()
+    full = (state.get_meta("fingerprint") != fingerprint
+            or not output_path.is_file()
+            or state.get_meta("output_signature") != _file_signature(output_path)
+            or len(current_ids) != len(records))
+    if not full:
+        # Le righe vecchie vengono copiate in streaming: i requisiti rimasti devono avere lo stesso ordine
+        kept_positions = [previous[record[0]][0] for record in records if record[0] in previous]
+        full = any(a > b for a, b in zip(kept_positions, kept_positions[1:]))
+
+    if full:
+        print("  [INCREMENTALE] Stato assente o non compatibile: rietichettamento completo.")
+        state.reset()
+        previous = {}
+        added_entries, removed_entries = current_entries, set()
+        affected = set(current_ids)
+    else:
+        previous_entries = state.dict_entries()
+        added_entries = current_entries - previous_entries
+        removed_entries = previous_entries - current_entries
+        print(f"  [INCREMENTALE] Voci dei dizionari: +{len(added_entries)} / -{len(removed_entries)}")
+
+        affected: Set[str] = set()
+        for kind, entry in {(kind, entry) for kind, entry, _ in added_entries | removed_entries}:
+            if kind == "word":
+                affected |= state.requirements_with_key("w:" + entry)
+                continue
+            phrase_words = FLASHTEXT_WORD_RX.findall(entry)
+            if not phrase_words:
+                affected = set(current_ids)
+                break
+            affected |= state.requirements_with_all_keys(["p:" + word for word in phrase_words])
+
+        for record in records:
+            old = previous.get(record[0])
+            if old is None or old[1] != _text_hash(record[2]):
+                affected.add(record[0])
+        affected &= current_ids
+
+    print(f"  [INCREMENTALE] Requisiti da rietichettare: {len(affected)} su {len(records)}")
+
+    # 1. Rietichettatura dei soli requisiti coinvolti
+    positions = {record[0]: seq for seq, record in enumerate(records)}
+    new_rows: Dict[str, List[List[str]]] = {}
+    affected_records = [record for record in records if record[0] in affected]
+    for record, doc in labeler.parse_docs(affected_records, batch_size, parse_cache):
+        matches = labeler.match_doc(record[2], doc)
+        new_rows[record[0]] = unique_match_rows(record, matches)
+        state.upsert_requirement(record[0], positions[record[0]], _text_hash(record[2]),
+                                 requirement_index_keys(record[2], doc))
+
+    # 2. Patch del file di output: righe nuove per i coinvolti, righe copiate per tutti gli altri
+    matches_written = 0
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as out_f:
+        csv_writer = csv.writer(out_f, delimiter=';')
+        csv_writer.writerow(OUTPUT_HEADER)
+        old_f = None if full else open(output_path, 'r', encoding='utf-8', newline='')
+        try:
+            old_groups = iter(())
+            if old_f is not None:
+                old_reader = csv.reader(old_f, delimiter=';')
+                next(old_reader, None)
+                old_groups = _iter_output_groups(old_reader)
+            pending = next(old_groups, None)
+            for record in records:
+                req_id = record[0]
+                # Salta i gruppi di requisiti non più presenti nell'input
+                while pending is not None and pending[0] != req_id and pending[0] not in current_ids:
+                    pending = next(old_groups, None)
+                old_rows = None
+                if pending is not None and pending[0] == req_id:
+                    old_rows = pending[1]
+                    pending = next(old_groups, None)
+
+                rows = new_rows.get(req_id, old_rows)
+                if rows is None:
+                    raise RuntimeError(f"Righe del requisito {req_id} assenti dal file di output precedente.")
+                csv_writer.writerows(rows)
+                matches_written += sum(1 for row in rows if row[4] != "NULL")
+        finally:
+            if old_f is not None:
+                old_f.close()
+    tmp_path.replace(output_path)
+
+    # 3. Aggiornamento dello stato per la prossima esecuzione
+    state.delete_requirements(req_id for req_id in previous if req_id not in current_ids)
+    state.update_positions((positions[req_id], req_id) for req_id, (seq, _) in previous.items()
+                           if req_id in current_ids and req_id not in affected and seq != positions[req_id])
+    state.apply_dict_diff(added_entries, removed_entries)
+    state.set_meta("fingerprint", fingerprint)
+    state.set_meta("output_signature", _file_signature(output_path))
+    state.commit()
+    return len(records), len(affected), matches_written
+
+
+def cache_counters(resolver: CategoryResolver, parse_cache: Optional[ParseCache]) -> Dict[str, int]:
+    """Hit e miss cumulativi delle cache (resolver e, se presente, cache di parsing) per le metriche."""
+    stats = resolver.cache_stats()
+    counters = {"resolver_hits": stats["hits"], "resolver_misses": stats["misses"]}
+    if parse_cache is not None:
+        counters["parse_cache_hits"] = parse_cache.hits
+        counters["parse_cache_misses"] = parse_cache.misses
+    return counters
+
+
+def finish_metrics(metrics: Optional[StageMetrics], path: Optional[Path],
+                   counters: Optional[Dict[str, int]] = None) -> None:
+    """Aggiunge i contatori finali delle cache, scrive il report delle metriche e ne stampa il riepilogo."""
+    if metrics is None:
+        return
+    for name, value in (counters or {}).items():
+        metrics.count(name, value)
+    report = metrics.report()
+    write_metrics(report, path)
+    print_stage_summary(report)
+    print(f"Metriche scritte in '{path}'.")
+
+
+# --- Etichettatura parallela a shard ---
+def shard_offsets(path: Path, shard_size: int = SHARD_SIZE_BYTES) -> List[Tuple[int, int]]:
+    """
+    Divide il file in intervalli di byte [inizio, fine) di circa shard_size byte, spostando
+    ogni confine alla fine della riga in cui cade: nessuna riga viene spezzata tra due shard.
+    """
+    file_size = path.stat().st_size
+    shard_size = max(1, shard_size)
+    bounds = [0]
+    with open(path, 'rb') as f:
+        while bounds[-1] + shard_size < file_size:
+            f.seek(bounds[-1] + shard_size)
+            f.readline()
+            end = f.tell()
+            if end >= file_size:
+                break
+            bounds.append(end)
+    bounds.append(file_size)
+    return list(zip(bounds, bounds[1:]))
+
+
+# Stato di ogni processo worker, preparato una sola volta da _init_shard_worker
+_shard_labeler: Optional[Labeler] = None
+_shard_parse_cache: Optional[ParseCache] = None
+
+
+def _init_shard_worker(dictionaries_dir: Path, use_dict_index: bool, parse_cache_path: Optional[Path],
+                       shared_dicts: bool = False) -> None:
+    global _shard_labeler, _shard_parse_cache
+    _shard_labeler = Labeler(dictionaries_dir, use_dict_index=use_dict_index, shared_dicts=shared_dicts)
+    # Dizionari caricati subito; il modello al primo testo da analizzare (mai, se la cache è completa).
+    # In entrambi i casi restano in memoria per tutti gli shard del worker.
+    _shard_labeler.dictionaries
+    if parse_cache_path is not None:
+        _shard_parse_cache = ParseCache(parse_cache_path, model_cache_key(_shard_labeler.model_name, SPACY_EXCLUDED_COMPONENTS))
+
+
+def _label_shard(requirements_file: Path, start: int, end: int, shard_output: Path,
+                 batch_size: int, dictionary_only: bool, collect_metrics: bool = False):
+    """
+    Etichetta i requisiti tra i byte start e end e scrive le righe (senza intestazione) in
+    shard_output. Restituisce (requisiti, match scritti, metriche dello shard o None).
+    """
+    metrics = StageMetrics() if collect_metrics else None
+    _shard_labeler.metrics = metrics
+    counters_before = cache_counters(_shard_labeler.resolver, _shard_parse_cache)
+    with open(requirements_file, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    processed = 0
+    matches_found = 0
+    # Stessa decodifica e stessa divisione in righe della lettura seriale del file
+    lines = io.TextIOWrapper(io.BytesIO(data), encoding='utf-8')
+    with open(shard_output, 'w', encoding='utf-8', newline='') as out_f:
+        csv_writer = csv.writer(out_f, delimiter=';')
+        records = parse_requirement_lines(lines)
+        for record, matches in _shard_labeler.label_records(records, batch_size, _shard_parse_cache,
+                                                            dictionary_only=dictionary_only):
+            write_start = time.perf_counter()
+            rows = unique_match_rows(record, matches)
+            csv_writer.writerows(rows)
+            if metrics is not None:
+                metrics.add_time("write", time.perf_counter() - write_start)
+            if matches:
+                matches_found += len(rows)
+            processed += 1
+
+    if metrics is None:
+        return processed, matches_found, None
+    for name, value in cache_counters(_shard_labeler.resolver, _shard_parse_cache).items():
+        metrics.count(name, value - counters_before.get(name, 0))
+    return processed, matches_found, metrics.to_dict()
+
+
+def label_file_parallel(requirements_file: Path,
+                        output_file: Path,
+                        workers: int,
+                        shard_size: int = SHARD_SIZE_BYTES,
+                        dictionaries_dir: Path = DICTIONARIES_DIR,
+                        use_dict_index: bool = True,
+                        batch_size: int = SPACY_BATCH_SIZE,
+                        parse_cache_path: Optional[Path] = None,
+                        dictionary_only: bool = False,
+                        metrics: Optional[StageMetrics] = None,
+                        shared_dicts: bool = False) -> Tuple[int, int]:
+    """
+    Etichetta requirements_file con workers processi: il file viene diviso in shard allineati
+    alle righe, ogni worker carica modello e indice dei dizionari una sola volta ed etichetta
+    shard interi, e i risultati vengono concatenati nell'ordine originale, per cui output_file
+    è identico a quello dell'esecuzione seriale. Con metrics vi vengono sommate le metriche
+    di tutti gli shard. Con shared_dicts i worker leggono la tabella delle parole singole
+    dall'mmap dell'indice invece di copiarla ognuno in un proprio dict.
+    Restituisce (requisiti processati, match scritti).
+    """
+    requirements_file = Path(requirements_file)
+    output_file = Path(output_file)
+    shards = shard_offsets(requirements_file, shard_size)
+    print(f"Modalità parallela: {len(shards)} shard da ~{shard_size / 1024:.0f} KiB su {workers} processi")
+
+    if use_dict_index:
+        # Compila l'indice nel processo principale, così i worker non lo ricompilano in parallelo
+        load_dict_index(dictionaries_dir, DICT_INDEX_FILE)
+
+    processed_total = 0
+    matches_total = 0
+    with tempfile.TemporaryDirectory(prefix=".shards_", dir=output_file.parent) as tmp_dir:
+        shard_paths = [Path(tmp_dir) / f"shard_{i:06d}.csv" for i in range(len(shards))]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_shard_worker,
+                                 initargs=(dictionaries_dir, use_dict_index, parse_cache_path, shared_dicts)) as pool, \
+             open(output_file, 'w', encoding='utf-8', newline='') as out_f:
+            futures = [pool.submit(_label_shard, requirements_file, start, end, shard_path, batch_size, dictionary_only,
+                                   metrics is not None)
+                       for (start, end), shard_path in zip(shards, shard_paths)]
+
+            csv.writer(out_f, delimiter=';').writerow(OUTPUT_HEADER)
+            # Merge in ordine: ogni shard viene accodato appena pronto anche il precedente
+            for i, (future, shard_path) in enumerate(zip(futures, shard_paths), 1):
+                processed, matches_found, shard_metrics = future.result()
+                merge_start = time.perf_counter()
+                with open(shard_path, 'r', encoding='utf-8', newline='') as shard_f:
+                    shutil.copyfileobj(shard_f, out_f)
+                shard_path.unlink()
+                if metrics is not None:
+                    metrics.merge(shard_metrics)
+                    metrics.add_time("merge", time.perf_counter() - merge_start)
+                processed_total += processed
+                matches_total += matches_found
+                print(f"  [PROGRESSO] Shard {i}/{len(shards)}: {processed_total} requisiti processati...")
+    return processed_total, matches_total
+
+
 # --- Main Logic ---
 if __name__ == "__main__":
-    DICTIONARIES_DIR = Path("NewDict") 
     REQUIREMENTS_FILE = "Dataset_With_R_ID.txt"  
     OUTPUT_FILE = "Labeled_Dataset.csv" 
 
-    singles_category_map, multi_phrase_processor = load_all_dicts_optimized(DICTIONARIES_DIR)
-    
-    if not (singles_category_map or multi_phrase_processor.get_all_keywords()):
-        print("Attenzione: Nessuna parola o frase è stata caricata dai dizionari.")
+    parser = argparse.ArgumentParser(description="Etichetta i requisiti usando i dizionari in NewDict/ e spaCy.")
+    parser.add_argument("--batch-size", type=int, default=SPACY_BATCH_SIZE,
+                        help=f"requisiti per batch di nlp.pipe (default {SPACY_BATCH_SIZE}; 0 = un documento alla volta)")
+    parser.add_argument("--compile-dicts", action="store_true",
+                        help=f"compila i dizionari in '{DICT_INDEX_FILE}' ed esce")
+    parser.add_argument("--no-dict-index", action="store_true",
+                        help="legge direttamente NewDict/*.txt senza usare l'indice compilato")
+    parser.add_argument("--parse-cache", type=Path, default=PARSE_CACHE_FILE,
+                        help=f"cache su disco delle analisi spaCy (default {PARSE_CACHE_FILE})")
+    parser.add_argument("--no-parse-cache", action="store_true",
+                        help="analizza sempre tutti i requisiti con il modello, senza cache")
+    parser.add_argument("--incremental", action="store_true",
+                        help="rietichetta solo i requisiti toccati dalle modifiche ai dizionari dall'ultima esecuzione incrementale")
+    parser.add_argument("--state", type=Path, default=LABELING_STATE_FILE,
+                        help=f"stato della modalità incrementale (default {LABELING_STATE_FILE})")
+    parser.add_argument("--dictionary-only", action="store_true",
+                        help="solo corrispondenze esatte con i dizionari, senza caricare il modello spaCy (niente lemmi e regole POS)")
+    parser.add_argument("--store", type=Path, nargs="?", const=LABEL_STORE_FILE, default=None,
+                        help=f"scrive i risultati anche nello store SQLite normalizzato (default {LABEL_STORE_FILE})")
+    parser.add_argument("--no-csv", action="store_true",
+                        help=f"non scrive {OUTPUT_FILE} (solo con --store; il CSV si esporta con LabelStore.py export)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processi di etichettatura in parallelo (default 1 = seriale)")
+    parser.add_argument("--shared-dicts", action="store_true",
+                        help="con --workers, i worker condividono la tabella delle parole dall'mmap dell'indice (meno memoria, lookup più lenti)")
+    parser.add_argument("--shard-mb", type=float, default=SHARD_SIZE_BYTES / (1024 * 1024),
+                        help=f"dimensione indicativa in MiB degli shard della modalità parallela (default {SHARD_SIZE_BYTES / (1024 * 1024):g})")
+    parser.add_argument("--dedupe", type=Path, nargs="?", const=DUPLICATES_FILE, default=None,
+                        help=f"nei cluster di NearDuplicates.py copia i match del rappresentante sui membri con testo identico invece di rietichettarli (default {DUPLICATES_FILE})")
+    parser.add_argument("--metrics", type=Path, nargs="?", const=METRICS_FILE, default=None,
+                        help=f"misura i tempi per fase e scrive le metriche in JSON, o CSV se il file termina in .csv (default {METRICS_FILE})")
+    parser.add_argument("--profile", choices=PROFILERS, nargs="?", const="cprofile", default=None,
+                        help="profila l'esecuzione con cProfile (default) o pyinstrument, se installato")
+    parser.add_argument("--profile-output", type=Path, default=None,
+                        help="file del profilo (default " + ", ".join(f"{path} con {name}" for name, path in PROFILE_FILES.items()) + ")")
+    args = parser.parse_args()
+
+    if args.compile_dicts:
+        compile_dict_index(DICTIONARIES_DIR, DICT_INDEX_FILE)
         exit(0)
 
-    print(f"\nProcessamento requisiti dal file: {REQUIREMENTS_FILE}")
-    processed_req_count = 0
-    matches_found_total = 0
+    metrics = StageMetrics() if args.metrics is not None else None
+    if metrics is not None:
+        metrics.extra["config"] = {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()}
+    with profiling(args.profile, args.profile_output):
+        labeler = Labeler(DICTIONARIES_DIR, use_dict_index=not args.no_dict_index, metrics=metrics)
+        if labeler.is_empty():
+            print("Attenzione: Nessuna parola o frase è stata caricata dai dizionari.")
+            exit(0)
 
-    try:
-        with open(REQUIREMENTS_FILE, 'r', encoding='utf-8') as req_f, \
-             open(OUTPUT_FILE, 'w', encoding='utf-8', newline='') as out_f:
-            
-            csv_writer = csv.writer(out_f, delimiter=';')
-            header = ["ID", "ID progetto", "REQUISITO (testo)", "Classe dei requisiti", "CATEGORIA", "PAROLA"]
-            csv_writer.writerow(header)
-            
-            for line_num, line in enumerate(req_f, 1): 
-                stripped_line = line.strip()
-                if not stripped_line:
-                    continue
+        use_parse_cache = not (args.no_parse_cache or args.dictionary_only)
 
-                m = REQUIREMENT_LINE_PARSE_RX.match(stripped_line)
-                if not m:
-                    print(f"Avviso: Riga {line_num} non parsabile (ignorata): {stripped_line}")
-                    continue
+        if args.no_csv and args.store is None:
+            print("Errore: --no-csv richiede --store, altrimenti non verrebbe scritto alcun output.")
+            exit(1)
+        if args.store is not None and (args.incremental or args.workers > 1):
+            print("Errore: --store è disponibile solo nell'etichettatura seriale non incrementale.")
+            exit(1)
+        representatives = None
+        if args.dedupe is not None:
+            if args.store is not None or args.incremental or args.workers > 1:
+                print("Errore: --dedupe è disponibile solo nell'etichettatura seriale non incrementale e senza --store.")
+                exit(1)
+            try:
+                representatives = read_representatives(args.dedupe)
+            except FileNotFoundError:
+                print(f"Errore: file dei cluster '{args.dedupe}' non trovato. Eseguire prima NearDuplicates.py.")
+                exit(1)
+            except ValueError as e:
+                print(f"Errore: {e}")
+                exit(1)
+            print(f"Quasi-duplicati da '{args.dedupe}': {len(representatives)} membri di cluster "
+                  f"(copiati dal rappresentante solo quelli con testo identico)")
 
-                req_id, proj_id, req_text, req_class = m.groups()
-                
-                matches_for_current_req = tokenize_and_match_with_spacy(req_text, singles_category_map, multi_phrase_processor, nlp)
-                
-                base_output_parts = [req_id, proj_id, req_text, req_class]
+        if args.workers > 1:
+            if args.incremental:
+                print("Errore: --incremental non è compatibile con --workers maggiore di 1.")
+                exit(1)
+            print(f"\nProcessamento requisiti dal file: {REQUIREMENTS_FILE}")
+            start_time = time.perf_counter()
+            try:
+                processed_req_count, matches_found_total = label_file_parallel(
+                    Path(REQUIREMENTS_FILE), Path(OUTPUT_FILE), args.workers, int(args.shard_mb * 1024 * 1024),
+                    DICTIONARIES_DIR, not args.no_dict_index, args.batch_size,
+                    args.parse_cache if use_parse_cache else None, args.dictionary_only, metrics, args.shared_dicts)
+            except FileNotFoundError:
+                print(f"Errore: Il file dei requisiti '{REQUIREMENTS_FILE}' non trovato.")
+                exit(1)
+            except OSError as e:
+                print(f"[DEBUG] Errore nel caricamento del modello spaCy '{SPACY_MODEL_NAME}': {e}")
+                print(f"Esegui: python -m spacy download {SPACY_MODEL_NAME}")
+                exit(1)
+            elapsed = time.perf_counter() - start_time
+            throughput = processed_req_count / elapsed if elapsed > 0 else 0.0
+            print(f"\nElaborazione completata. I risultati sono stati scritti in '{OUTPUT_FILE}'.")
+            print(f"Match totali univoci trovati e scritti: {matches_found_total}")
+            print(f"Requisiti processati: {processed_req_count} in {elapsed:.2f}s ({throughput:.1f} requisiti/sec, "
+                  f"{args.workers} processi)")
+            finish_metrics(metrics, args.metrics)
+            exit(0)
+
+        parse_cache = ParseCache(args.parse_cache, model_cache_key(SPACY_MODEL_NAME, SPACY_EXCLUDED_COMPONENTS)) if use_parse_cache else None
+
+        if args.incremental:
+            if args.dictionary_only:
+                print("Errore: --incremental richiede il modello spaCy e non è compatibile con --dictionary-only.")
+                exit(1)
+            print(f"\nProcessamento incrementale dei requisiti dal file: {REQUIREMENTS_FILE}")
+            start_time = time.perf_counter()
+            state = LabelingState(args.state)
+            try:
+                total, relabeled, matches_found_total = run_incremental_labeling(
+                    REQUIREMENTS_FILE, OUTPUT_FILE, labeler, args.batch_size, parse_cache, state)
+            except FileNotFoundError:
+                print(f"Errore: Il file dei requisiti '{REQUIREMENTS_FILE}' non trovato.")
+                exit(1)
+            except OSError as e:
+                print(f"[DEBUG] Errore nel caricamento del modello spaCy '{SPACY_MODEL_NAME}': {e}")
+                print(f"Esegui: python -m spacy download {SPACY_MODEL_NAME}")
+                exit(1)
+            finally:
+                state.close()
+                if parse_cache is not None:
+                    parse_cache.close()
+            print(f"\nElaborazione completata. I risultati sono stati scritti in '{OUTPUT_FILE}'.")
+            print(f"Requisiti rietichettati: {relabeled} su {total} in {time.perf_counter() - start_time:.2f}s")
+            print(f"Match totali univoci scritti: {matches_found_total}")
+            finish_metrics(metrics, args.metrics, cache_counters(labeler.resolver, parse_cache))
+            exit(0)
+
+        print(f"\nProcessamento requisiti dal file: {REQUIREMENTS_FILE}")
+        if args.dictionary_only:
+            modalita = "solo dizionari, senza modello spaCy"
+        else:
+            modalita = f"nlp.pipe, batch da {args.batch_size}" if args.batch_size > 0 else "un documento alla volta"
+        print(f"Modalità di analisi: {modalita}")
+        processed_req_count = 0
+        matches_found_total = 0
+        start_time = time.perf_counter()
 
-                if not matches_for_current_req:
-                    csv_writer.writerow(base_output_parts + ["NULL", "NULL"])
+        store = None
+        try:
+            with open(REQUIREMENTS_FILE, 'r', encoding='utf-8') as req_f, \
+                 (open(os.devnull, 'w') if args.no_csv else open(OUTPUT_FILE, 'w', encoding='utf-8', newline='')) as out_f:
+            
+                csv_writer = csv.writer(out_f, delimiter=';')
+                csv_writer.writerow(OUTPUT_HEADER)
+                if args.store is not None:
+                    store = LabelStore(args.store)
+                    store.reset(OUTPUT_HEADER)
+
+                records = parse_requirement_lines(req_f)
+                if representatives is not None:
+                    labeled = labeler.label_records_deduplicated(records, representatives, args.batch_size, parse_cache,
+                                                                 dictionary_only=args.dictionary_only)
                 else:
-                    unique_matches_for_this_req: Set[Tuple[str, str]] = set() 
-                    for original_word_phrase, category, _ in matches_for_current_req:
-                        if (category, original_word_phrase) not in unique_matches_for_this_req:
-                            csv_writer.writerow(base_output_parts + [category, original_word_phrase])
-                            unique_matches_for_this_req.add((category, original_word_phrase))
-                            matches_found_total += 1
+                    labeled = labeler.label_records_with_spans(records, args.batch_size, parse_cache,
+                                                               dictionary_only=args.dictionary_only)
+                for record, spans in labeled:
+                    write_start = time.perf_counter()
+                    matches_for_current_req = [(word, category, record[2]) for word, category, _, _ in spans]
+                    rows = unique_match_rows(record, matches_for_current_req)
+                    csv_writer.writerows(rows)
+                    if store is not None:
+                        store.add_requirement(record, spans)
+                    if metrics is not None:
+                        metrics.add_time("write", time.perf_counter() - write_start)
+                    if matches_for_current_req:
+                        matches_found_total += len(rows)
                 
-                processed_req_count += 1
-                if processed_req_count % 100 == 0:
-                    print(f"  [PROGRESSO] Processati {processed_req_count} requisiti...")
-
-    except FileNotFoundError:
-        print(f"Errore: Il file dei requisiti '{REQUIREMENTS_FILE}' non trovato.")
-        exit(1)
-    except Exception as e:
-        print(f"Si è verificato un errore inaspettato durante l'elaborazione: {e}")
-        traceback.print_exc()
-        exit(1)
+                    processed_req_count += 1
+                    if processed_req_count % 100 == 0:
+                        print(f"  [PROGRESSO] Processati {processed_req_count} requisiti...")
+
+                if store is not None:
+                    store.finish()
+                    store.close()
+
+        except FileNotFoundError:
+            print(f"Errore: Il file dei requisiti '{REQUIREMENTS_FILE}' non trovato.")
+            exit(1)
+        except OSError as e:
+            # spacy.load solleva OSError se il modello non è installato
+            print(f"[DEBUG] Errore nel caricamento del modello spaCy '{SPACY_MODEL_NAME}': {e}")
+            print(f"Esegui: python -m spacy download {SPACY_MODEL_NAME}")
+            exit(1)
+        except Exception as e:
+            print(f"Si è verificato un errore inaspettato durante l'elaborazione: {e}")
+            traceback.print_exc()
+            exit(1)
+
+        elapsed = time.perf_counter() - start_time
+        throughput = processed_req_count / elapsed if elapsed > 0 else 0.0
         
-    print(f"\nElaborazione completata. I risultati sono stati scritti in '{OUTPUT_FILE}'.")
-    print(f"Match totali univoci trovati e scritti: {matches_found_total}")
\ No newline at end of file
+        destinations = ([] if args.no_csv else [f"'{OUTPUT_FILE}'"]) + ([f"'{args.store}'"] if args.store is not None else [])
+        print(f"\nElaborazione completata. I risultati sono stati scritti in {' e '.join(destinations)}.")
+        print(f"Match totali univoci trovati e scritti: {matches_found_total}")
+        print(f"Requisiti processati: {processed_req_count} in {elapsed:.2f}s ({throughput:.1f} requisiti/sec)")
+        stats = labeler.resolver.cache_stats()
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = 100.0 * stats["hits"] / lookups if lookups else 0.0
+        print(f"Cache risoluzione categorie: {stats['hits']} hit, {stats['misses']} miss ({hit_rate:.1f}% hit), "
+              f"{stats['size']}/{stats['maxsize']} voci")
+        if parse_cache is not None:
+            print(f"Cache di parsing: {parse_cache.hits} requisiti riletti, {parse_cache.misses} analizzati con il modello")
+            print_stats(parse_cache.stats())
+            parse_cache.close()
+        finish_metrics(metrics, args.metrics, cache_counters(labeler.resolver, parse_cache))